@@ -1,6 +1,6 @@
 
 from django.contrib import admin
-from .models import Response, MoodEntry, Task, JournalEntry, PhysiologicalData
+from .models import Response, MoodEntry, Task, JournalEntry, PhysiologicalData, PredictionJob, UserRollup, UserBaseline
 @admin.register(Response)
 class ResponseAdmin(admin.ModelAdmin):
     list_display = ('user','predicted_level','created_at')
@@ -20,3 +20,19 @@ class PhysiologicalDataAdmin(admin.ModelAdmin):
     list_filter = ('predicted_level', 'created_at')
     search_fields = ('user__username',)
     readonly_fields = ('created_at',)
+
+@admin.register(PredictionJob)
+class PredictionJobAdmin(admin.ModelAdmin):
+    list_display = ('data', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+@admin.register(UserRollup)
+class UserRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period', 'period_start', 'response_low', 'response_medium', 'response_high', 'mood_count')
+    list_filter = ('period',)
+
+@admin.register(UserBaseline)
+class UserBaselineAdmin(admin.ModelAdmin):
+    list_display = ('user', 'count', 'updated_at')
+    readonly_fields = ('updated_at',)
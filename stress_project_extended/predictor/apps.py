@@ -1,5 +1,16 @@
-
 from django.apps import AppConfig
 class PredictorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'predictor'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the rollup and baseline handlers)
+
+        # The model is loaded lazily on first prediction. Servers can opt into
+        # loading it at startup with PREDICTOR_WARMUP = True (blocking) or
+        # 'background'; management commands should leave it off.
+        from django.conf import settings
+        warmup = getattr(settings, 'PREDICTOR_WARMUP', False)
+        if warmup:
+            from .ml_predictor import get_predictor
+            get_predictor().warm_up(background=(warmup == 'background'))
@@ -0,0 +1,224 @@
+"""
+Per-user feature baselines
+Welford running mean/variance of each user's physiological features, cached in memory and in UserBaseline
+"""
+import math
+import time
+import threading
+from collections import OrderedDict, defaultdict
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from .models import PhysiologicalData, UserBaseline, BASELINE_FIELDS
+
+
+def _options():
+    return getattr(settings, 'USER_BASELINE', {})
+
+
+def min_windows():
+    """Windows a baseline needs before personalized scoring uses it"""
+    return _options().get('MIN_WINDOWS', 10)
+
+
+class Baseline:
+    """Immutable snapshot of one user's running statistics, in BASELINE_FIELDS order"""
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=None, m2=None):
+        self.count = count
+        self.mean = tuple(mean or [0.0] * len(BASELINE_FIELDS))
+        self.m2 = tuple(m2 or [0.0] * len(BASELINE_FIELDS))
+
+    @classmethod
+    def from_model(cls, baseline):
+        mean, m2 = baseline.moments
+        return cls(baseline.count, mean, m2)
+
+    @property
+    def std(self):
+        """Population standard deviation, matching np.std in training"""
+        if not self.count:
+            return tuple(0.0 for _ in self.m2)
+        return tuple(math.sqrt(max(v, 0.0) / self.count) for v in self.m2)
+
+
+def welford(count, mean, m2, x, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) one observation, updating mean and m2 in place
+
+    Returns:
+        int: The new count
+    """
+    if sign > 0:
+        count += 1
+        for i, value in enumerate(x):
+            delta = value - mean[i]
+            mean[i] += delta / count
+            m2[i] += delta * (value - mean[i])
+        return count
+    if count <= 1:
+        mean[:] = [0.0] * len(mean)
+        m2[:] = [0.0] * len(m2)
+        return 0
+    count -= 1
+    for i, value in enumerate(x):
+        old_mean = mean[i]
+        mean[i] -= (value - old_mean) / count
+        m2[i] = max(m2[i] - (value - old_mean) * (value - mean[i]), 0.0)
+    return count
+
+
+def _vector(data):
+    """Baseline features of a PhysiologicalData row, or None if any is missing"""
+    x = [getattr(data, f) for f in BASELINE_FIELDS]
+    if all(v is not None and math.isfinite(v) for v in x):
+        return x
+    return None
+
+
+class BaselineCache:
+    """
+    Process-local LRU of Baseline snapshots
+
+    Writes in this process refresh the entry; entries older than ttl seconds
+    are re-read so updates from other processes show up within ttl.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        row = UserBaseline.objects.filter(user_id=user_id).first()
+        baseline = Baseline.from_model(row) if row else Baseline()
+        self.put(user_id, baseline)
+        return baseline
+
+    def put(self, user_id, baseline):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), baseline)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = BaselineCache()
+
+
+def get(user_id):
+    """Current Baseline of a user (from the in-process cache when fresh)"""
+    options = _options()
+    cache.max_size = options.get('CACHE_SIZE', 1024)
+    cache.ttl = options.get('CACHE_TTL', 60)
+    return cache.get(user_id)
+
+
+def record(rows, sign=1):
+    """
+    Fold PhysiologicalData rows into their users' baselines (sign=-1 removes them)
+
+    One read and one write per affected user, however long their history.
+    Removals only touch existing baselines, so the deletes cascaded from a
+    User never recreate the baseline being deleted with it.
+    """
+    by_user = defaultdict(list)
+    for data in rows:
+        x = _vector(data)
+        if x is not None:
+            by_user[data.user_id].append(x)
+    if not by_user:
+        return
+    with transaction.atomic():
+        for user_id, vectors in by_user.items():
+            if sign < 0:
+                row = UserBaseline.objects.select_for_update().filter(user_id=user_id).first()
+                if row is None:
+                    continue
+            else:
+                row, _ = UserBaseline.objects.select_for_update().get_or_create(user_id=user_id)
+            mean, m2 = row.moments
+            count = row.count
+            for x in vectors:
+                count = welford(count, mean, m2, x, sign)
+            row.count = count
+            row.set_moments(mean, m2)
+            row.save(update_fields=['count', 'stats', 'updated_at'])
+            transaction.on_commit(partial(cache.put, user_id, Baseline(count, mean, m2)))
+
+
+def rebuild(user=None):
+    """
+    Recompute baselines from the full PhysiologicalData history
+
+    Returns:
+        int: Number of baselines written
+    """
+    filters = {'user': user} if user is not None else {}
+    moments = {}
+    queryset = (PhysiologicalData.objects.filter(**filters).order_by('user_id', 'created_at', 'id')
+                .values_list('user_id', *BASELINE_FIELDS))
+    for user_id, *x in queryset.iterator(chunk_size=2000):
+        if not all(v is not None and math.isfinite(v) for v in x):
+            continue
+        if user_id not in moments:
+            moments[user_id] = [0, [0.0] * len(BASELINE_FIELDS), [0.0] * len(BASELINE_FIELDS)]
+        entry = moments[user_id]
+        entry[0] = welford(entry[0], entry[1], entry[2], x)
+
+    baselines = []
+    for user_id, (count, mean, m2) in moments.items():
+        baseline = UserBaseline(user_id=user_id, count=count)
+        baseline.set_moments(mean, m2)
+        baselines.append(baseline)
+    with transaction.atomic():
+        UserBaseline.objects.filter(**filters).delete()
+        UserBaseline.objects.bulk_create(baselines, batch_size=500)
+    cache.clear()
+    return len(baselines)
+
+
+def predict_labeled(user_id, rows):
+    """
+    Score raw feature rows with the subject-normalized model variant
+
+    The rows are validated and gap-filled by the regular model's pipeline,
+    then z-scored against the user's baseline.
+
+    Returns:
+        list: (predicted_label, confidence_dict) per row, or None when the
+        normalized model is not deployed or the baseline has fewer than
+        min_windows() windows
+
+    Raises:
+        InvalidFeatures: If a row fails validation
+    """
+    from .ml_predictor import get_predictor, get_personalized_predictor
+    from .preprocessing import InvalidFeatures, standardize
+
+    baseline = get(user_id)
+    if baseline.count < min_windows():
+        return None
+    personalized = get_personalized_predictor()
+    if not personalized.is_loaded():
+        return None
+    features = get_predictor().get_required_features()
+    if personalized.get_required_features() != features:
+        return None
+    prepared = get_predictor().prepare(rows)
+    if prepared.problems:
+        raise InvalidFeatures(prepared.problems)
+    columns = [features.index(f) for f in BASELINE_FIELDS]
+    return personalized.predict_labeled(standardize(prepared.matrix, baseline.mean, baseline.std, columns))
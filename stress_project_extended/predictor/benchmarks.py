@@ -0,0 +1,271 @@
+"""
+Inference benchmark suite
+Measures StressPredictor latency, throughput, load cost and view latency, and compares runs
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .training import DATA_PATH
+
+DEFAULT_BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+# Runs in a fresh interpreter so load time and memory are not skewed by this process
+LOAD_PROBE = r'''
+import os, sys, json, time
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+import django
+django.setup()
+rss_start = rss_mb()
+t0 = time.perf_counter()
+from predictor.ml_predictor import StressPredictor
+t1 = time.perf_counter()
+rss_import = rss_mb()
+predictor = StressPredictor(use_compiled=%(use_compiled)r)
+t2 = time.perf_counter()
+print(json.dumps({
+    'source': predictor.load_stats.get('source'),
+    'import_seconds': t1 - t0,
+    'load_seconds': t2 - t1,
+    'rss_import_mb': rss_import - rss_start,
+    'rss_model_mb': rss_mb() - rss_import,
+    'rss_total_mb': rss_mb(),
+}))
+'''
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'n': int(samples.size),
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p90_ms': float(np.percentile(samples, 90)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'max_ms': float(samples.max()),
+    }
+
+
+def load_rows(features, data_path=DATA_PATH):
+    """Feature matrix of merged.csv in the model's feature order"""
+    return pd.read_csv(data_path, usecols=list(features)).loc[:, list(features)].to_numpy(dtype=np.float64)
+
+
+def bench_load(base_dir, use_compiled=True):
+    """
+    Model import/load time and resident memory, measured in a fresh interpreter
+
+    Returns:
+        dict: Timings in seconds and RSS deltas in MB, or {'error': ...}
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'stress_project.settings'))
+    result = subprocess.run(
+        [sys.executable, '-c', LOAD_PROBE % {'use_compiled': use_compiled}],
+        cwd=base_dir, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'probe failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_single(predictor, matrix, repeat=1000, warmup=50, seed=0):
+    """Latency of StressPredictor.predict() on one feature dict at a time"""
+    features = predictor.get_required_features()
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, matrix.shape[0], size=warmup + repeat)
+    rows = [dict(zip(features, matrix[i].tolist())) for i in picks]
+    for row in rows[:warmup]:
+        predictor.predict(row)
+    timings = []
+    for row in rows[warmup:]:
+        start = time.perf_counter()
+        predictor.predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return percentiles(timings)
+
+
+def bench_batches(predictor, matrix, batch_sizes=DEFAULT_BATCH_SIZES, min_seconds=0.5, seed=0):
+    """
+    Throughput of predict_many() at each batch size
+
+    Rows are drawn with replacement from the dataset; each size is repeated
+    until min_seconds have passed (at least 3 times).
+    """
+    rng = np.random.default_rng(seed)
+    results = {}
+    for size in batch_sizes:
+        batch = matrix[rng.integers(0, matrix.shape[0], size=size)]
+        predictor.predict_many(batch)
+        timings = []
+        start = time.perf_counter()
+        while len(timings) < 3 or time.perf_counter() - start < min_seconds:
+            t0 = time.perf_counter()
+            predictor.predict_many(batch)
+            timings.append((time.perf_counter() - t0) * 1000)
+        stats = percentiles(timings)
+        stats['rows_per_second'] = size / (stats['mean_ms'] / 1000)
+        results[str(size)] = stats
+    return results
+
+
+def bench_views(matrix, features, requests=50, seed_rows=200):
+    """
+    End-to-end latency of ml_predict_view (POST) and dashboard_view (GET)
+
+    Runs against a throwaway test database seeded with seed_rows responses,
+    moods and predictions for the benchmark user, and private caches (see
+    private_caches); the project database and the site's cache entries are
+    never touched.
+    """
+    with tempfile.TemporaryDirectory(prefix='benchmark-cache-') as cache_dir:
+        from django.test import override_settings
+        with override_settings(CACHES=private_caches(cache_dir)):
+            return _bench_views(matrix, features, requests, seed_rows)
+
+
+def private_caches(cache_dir):
+    """
+    settings.CACHES with every alias moved out of the site's way
+
+    File-based caches keep their backend but live in cache_dir, so the
+    timings still include the file reads; any other backend becomes a
+    local-memory cache of its own.
+    """
+    from django.conf import settings
+    caches = {}
+    for alias, options in settings.CACHES.items():
+        if options.get('BACKEND', '').endswith('.FileBasedCache'):
+            caches[alias] = dict(options, LOCATION=os.path.join(cache_dir, alias))
+        else:
+            caches[alias] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                             'LOCATION': f'benchmark-{alias}'}
+    return caches
+
+
+def _bench_views(matrix, features, requests, seed_rows):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.contrib.auth.models import User
+    from .models import Response, MoodEntry, PhysiologicalData
+    from . import rollups
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        user = User.objects.create_user('benchmark', password='benchmark')
+        levels = ['Low Stress', 'Medium Stress', 'High Stress']
+        labels = ['Amused', 'Neutral', 'Stressed']
+        Response.objects.bulk_create([
+            Response(user=user, predicted_level=levels[i % 3], **{f'q{q}': i % 5 for q in range(1, 11)})
+            for i in range(seed_rows)
+        ])
+        MoodEntry.objects.bulk_create([MoodEntry(user=user, mood_scale=i % 10 + 1) for i in range(seed_rows)])
+        PhysiologicalData.objects.bulk_create([
+            PhysiologicalData(user=user, predicted_level=labels[i % 3], confidence_amused=0.2,
+                              confidence_neutral=0.3, confidence_stressed=0.5,
+                              **_form_values(features, matrix[i % matrix.shape[0]]))
+            for i in range(seed_rows)
+        ])
+        rollups.rebuild(user)
+
+        client = Client()
+        client.login(username='benchmark', password='benchmark')
+        forms = [_form_values(features, matrix[i % matrix.shape[0]]) for i in range(requests)]
+        results = {}
+        for name, call in (
+            ('ml_predict_view', lambda i: client.post('/ml-predict/', forms[i])),
+            ('dashboard_view', lambda i: client.get('/dashboard/')),
+        ):
+            call(0)
+            timings = []
+            for i in range(requests):
+                start = time.perf_counter()
+                response = call(i)
+                timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{name} returned {response.status_code}')
+            results[name] = percentiles(timings)
+        results['seed_rows'] = seed_rows
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def _form_values(features, row):
+    return {f: (int(round(v)) if f in ('age', 'height', 'weight') else float(v)) for f, v in zip(features, row)}
+
+
+def environment():
+    """Versions and host details recorded with every run"""
+    import sklearn
+    import django
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'django': django.get_version(),
+    }
+
+
+def flatten(report, prefix=''):
+    """Flatten nested numeric results into {'a.b.c': value}"""
+    flat = {}
+    for key, value in report.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare two reports metric by metric
+
+    Latency, time and memory metrics regress when they grow by more than
+    threshold; rows_per_second regresses when it drops by more than
+    threshold. Other numbers (counts, environment) are ignored.
+
+    Returns:
+        list: (metric, baseline, current, relative_change, regressed)
+    """
+    old, new = flatten(baseline), flatten(current)
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        higher_is_better = name.endswith('rows_per_second')
+        lower_is_better = name.endswith(('_ms', '_seconds', '_mb'))
+        if not (higher_is_better or lower_is_better) or not old[name]:
+            continue
+        change = (new[name] - old[name]) / abs(old[name])
+        regressed = change < -threshold if higher_is_better else change > threshold
+        rows.append((name, old[name], new[name], change, regressed))
+    return rows
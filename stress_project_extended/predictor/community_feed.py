@@ -0,0 +1,98 @@
+"""
+Community journal feed
+The newest anonymous journal entries, cached once for every user and invalidated as entries are written
+"""
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import JournalEntry
+from .queries import journal_querysets
+
+# Entries kept in the cached feed; longer feeds are read from the database
+FEED_SIZE = 50
+KEY = 'predictor:community-feed'
+# Bumped by every write; the feed is cached under the current generation
+GENERATION_KEY = 'predictor:community-feed:generation'
+FIELDS = ('id', 'user_id', 'content', 'created_at')
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'COMMUNITY_FEED_TIMEOUT', 300)
+
+
+def _load():
+    anonymous = journal_querysets()[0]
+    return list(anonymous.values_list(*FIELDS)[:FEED_SIZE])
+
+
+def _entry(row):
+    return JournalEntry(anonymous=True, **dict(zip(FIELDS, row)))
+
+
+def get(limit=FEED_SIZE):
+    """
+    The newest anonymous entries, from the shared cache
+
+    The feed is cached as plain (id, user_id, content, created_at) tuples,
+    so a page costs one cache read however many users are browsing it.
+
+    Returns:
+        list: JournalEntry instances built from the cached rows, newest first
+    """
+    if limit > FEED_SIZE:
+        return list(journal_querysets()[0][:limit])
+    cache = _cache()
+    key = f'{KEY}:{_generation(cache)}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = _load()
+        cache.set(key, rows, timeout=_timeout())
+    return [_entry(row) for row in rows[:limit]]
+
+
+def _generation(cache):
+    # A missing generation (eviction, cache restart) starts a new one, so an
+    # older cached feed is never picked up again
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY, 0)
+    return generation
+
+
+def _bump():
+    try:
+        _cache().incr(GENERATION_KEY)
+    except ValueError:
+        pass  # no generation yet: the next reader starts one
+
+
+def invalidate():
+    """
+    Start a new feed generation once the current transaction commits
+
+    Called for new anonymous entries, edits and deletes. Writers never
+    rewrite the cached list, so concurrent posts cannot drop each other's
+    entries, and a reader that loaded the feed before the commit caches it
+    under the old generation, which nobody reads any more.
+    """
+    transaction.on_commit(_bump)
+
+
+def journal_feed(user=None, limit=FEED_SIZE):
+    """
+    Recent anonymous entries plus the user's own, newest first
+
+    The shared feed is merged in memory with one indexed slice of the
+    user's named entries.
+    """
+    rows = get(limit)
+    if user is not None and user.is_authenticated:
+        rows += journal_querysets(user)[1][:limit]
+    rows.sort(key=lambda entry: (entry.created_at, entry.pk), reverse=True)
+    return rows[:limit]
@@ -0,0 +1,61 @@
+"""
+Per-user data versions
+A cache-held stamp per user that every dashboard-visible write bumps; keys fragment caches and ETags
+"""
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def _key(user_id):
+    return f'predictor:data-version:{user_id}'
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def get(user_id):
+    """
+    The user's data version: microseconds since the epoch of their last write
+
+    A missing entry (eviction, cache restart) starts a new version, so
+    fragments cached under an older one are never reused.
+    """
+    cache = _cache()
+    version = cache.get(_key(user_id))
+    if version is None:
+        version = _now()
+        if not cache.add(_key(user_id), version, timeout=None):
+            version = cache.get(_key(user_id), version)
+    return version
+
+
+def last_modified(user_id):
+    return datetime.fromtimestamp(get(user_id) / 1e6, tz=timezone.utc)
+
+
+def bump(*user_ids):
+    """
+    Start a new version for these users once the current transaction commits
+
+    Bumping after the commit keeps a concurrent request from caching the
+    old rows under the new version.
+    """
+    keys = {_key(user_id) for user_id in user_ids if user_id is not None}
+    if keys:
+        transaction.on_commit(lambda: _store(keys))
+
+
+def _store(keys):
+    cache = _cache()
+    now = _now()
+    current = cache.get_many(list(keys))
+    # Strictly increasing even for two writes within the same microsecond
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None)
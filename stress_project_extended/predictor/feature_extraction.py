@@ -0,0 +1,319 @@
+"""
+Feature extraction module for raw wearable signals
+Turns raw BVP/EDA/Resp/TEMP streams into the windowed features used by the model
+"""
+import os
+import itertools
+import numpy as np
+from .signal_store import iter_signal_chunks
+
+SIGNALS = ('BVP', 'EDA', 'Resp', 'TEMP')
+DEMOGRAPHIC_FEATURES = ('age', 'height', 'weight')
+
+# Default window length in samples of the slowest supplied signal, and the
+# default step as a share of it
+WINDOW_SAMPLES = 16
+STEP_FRACTION = 0.5
+# Fewest EDA samples in a window for the tonic/phasic decomposition
+EDA_MIN_SAMPLES = 8
+TONIC_MIN_SAMPLES = 3
+
+
+def iter_windows(chunks, window_seconds=60.0, step_seconds=30.0, min_samples=4):
+    """
+    Cut a chunked signal stream into fixed-length, possibly overlapping windows
+
+    Only the samples of the window currently being filled are buffered, so
+    memory stays bounded by the window length whatever the recording length.
+    Windows are aligned on multiples of step_seconds so several signals
+    produce matching window starts.
+
+    Args:
+        chunks: Iterable of (timestamps, values) arrays in increasing time order
+        window_seconds: Window length in timestamp units
+        step_seconds: Distance between consecutive window starts
+        min_samples: Windows with fewer samples are skipped
+
+    Yields:
+        tuple: (window_start, timestamps, values)
+    """
+    buf_t = np.empty(0)
+    buf_v = np.empty(0)
+    start = None
+    for t, v in chunks:
+        buf_t = np.concatenate([buf_t, np.asarray(t, dtype=np.float64)])
+        buf_v = np.concatenate([buf_v, np.asarray(v, dtype=np.float64)])
+        if start is None:
+            if not buf_t.size:
+                continue
+            start = float(np.floor(buf_t[0] / step_seconds) * step_seconds)
+
+        # Emit every window that is complete, i.e. data has passed its end
+        while buf_t.size and buf_t[-1] >= start + window_seconds:
+            lo, hi = np.searchsorted(buf_t, [start, start + window_seconds])
+            if hi - lo >= min_samples:
+                yield float(start), buf_t[lo:hi], buf_v[lo:hi]
+            start += step_seconds
+            if buf_t[0] < start:
+                keep = np.searchsorted(buf_t, start)
+                buf_t, buf_v = buf_t[keep:], buf_v[keep:]
+            if buf_t.size and buf_t[0] >= start + window_seconds:
+                # Skip over gaps in the recording
+                start = float(np.floor(buf_t[0] / step_seconds) * step_seconds)
+
+
+def _sampling_rate(t):
+    dt = np.median(np.diff(t)) if t.size > 1 else 0
+    return 1.0 / dt if dt > 0 else 1.0
+
+
+def sampling_interval(chunks):
+    """
+    Median sampling interval of a chunked signal stream
+
+    Reads chunks until two samples are seen and puts them back, so the
+    stream can still be consumed from its start.
+
+    Returns:
+        tuple: (interval or None when the stream has fewer than two samples,
+        iterator over the same chunks)
+    """
+    chunks = iter(chunks)
+    head = []
+    for t, v in chunks:
+        head.append((t, v))
+        seen = np.concatenate([np.asarray(c[0], dtype=np.float64) for c in head])
+        if seen.size > 1:
+            interval = float(np.median(np.diff(seen)))
+            return (interval if interval > 0 else None), itertools.chain(head, chunks)
+    return None, iter(head)
+
+
+def window_lengths(intervals, window_seconds=None, step_seconds=None):
+    """
+    Window length and step for signals with the given sampling intervals
+
+    Unset lengths are derived from the slowest signal: WINDOW_SAMPLES of its
+    samples per window, moving STEP_FRACTION of a window at a time. Lengths
+    are in the units of the timestamps, whatever those are.
+
+    Args:
+        intervals: Dict mapping signal name to its sampling interval (or None)
+        window_seconds: Window length in timestamp units, derived when None
+        step_seconds: Distance between window starts, derived when None
+
+    Returns:
+        tuple: (window_seconds, step_seconds)
+
+    Raises:
+        ValueError: If the window holds too few EDA samples to decompose
+    """
+    known = [dt for dt in intervals.values() if dt]
+    if window_seconds is None:
+        if not known:
+            raise ValueError('Cannot derive a window length from signals with fewer than two samples')
+        window_seconds = WINDOW_SAMPLES * max(known)
+    if step_seconds is None:
+        step_seconds = window_seconds * STEP_FRACTION
+    eda_interval = intervals.get('EDA')
+    if eda_interval and window_seconds / eda_interval < EDA_MIN_SAMPLES:
+        raise ValueError(
+            f'A window of {window_seconds:g} holds about {window_seconds / eda_interval:.1f} EDA samples '
+            f'(one every {eda_interval:g}); the EDA decomposition needs at least {EDA_MIN_SAMPLES}. '
+            f'Use a longer window or leave window_seconds unset to size it from the sampling rate'
+        )
+    return float(window_seconds), float(step_seconds)
+
+
+def min_window_samples(signal, min_samples):
+    """Fewest samples of a signal for a window to be used"""
+    return max(min_samples, EDA_MIN_SAMPLES) if signal == 'EDA' else min_samples
+
+
+def _moving_average(values, width):
+    """Centered moving average with edge padding"""
+    width = int(max(1, min(width, values.size)))
+    if width == 1:
+        return values.copy()
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode='edge')
+    csum = np.cumsum(np.concatenate([[0.0], padded]))
+    return (csum[width:] - csum[:-width]) / width
+
+
+def _moving_min(values, width):
+    """Centered moving minimum with edge padding"""
+    width = int(max(1, min(width, values.size)))
+    if width == 1:
+        return values.copy()
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode='edge')
+    return np.lib.stride_tricks.sliding_window_view(padded, width).min(axis=1)
+
+
+def peak_frequency(t, v):
+    """Dominant (non-DC) frequency of a window, in cycles per timestamp unit"""
+    if v.size < 2:
+        return 0.0
+    fs = _sampling_rate(t)
+    spectrum = np.abs(np.fft.rfft(v - v.mean()))
+    freqs = np.fft.rfftfreq(v.size, d=1.0 / fs)
+    return float(freqs[1:][spectrum[1:].argmax()]) if spectrum.size > 1 else 0.0
+
+
+def slope(t, v):
+    """Least-squares slope of the window values against time"""
+    tc = t - t.mean()
+    denom = np.dot(tc, tc)
+    return float(np.dot(tc, v - v.mean()) / denom) if denom > 0 else 0.0
+
+
+def bvp_features(t, v):
+    return {
+        'BVP_mean': float(v.mean()),
+        'BVP_std': float(v.std()),
+        'BVP_peak_freq': peak_frequency(t, v),
+    }
+
+
+def eda_features(t, v, tonic_samples=None):
+    """
+    EDA features with a simple tonic/phasic decomposition
+
+    The tonic level is a smoothed lower envelope of the signal (moving
+    minimum, then moving average) and the phasic part is the non-negative
+    residual above it. The smoothing width is counted in samples, a quarter
+    of the window by default, so it follows the sampling rate rather than
+    the timestamp units. The sudomotor nerve activity (SMNA) is approximated
+    by the positive rate of change of the phasic component.
+
+    Raises:
+        ValueError: If the window has fewer than EDA_MIN_SAMPLES samples
+    """
+    if v.size < EDA_MIN_SAMPLES:
+        raise ValueError(f'EDA window has {v.size} samples, the decomposition needs at least {EDA_MIN_SAMPLES}')
+    width = tonic_samples or max(TONIC_MIN_SAMPLES, v.size // 4)
+    tonic = np.minimum(_moving_average(_moving_min(v, width), width), v)
+    phasic = v - tonic
+    smna = np.maximum(np.gradient(phasic, t), 0)
+    return {
+        'EDA_phasic_mean': float(phasic.mean()),
+        'EDA_phasic_min': float(phasic.min()),
+        'EDA_smna_min': float(smna.min()),
+        'EDA_tonic_mean': float(tonic.mean()),
+    }
+
+
+def resp_features(t, v):
+    return {
+        'Resp_mean': float(v.mean()),
+        'Resp_std': float(v.std()),
+    }
+
+
+def temp_features(t, v):
+    return {
+        'TEMP_mean': float(v.mean()),
+        'TEMP_std': float(v.std()),
+        'TEMP_slope': slope(t, v),
+    }
+
+
+WINDOW_FEATURES = {
+    'BVP': bvp_features,
+    'EDA': eda_features,
+    'Resp': resp_features,
+    'TEMP': temp_features,
+}
+
+
+def window_features(signal, t, v):
+    """Compute the model features for one window of one signal"""
+    return WINDOW_FEATURES[signal](np.asarray(t, dtype=np.float64), np.asarray(v, dtype=np.float64))
+
+
+def _signal_windows(signal, chunks, window_seconds, step_seconds, min_samples):
+    min_samples = min_window_samples(signal, min_samples)
+    for start, t, v in iter_windows(chunks, window_seconds, step_seconds, min_samples):
+        yield start, window_features(signal, t, v)
+
+
+def extract_features(streams, profile=None, window_seconds=None, step_seconds=None, min_samples=4):
+    """
+    Turn raw signal streams into model feature rows, one per window
+
+    Signals are windowed independently and joined on the window start, so
+    only windows covered by every supplied signal are produced. Features of
+    signals that are not supplied are left out of the row. Unset window
+    lengths are derived from the signals' sampling intervals, see
+    window_lengths().
+
+    Args:
+        streams: Dict mapping signal name ('BVP', 'EDA', 'Resp', 'TEMP') to an
+            iterable of (timestamps, values) chunks or to a CSV path. CSV
+            paths are read through the memory-mapped signal store
+        profile: Optional dict with the demographic features (age, height, weight)
+        window_seconds: Window length in timestamp units, derived when None
+        step_seconds: Distance between consecutive window starts, derived when None
+        min_samples: Minimum samples per signal for a window to be used
+            (EDA windows need at least EDA_MIN_SAMPLES)
+
+    Yields:
+        dict: Feature row with window_start/window_end plus the model features,
+        ready for StressPredictor.predict() or predict_many()
+
+    Raises:
+        ValueError: For an unknown signal, or a window too short for the EDA
+            decomposition (raised before any row is produced)
+    """
+    profile = {k: v for k, v in (profile or {}).items() if k in DEMOGRAPHIC_FEATURES}
+    sources, intervals = {}, {}
+    for signal, chunks in streams.items():
+        if signal not in WINDOW_FEATURES:
+            raise ValueError(f"Unknown signal '{signal}', expected one of {SIGNALS}")
+        if isinstance(chunks, (str, os.PathLike)):
+            chunks = iter_signal_chunks(chunks)
+        intervals[signal], sources[signal] = sampling_interval(chunks)
+    if not sources:
+        return
+    window_seconds, step_seconds = window_lengths(intervals, window_seconds, step_seconds)
+    generators = {
+        signal: _signal_windows(signal, chunks, window_seconds, step_seconds, min_samples)
+        for signal, chunks in sources.items()
+    }
+
+    current = {signal: next(gen, None) for signal, gen in generators.items()}
+    while all(item is not None for item in current.values()):
+        latest = max(item[0] for item in current.values())
+        behind = [s for s, item in current.items() if item[0] < latest]
+        if behind:
+            for signal in behind:
+                current[signal] = next(generators[signal], None)
+            continue
+
+        row = {'window_start': latest, 'window_end': latest + window_seconds}
+        for _, features in current.values():
+            row.update(features)
+        row.update(profile)
+        yield row
+        current = {signal: next(gen, None) for signal, gen in generators.items()}
+
+
+def subject_streams(data_dir, subject, signals=SIGNALS):
+    """Find the `<signal>_<subject>.csv` files of one subject in data_dir"""
+    streams = {}
+    for signal in signals:
+        path = os.path.join(data_dir, f'{signal}_{subject}.csv')
+        if os.path.exists(path):
+            streams[signal] = path
+    return streams
+
+
+def batched(rows, batch_size=256):
+    """Group feature rows into lists for StressPredictor.predict_many()"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,290 @@
+"""
+Compiled forest module
+Flattens a fitted RandomForestClassifier into contiguous NumPy node arrays and
+evaluates them with a vectorized, pure-NumPy tree walker
+"""
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+COMPILED_DIRNAME = 'stress_model.forest'
+NODE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+# Per-version explanation tables written next to the node arrays (see path_contributions)
+CONTRIBUTION_ARRAYS = ('leaf_index', 'leaf_contrib', 'bias')
+FORMAT_VERSION = 1
+
+
+def artifact_sha256(path, block_size=1 << 20):
+    """Hash the pickled model so a compiled copy can be matched to its source"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def flatten_forest(model):
+    """
+    Concatenate all trees of a fitted forest into flat node arrays
+
+    Child indices are made global so every tree lives in the same arrays;
+    leaves keep left == right == -1. Node values are normalised to class
+    probabilities, which is what each tree contributes to predict_proba.
+
+    Returns:
+        dict: feature, threshold, left, right, value and roots arrays
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        is_leaf = left < 0
+        value = tree.value[:, 0, :].astype(np.float64)
+        value /= value.sum(axis=1, keepdims=True)
+
+        roots.append(offset)
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(np.where(is_leaf, -1, left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, -1, right + offset).astype(np.int32))
+        values.append(value)
+        offset += tree.node_count
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'roots': np.asarray(roots, dtype=np.int32),
+    }
+    meta = {
+        'format': FORMAT_VERSION,
+        'classes': [int(c) for c in model.classes_],
+        'n_features': int(model.n_features_in_),
+        'n_trees': len(model.estimators_),
+        'n_nodes': int(offset),
+        'max_depth': max_depth,
+    }
+    return arrays, meta
+
+
+def path_contributions(arrays, n_features):
+    """
+    Saabas path contributions of every leaf, for explaining predictions
+
+    Walking from a root to a leaf, each split moves the node value from the
+    parent's class distribution to the child's; that change is credited to
+    the parent's split feature. Summed along the path this gives, per leaf,
+    a (n_features, n_classes) table with root value + table total == leaf
+    value. Trees are processed one depth level at a time across the forest.
+
+    Returns:
+        dict: leaf_index (global node -> leaf row, -1 for internal nodes),
+        leaf_contrib (n_leaves, n_features, n_classes) float32 and bias
+        (mean root value, n_classes)
+    """
+    feature, left, right, value, roots = (arrays[name] for name in ('feature', 'left', 'right', 'value', 'roots'))
+    n_nodes, n_classes = value.shape
+    cumulative = np.zeros((n_nodes, n_features, n_classes))
+    frontier = np.asarray(roots)
+    while frontier.size:
+        parents = frontier[left[frontier] >= 0]
+        for children in (left[parents], right[parents]):
+            cumulative[children] = cumulative[parents]
+            cumulative[children, feature[parents]] += value[children] - value[parents]
+        frontier = np.concatenate([left[parents], right[parents]])
+
+    leaves = np.flatnonzero(left < 0)
+    leaf_index = np.full(n_nodes, -1, dtype=np.int32)
+    leaf_index[leaves] = np.arange(leaves.size, dtype=np.int32)
+    return {
+        'leaf_index': leaf_index,
+        # float32 is plenty for display and halves the file
+        'leaf_contrib': cumulative[leaves].astype(np.float32),
+        'bias': value[np.asarray(roots)].mean(axis=0),
+    }
+
+
+def export_forest(model, out_dir, source_path=None, version=None):
+    """
+    Write the flattened forest as one .npy file per node array plus meta.json
+
+    The directory is written next to the final location and swapped in, so a
+    reader never sees a half-written forest. The path contribution tables
+    used for explanations are computed here, once per model version.
+
+    Args:
+        model: Fitted RandomForestClassifier
+        out_dir: Target directory, usually model/stress_model.forest
+        source_path: Pickled model the forest was built from; its hash is
+            recorded so loaders can tell whether the compiled copy is current
+        version: Model version from the training manifest, if any
+    """
+    arrays, meta = flatten_forest(model)
+    arrays.update(path_contributions(arrays, meta['n_features']))
+    meta['version'] = version
+    meta['source_sha256'] = artifact_sha256(source_path) if source_path else None
+    meta['contributions'] = True
+
+    tmp_dir = f'{out_dir}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    _swap_dir(tmp_dir, out_dir)
+    return meta
+
+
+def _swap_dir(src_dir, dst_dir):
+    old_dir = f'{dst_dir}.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(dst_dir):
+        os.replace(dst_dir, old_dir)
+    os.replace(src_dir, dst_dir)
+    # Processes that still map the old files keep their pages until they reload
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def copy_forest(src_dir, dst_dir):
+    """Copy a compiled forest directory into place atomically"""
+    tmp_dir = f'{dst_dir}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    shutil.copytree(src_dir, tmp_dir)
+    _swap_dir(tmp_dir, dst_dir)
+
+
+def read_meta(forest_dir):
+    """Read meta.json of a compiled forest, or None if it is missing or unreadable"""
+    try:
+        with open(os.path.join(forest_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('format') == FORMAT_VERSION else None
+
+
+class CompiledForest:
+    """
+    Vectorized evaluator over flattened forest arrays
+
+    Exposes the subset of the sklearn classifier API StressPredictor uses
+    (classes_, n_features_in_, predict_proba, predict) plus explain().
+    Arrays are opened memory-mapped, so worker processes share the model pages.
+    """
+
+    def __init__(self, arrays, meta):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = np.asarray(arrays['roots'])
+        self.meta = meta
+        self.classes_ = np.asarray(meta['classes'])
+        self.n_features_in_ = meta['n_features']
+        # Explanation tables: loaded with the forest, or built on first explain()
+        self._contributions = (
+            {name: arrays[name] for name in CONTRIBUTION_ARRAYS}
+            if all(name in arrays for name in CONTRIBUTION_ARRAYS) else None
+        )
+
+    @classmethod
+    def load(cls, forest_dir, mmap=True):
+        meta = read_meta(forest_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No compiled forest at {forest_dir}")
+        mode = 'r' if mmap else None
+        names = NODE_ARRAYS + (CONTRIBUTION_ARRAYS if meta.get('contributions') else ())
+        arrays = {
+            name: np.load(os.path.join(forest_dir, f'{name}.npy'), mmap_mode=mode)
+            for name in names
+        }
+        return cls(arrays, meta)
+
+    @classmethod
+    def from_model(cls, model):
+        arrays, meta = flatten_forest(model)
+        return cls(arrays, meta)
+
+    def apply(self, X):
+        """
+        Find the leaf reached in every tree for every row
+
+        All (row, tree) pairs descend one level per step and pairs that reach
+        a leaf drop out of the active set, so each step only touches the
+        paths still being walked.
+
+        Returns:
+            np.ndarray: (n_rows, n_trees) global leaf indices
+        """
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        n_trees = self.roots.size
+        nodes = np.tile(self.roots, n_rows)
+        row_offset = np.repeat(np.arange(n_rows) * n_features, n_trees)
+        flat_X = X.ravel()
+
+        active = np.arange(nodes.size)
+        while active.size:
+            current = nodes[active]
+            left = self.left[current]
+            internal = left >= 0
+            active, current, left = active[internal], current[internal], left[internal]
+            if not active.size:
+                break
+            go_left = flat_X[row_offset[active] + self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, left, self.right[current])
+        return nodes.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X, chunk_rows=4096):
+        X = np.asarray(X)
+        out = np.empty((X.shape[0], self.classes_.size))
+        for start in range(0, X.shape[0], chunk_rows):
+            leaves = self.apply(X[start:start + chunk_rows])
+            out[start:start + chunk_rows] = self.value[leaves].mean(axis=1)
+        return out
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def _contribution_tables(self):
+        if self._contributions is None:
+            # Forests compiled before explanations existed; built once per load
+            arrays = {'feature': self.feature, 'left': self.left, 'right': self.right,
+                      'value': self.value, 'roots': self.roots}
+            self._contributions = path_contributions(arrays, self.n_features_in_)
+        return self._contributions
+
+    def explain(self, X, chunk_rows=256):
+        """
+        Class probabilities with per-feature path contributions
+
+        One tree walk per row (the same as predict_proba), then a gather of
+        the precomputed leaf tables averaged over the trees.
+
+        Returns:
+            tuple: (probabilities (n_rows, n_classes), bias (n_classes,),
+            contributions (n_rows, n_features, n_classes)) where
+            bias + contributions.sum(axis=1) == probabilities
+        """
+        tables = self._contribution_tables()
+        leaf_index, leaf_contrib = tables['leaf_index'], tables['leaf_contrib']
+        X = np.asarray(X)
+        n_rows = X.shape[0]
+        probabilities = np.empty((n_rows, self.classes_.size))
+        contributions = np.empty((n_rows, self.n_features_in_, self.classes_.size))
+        for start in range(0, n_rows, chunk_rows):
+            leaves = self.apply(X[start:start + chunk_rows])
+            probabilities[start:start + chunk_rows] = self.value[leaves].mean(axis=1)
+            contributions[start:start + chunk_rows] = leaf_contrib[leaf_index[leaves]].mean(axis=1, dtype=np.float64)
+        return probabilities, np.asarray(tables['bias']), contributions
@@ -0,0 +1,172 @@
+"""
+Request instrumentation module
+Per-request wall/SQL/prediction/template timings, Server-Timing headers and rolling per-URL stats
+"""
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+# Timings of the request being handled, or None when instrumentation is off
+_current = ContextVar('request_timings', default=None)
+
+METRICS = ('wall_ms', 'db_ms', 'db_queries', 'predict_ms', 'template_ms')
+
+
+class RequestTimings:
+    __slots__ = ('db_queries', 'db_seconds', 'predict_seconds', 'template_seconds', 'load_seconds',
+                 'explain_seconds')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.predict_seconds = 0.0
+        self.template_seconds = 0.0
+        self.load_seconds = 0.0
+        self.explain_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+
+@contextmanager
+def timed(category):
+    """
+    Add the time spent in the block to the current request's `category`
+
+    Categories are 'predict', 'template', 'load' and 'explain'. Outside an instrumented
+    request this is a single ContextVar lookup.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        attr = f'{category}_seconds'
+        setattr(timings, attr, getattr(timings, attr) + time.perf_counter() - start)
+
+
+class RollingStats:
+    """Last `window` samples of every metric per URL name"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, name, sample):
+        with self._lock:
+            self._samples[name].append(sample)
+
+    def summary(self):
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+        report = {}
+        for name, samples in sorted(snapshot.items()):
+            report[name] = {'count': len(samples)}
+            for i, metric in enumerate(METRICS):
+                values = sorted(sample[i] for sample in samples)
+                report[name][metric] = {
+                    'mean': sum(values) / len(values),
+                    'p50': _percentile(values, 50),
+                    'p90': _percentile(values, 90),
+                    'p99': _percentile(values, 99),
+                    'max': values[-1],
+                }
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def _percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+stats = RollingStats()
+
+
+def is_enabled():
+    return getattr(settings, 'REQUEST_TIMING_ENABLED', False)
+
+
+class TimingMiddleware:
+    """
+    Time every request and report it in a Server-Timing header
+
+    Put it first in MIDDLEWARE so the wall time covers the whole stack.
+    Disabled (REQUEST_TIMING_ENABLED = False) it removes itself at startup.
+    """
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        stats.window = getattr(settings, 'REQUEST_TIMING_WINDOW', 500)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        wall = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        name = (match.view_name if match else None) or '<unresolved>'
+        stats.record(name, (
+            wall * 1000, timings.db_seconds * 1000, timings.db_queries,
+            timings.predict_seconds * 1000, timings.template_seconds * 1000,
+        ))
+        response['Server-Timing'] = ', '.join([
+            f'app;dur={wall * 1000:.2f}',
+            f'db;dur={timings.db_seconds * 1000:.2f};desc="{timings.db_queries} queries"',
+            f'predict;dur={timings.predict_seconds * 1000:.2f}',
+            f'tpl;dur={timings.template_seconds * 1000:.2f}',
+        ] + ([f'model-load;dur={timings.load_seconds * 1000:.2f}'] if timings.load_seconds else [])
+          + ([f'explain;dur={timings.explain_seconds * 1000:.2f}'] if timings.explain_seconds else []))
+        return response
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose top-level renders count as template time"""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,103 @@
+"""
+Prediction job queue
+DB-backed queue of PhysiologicalData rows waiting for an ML prediction
+"""
+import os
+import socket
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import PhysiologicalData, PredictionJob
+from . import data_versions, rollups
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(data):
+    """Queue a saved PhysiologicalData row for scoring"""
+    data.predicted_level = 'Pending'
+    data.save(update_fields=['predicted_level'])
+    return PredictionJob.objects.create(data=data)
+
+
+def claim_batch(worker, batch_size):
+    """
+    Atomically move up to batch_size pending jobs to running for this worker
+
+    The conditional UPDATE only touches rows that are still pending, so two
+    workers racing for the same ids never both get them.
+
+    Returns:
+        list: Claimed PredictionJob objects with their data rows loaded
+    """
+    with transaction.atomic():
+        ids = list(
+            PredictionJob.objects.filter(status=PredictionJob.PENDING)
+            .order_by('created_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        PredictionJob.objects.filter(id__in=ids, status=PredictionJob.PENDING).update(
+            status=PredictionJob.RUNNING, worker=worker, started_at=timezone.now(),
+        )
+    return list(
+        PredictionJob.objects.filter(id__in=ids, status=PredictionJob.RUNNING, worker=worker)
+        .select_related('data')
+    )
+
+
+def feature_rows(jobs):
+    """Feature dicts for the claimed jobs, in job order, read from the packed blobs"""
+    return [job.data.features for job in jobs]
+
+
+def complete(jobs, predictions):
+    """
+    Store (predicted_label, confidence) results and mark jobs done
+
+    Both tables are written with one bulk_update each.
+    """
+    now = timezone.now()
+    rows = []
+    for job, (predicted_label, confidence) in zip(jobs, predictions):
+        data = job.data
+        data.predicted_level = predicted_label
+        data.confidence_amused = confidence.get('Amused', 0)
+        data.confidence_neutral = confidence.get('Neutral', 0)
+        data.confidence_stressed = confidence.get('Stressed', 0)
+        rows.append(data)
+        job.status = PredictionJob.DONE
+        job.finished_at = now
+        job.error = ''
+    with transaction.atomic():
+        PhysiologicalData.objects.bulk_update(
+            rows, ['predicted_level', 'confidence_amused', 'confidence_neutral', 'confidence_stressed']
+        )
+        PredictionJob.objects.bulk_update(jobs, ['status', 'finished_at', 'error'])
+        rollups.record_physiological(rows)
+        data_versions.bump(*{data.user_id for data in rows})
+
+
+def fail(jobs, error, max_attempts=3):
+    """Put jobs back in the queue, or mark them failed after max_attempts"""
+    for job in jobs:
+        job.attempts += 1
+        job.error = str(error)[:1000]
+        job.status = PredictionJob.FAILED if job.attempts >= max_attempts else PredictionJob.PENDING
+        job.finished_at = timezone.now() if job.status == PredictionJob.FAILED else None
+    PredictionJob.objects.bulk_update(jobs, ['attempts', 'error', 'status', 'finished_at'])
+    failed = [job.data for job in jobs if job.status == PredictionJob.FAILED]
+    for data in failed:
+        data.predicted_level = 'Prediction error'
+    PhysiologicalData.objects.bulk_update(failed, ['predicted_level'])
+    data_versions.bump(*{data.user_id for data in failed})
+
+
+def requeue_stale(timeout_seconds=300):
+    """Return jobs stuck in running (e.g. a killed worker) to the queue"""
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    return PredictionJob.objects.filter(status=PredictionJob.RUNNING, started_at__lt=cutoff).update(
+        status=PredictionJob.PENDING, worker='',
+    )
@@ -0,0 +1,179 @@
+"""
+Journal full-text search
+SQLite FTS5 index over JournalEntry.content with visibility-filtered, ranked and highlighted results
+"""
+import re
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .models import JournalEntry
+
+FTS_TABLE = 'predictor_journal_fts'
+
+# External-content index: the text is read back from the journal table by
+# rowid, so nothing is stored twice. Triggers keep it in step with writes.
+# The prefix indexes serve the search-as-you-type last term, which would
+# otherwise expand into every indexed word sharing its first letters.
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"content, content='predictor_journalentry', content_rowid='id', tokenize='porter unicode61', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS predictor_journal_fts_ai AFTER INSERT ON predictor_journalentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS predictor_journal_fts_ad AFTER DELETE ON predictor_journalentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS predictor_journal_fts_au AFTER UPDATE OF content ON predictor_journalentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+]
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS predictor_journal_fts_au',
+    'DROP TRIGGER IF EXISTS predictor_journal_fts_ad',
+    'DROP TRIGGER IF EXISTS predictor_journal_fts_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+# The visibility rule of queries.journal_querysets: the anonymous feed plus
+# the user's own named entries. %s is the user id, NULL for anonymous users.
+VISIBLE_SQL = 'j.anonymous OR j.user_id = %s'
+
+MAX_TERMS = 8
+# Shortest last term matched as a prefix; one letter has no prefix index
+MIN_PREFIX = 2
+# Private-use markers around matches; the snippet is escaped before they become <mark>
+_OPEN, _CLOSE = '\ue000', '\ue001'
+
+
+def is_supported(conn=connection):
+    return conn.vendor == 'sqlite'
+
+
+def create_index(conn=connection):
+    """Create the FTS table and its sync triggers, then index existing rows"""
+    with conn.cursor() as cursor:
+        for sql in CREATE_SQL:
+            cursor.execute(sql)
+    rebuild_index(conn)
+
+
+def drop_index(conn=connection):
+    with conn.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def rebuild_index(conn=connection):
+    """Re-read every journal row into the index (backfill / repair)"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def optimize_index(conn=connection):
+    """Merge the index b-trees into one; worth running after large backfills"""
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def terms(query):
+    """Word terms of a user query; punctuation and FTS5 syntax are dropped"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def match_expression(query):
+    """
+    FTS5 MATCH string for a user query
+
+    Every term is quoted, so nothing the user types is parsed as FTS5
+    syntax (column filters, NEAR, ...). The last term matches as a prefix
+    once it is MIN_PREFIX characters long.
+
+    Returns:
+        str or None: None when the query has no searchable terms
+    """
+    words = terms(query)
+    if not words:
+        return None
+    quoted = [f'"{w}"' for w in words]
+    if len(words[-1]) >= MIN_PREFIX:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def candidate_limit():
+    """Newest visible matches that get ranked; None ranks them all"""
+    return getattr(settings, 'JOURNAL_SEARCH_CANDIDATES', 1000)
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>'))
+
+
+def search(query, user=None, offset=0, limit=20):
+    """
+    Ranked journal search over the anonymous feed and the user's own entries
+
+    Scoring every match of a common word grows with the journal, so only
+    the newest candidate_limit() visible matches are ranked: walking the
+    index newest-first to find the cut-off is cheap, and bm25 then runs on
+    a bounded set whatever the size of the table.
+
+    Args:
+        query: Free text typed by the user
+        user: Requesting user; None or anonymous only sees anonymous entries
+        offset, limit: Page window over the bm25-ranked results
+
+    Returns:
+        tuple: (entries, has_more) where each JournalEntry carries a
+        `snippet` with the matches wrapped in <mark>
+    """
+    match = match_expression(query)
+    if match is None:
+        return [], False
+    if not is_supported():
+        return _search_fallback(query, user, offset, limit)
+
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    joined = (f"FROM {FTS_TABLE} JOIN predictor_journalentry j ON j.id = {FTS_TABLE}.rowid "
+              f"WHERE {FTS_TABLE} MATCH %s AND ({VISIBLE_SQL})")
+    with connection.cursor() as cursor:
+        lowest = 0
+        candidates = candidate_limit()
+        if candidates:
+            cursor.execute(
+                f"SELECT {FTS_TABLE}.rowid {joined} ORDER BY {FTS_TABLE}.rowid DESC LIMIT 1 OFFSET %s",
+                [match, user_id, candidates - 1],
+            )
+            row = cursor.fetchone()
+            lowest = row[0] if row else 0
+        cursor.execute(
+            f"SELECT {FTS_TABLE}.rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', 16) "
+            f"{joined} AND {FTS_TABLE}.rowid >= %s ORDER BY rank LIMIT %s OFFSET %s",
+            [_OPEN, _CLOSE, match, user_id, lowest, limit + 1, offset],
+        )
+        rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    entries = JournalEntry.objects.select_related('user').in_bulk([pk for pk, _ in rows])
+    results = []
+    for pk, snippet in rows:
+        entry = entries.get(pk)
+        if entry is not None:
+            entry.snippet = _highlight(snippet)
+            results.append(entry)
+    return results, has_more
+
+
+def _search_fallback(query, user, offset, limit):
+    """Unranked substring search for databases without FTS5"""
+    from django.db.models import Q
+    from .queries import NEWEST_FIRST
+    visible = Q(anonymous=True)
+    if user is not None and user.is_authenticated:
+        visible |= Q(user=user, anonymous=False)
+    queryset = JournalEntry.objects.filter(visible).select_related('user').order_by(*NEWEST_FIRST)
+    for word in terms(query):
+        queryset = queryset.filter(content__icontains=word)
+    entries = list(queryset[offset:offset + limit + 1])
+    for entry in entries:
+        entry.snippet = escape(entry.content[:200])
+    return entries[:limit], len(entries) > limit
@@ -0,0 +1,93 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from predictor import benchmarks
+from predictor.training import DATA_PATH
+
+
+class Command(BaseCommand):
+    help = 'Benchmark StressPredictor and the prediction views and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark_results.json', help='Where the JSON report is written')
+        parser.add_argument('--data', default=DATA_PATH, help='CSV the benchmark rows are drawn from')
+        parser.add_argument('--repeat', type=int, default=1000, help='Single-row predictions timed')
+        parser.add_argument('--batch-sizes', default=','.join(map(str, benchmarks.DEFAULT_BATCH_SIZES)))
+        parser.add_argument('--requests', type=int, default=50, help='Requests timed per view')
+        parser.add_argument('--skip-views', action='store_true', help='Only benchmark the predictor')
+        parser.add_argument('--skip-load', action='store_true', help='Skip the fresh-process load probes')
+        parser.add_argument('--compare', help='Earlier report to compare against')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Relative change that counts as a regression (default 0.10)')
+
+    def handle(self, *args, **options):
+        from predictor.ml_predictor import StressPredictor
+
+        # A private predictor: no cache and no reloads, so the numbers are the model's own
+        predictor = StressPredictor()
+        if not predictor.is_loaded():
+            raise CommandError('ML model not loaded')
+        features = predictor.get_required_features()
+        matrix = benchmarks.load_rows(features, options['data'])
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size]
+
+        report = {
+            'environment': benchmarks.environment(),
+            'model': {
+                'version': predictor.version,
+                'source': predictor.load_stats.get('source'),
+                'n_features': len(features),
+            },
+        }
+        if not options['skip_load']:
+            self.stdout.write('Measuring model load...')
+            report['load'] = {
+                'compiled': benchmarks.bench_load(settings.BASE_DIR, use_compiled=True),
+                'pickle': benchmarks.bench_load(settings.BASE_DIR, use_compiled=False),
+            }
+        self.stdout.write('Measuring single-row latency...')
+        report['single'] = benchmarks.bench_single(predictor, matrix, repeat=options['repeat'])
+        self.stdout.write('Measuring batch throughput...')
+        report['batch'] = benchmarks.bench_batches(predictor, matrix, batch_sizes)
+        if not options['skip_views']:
+            self.stdout.write('Measuring views...')
+            report['views'] = benchmarks.bench_views(matrix, features, requests=options['requests'])
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self._summary(report)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+        if options['compare']:
+            self._compare(options['compare'], report, options['threshold'])
+
+    def _summary(self, report):
+        single = report['single']
+        self.stdout.write(f"predict() latency: p50 {single['p50_ms']:.3f} ms, p99 {single['p99_ms']:.3f} ms")
+        for size, stats in report['batch'].items():
+            self.stdout.write(f"predict_many({size:>5}): {stats['mean_ms']:9.3f} ms, "
+                              f"{stats['rows_per_second']:12,.0f} rows/s")
+        for source, load in report.get('load', {}).items():
+            if 'error' in load:
+                self.stdout.write(self.style.WARNING(f"load ({source}): {load['error']}"))
+            else:
+                self.stdout.write(f"load ({load['source']}): {load['load_seconds'] * 1000:.1f} ms, "
+                                  f"+{load['rss_model_mb']:.1f} MB RSS")
+        for name, stats in report.get('views', {}).items():
+            if isinstance(stats, dict):
+                self.stdout.write(f"{name}: p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms")
+
+    def _compare(self, path, report, threshold):
+        try:
+            with open(path, 'r') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read baseline {path}: {e}')
+        rows = benchmarks.compare(baseline, report, threshold)
+        regressions = [row for row in rows if row[4]]
+        for name, old, new, change, regressed in rows:
+            line = f'{name:45} {old:12.4f} -> {new:12.4f} ({change:+.1%})'
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+        if regressions:
+            raise CommandError(f'{len(regressions)} metric(s) regressed by more than {threshold:.0%}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}'))
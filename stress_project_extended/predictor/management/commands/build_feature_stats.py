@@ -0,0 +1,36 @@
+import os
+import json
+from django.core.management.base import BaseCommand, CommandError
+from predictor import training
+from predictor.preprocessing import compute_feature_stats, FEATURE_STATS_FILENAME
+
+
+class Command(BaseCommand):
+    help = 'Write feature_stats.json (training medians and ranges) for a model trained before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', default=training.DATA_PATH, help='Path to merged.csv')
+        parser.add_argument('--test-size', type=float, default=0.1, help='Split used when the model was trained')
+        parser.add_argument('--random-state', type=int, default=0)
+        parser.add_argument('--group-split', action='store_true')
+        parser.add_argument('--model-dir', default=training.MODEL_DIR)
+
+    def handle(self, *args, **options):
+        model_dir = options['model_dir']
+        features_path = os.path.join(model_dir, 'features.json')
+        if not os.path.exists(features_path):
+            raise CommandError(f'No features.json in {model_dir}')
+        with open(features_path, 'r') as f:
+            features = json.load(f)
+
+        X, y, groups, _ = training.load_dataset(options['data'], features=features)
+        X_train = training.split_dataset(
+            X, y, groups, test_size=options['test_size'], random_state=options['random_state'],
+            group_split=options['group_split'],
+        )[0]
+        stats = compute_feature_stats(X_train, features)
+        training._write_json(os.path.join(model_dir, FEATURE_STATS_FILENAME), stats, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {FEATURE_STATS_FILENAME} from {stats["rows"]} training rows; '
+            f'running predictors pick it up on their next model load'
+        ))
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from predictor import queries
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN on the per-user list and history queries and fail if one stops using its index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Explain the queries for this username (default: a placeholder id)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only failures')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'Query plan checks are written for SQLite, not {connection.vendor}')
+
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']}")
+        else:
+            # The plan doesn't depend on which user is asked for
+            user = User(pk=0, username='plan-check')
+
+        # History pages are explained past a cursor, as when scrolling deep
+        cursor = (timezone.now(), 2 ** 31)
+        failures = []
+        for name, problems, plan in queries.check_query_plans(user, cursor):
+            if problems:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(f'{name}: ok')
+            if problems or options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+        if failures:
+            raise CommandError(f"{len(failures)} query plan(s) regressed: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All list queries use their indexes'))
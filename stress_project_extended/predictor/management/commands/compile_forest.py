@@ -0,0 +1,34 @@
+import os
+import json
+import pickle
+import time
+from django.core.management.base import BaseCommand
+from predictor.forest import export_forest, COMPILED_DIRNAME
+from predictor.training import MODEL_DIR
+
+
+class Command(BaseCommand):
+    help = 'Export the serving RandomForest as memory-mappable node arrays for fast worker startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-dir', default=MODEL_DIR)
+
+    def handle(self, *args, **options):
+        model_dir = options['model_dir']
+        model_path = os.path.join(model_dir, 'stress_model.joblib')
+        with open(model_path, 'rb') as f:
+            model = pickle.load(f)
+
+        version = None
+        manifest_path = os.path.join(model_dir, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                version = json.load(f).get('version')
+
+        start = time.perf_counter()
+        meta = export_forest(model, os.path.join(model_dir, COMPILED_DIRNAME),
+                             source_path=model_path, version=version)
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled {meta['n_trees']} trees / {meta['n_nodes']} nodes with contribution tables "
+            f"in {time.perf_counter() - start:.2f}s"
+        ))
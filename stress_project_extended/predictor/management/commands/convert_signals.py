@@ -0,0 +1,28 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from predictor.signal_store import convert_directory
+
+
+class Command(BaseCommand):
+    help = 'Convert raw signal CSVs into memory-mappable .npy columns (only stale files by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'data_dir', nargs='?',
+            default=os.path.join(settings.BASE_DIR.parent, 'model', 'data', 'raw_subset'),
+            help='Directory with the seconds,<signal> CSV files',
+        )
+        parser.add_argument('--cache-dir', default=None, help='Where to write the .npy files')
+        parser.add_argument('--force', action='store_true', help='Re-convert even unchanged files')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        results = convert_directory(options['data_dir'], options['cache_dir'], options['force'])
+        converted = sum(1 for _, done in results if done)
+        for path, done in results:
+            self.stdout.write(f"{'converted' if done else 'up to date'}: {os.path.basename(path)}")
+        self.stdout.write(self.style.SUCCESS(
+            f'{converted}/{len(results)} files converted in {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from predictor import journal_search
+from predictor.models import JournalEntry
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the journal full-text index (recreates missing triggers too)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--optimize', action='store_true', help='Merge the index segments afterwards')
+
+    def handle(self, *args, **options):
+        if not journal_search.is_supported(connection):
+            raise CommandError(f'Full-text search needs SQLite FTS5, not {connection.vendor}')
+        start = time.perf_counter()
+        # Idempotent: a table rebuild by a later JournalEntry migration drops the triggers
+        journal_search.create_index(connection)
+        if options['optimize']:
+            journal_search.optimize_index(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {JournalEntry.objects.count()} journal entries in {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,24 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from predictor import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user daily/weekly dashboard rollups from the raw tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this username')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']}")
+        start = time.perf_counter()
+        written = rollups.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} rollup rows in {time.perf_counter() - start:.2f}s'
+        ))
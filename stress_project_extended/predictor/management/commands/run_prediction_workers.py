@@ -0,0 +1,79 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from predictor import jobs
+
+
+def _init_worker():
+    """Load Django and the model once per worker process"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    from predictor.ml_predictor import get_predictor
+    get_predictor().warm_up()
+
+
+def _score(rows):
+    from predictor.ml_predictor import get_predictor
+    return get_predictor().predict_labeled(rows)
+
+
+class Command(BaseCommand):
+    help = 'Drain queued PhysiologicalData predictions with a pool of local worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (0 = score in this process)')
+        parser.add_argument('--batch-size', type=int, default=256, help='Jobs claimed per round')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle')
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Requeue running jobs older than this many seconds')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        worker = jobs.worker_id()
+        requeued = jobs.requeue_stale(options['stale_after'])
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale jobs')
+
+        pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) if processes else None
+        if pool is None:
+            _init_worker()
+        self.stdout.write(f'Worker {worker} started with {processes or "no"} processes')
+        try:
+            while True:
+                batch = jobs.claim_batch(worker, options['batch_size'])
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                self._process(batch, pool, processes, options['max_attempts'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def _process(self, batch, pool, processes, max_attempts):
+        start = time.perf_counter()
+        rows = jobs.feature_rows(batch)
+        try:
+            if pool is None:
+                predictions = _score(rows)
+            else:
+                # One vectorized call per process on a contiguous slice
+                size = -(-len(rows) // processes)
+                chunks = [rows[i:i + size] for i in range(0, len(rows), size)]
+                predictions = [p for chunk in pool.map(_score, chunks) for p in chunk]
+            jobs.complete(batch, predictions)
+        except Exception as e:
+            jobs.fail(batch, e, max_attempts)
+            self.stderr.write(f'Batch of {len(batch)} failed: {e}')
+            return
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Scored {len(batch)} jobs in {elapsed * 1000:.0f} ms')
@@ -0,0 +1,238 @@
+import os
+import time
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+
+# One predictor per process, all loaded from the same snapshot of the
+# serving artifacts so a long run never mixes model versions
+_predictor = None
+
+
+def _init_worker(model_dir):
+    global _predictor
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    from predictor.ml_predictor import StressPredictor
+    _predictor = StressPredictor(model_dir=model_dir)
+
+
+def _snapshot_model(snapshot_dir, attempts=3):
+    """
+    Copy the serving artifacts into snapshot_dir
+
+    Workers start whenever the pool spawns them, so they load this copy
+    rather than the serving directory a deploy may replace mid-run. A copy
+    that overlapped a deploy (the artifact signature changed) is retried.
+
+    Raises:
+        CommandError: If the artifacts kept changing while being copied
+    """
+    from predictor.forest import COMPILED_DIRNAME
+    from predictor.ml_predictor import MODEL_DIR, StressPredictor
+    from predictor.preprocessing import FEATURE_STATS_FILENAME
+
+    serving = StressPredictor(model_dir=MODEL_DIR, lazy=True)
+    for _ in range(attempts):
+        signature = serving.artifact_signature()
+        for name in ('stress_model.joblib', 'labels.json', 'features.json', FEATURE_STATS_FILENAME, 'manifest.json'):
+            if os.path.exists(os.path.join(MODEL_DIR, name)):
+                shutil.copyfile(os.path.join(MODEL_DIR, name), os.path.join(snapshot_dir, name))
+        compiled_dir = os.path.join(MODEL_DIR, COMPILED_DIRNAME)
+        if os.path.isdir(compiled_dir):
+            shutil.rmtree(os.path.join(snapshot_dir, COMPILED_DIRNAME), ignore_errors=True)
+            shutil.copytree(compiled_dir, os.path.join(snapshot_dir, COMPILED_DIRNAME))
+        if serving.artifact_signature() == signature:
+            return
+    raise CommandError('The model was redeployed while being read; try again')
+
+
+def _score(frame):
+    """
+    Score one chunk of feature columns
+
+    Rows that fail validation get an empty label, NaN probabilities and a
+    description of what is wrong with them.
+
+    Returns:
+        tuple: (label names, probabilities, probability column labels, problems)
+    """
+    import numpy as np
+    prepared = _predictor.prepare(frame)
+    class_labels = _predictor.class_labels()
+    labels = [''] * len(frame)
+    probabilities = np.full((len(frame), len(class_labels)), np.nan)
+    if prepared.valid.any():
+        _, scored = _predictor.predict_many(prepared.matrix[prepared.valid])
+        probabilities[prepared.valid] = scored
+        # class_labels follows the probability columns, so the label is found
+        # by column position; predict_many's class values need not be 0..n-1
+        for row, position in zip(np.flatnonzero(prepared.valid), scored.argmax(axis=1)):
+            labels[row] = class_labels[position]
+    problems = [''] * len(frame)
+    for problem in prepared.problems:
+        problems[problem['row']] = '; '.join(
+            f"{kind}: {','.join(names)}" for kind, names in problem.items() if kind != 'row'
+        )
+    return labels, probabilities, class_labels, problems
+
+
+def _read_chunks(path, chunk_size, columns):
+    """Yield DataFrames of at most chunk_size rows with only the needed columns"""
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError('Reading Parquet needs pyarrow (pip install pyarrow)')
+        parquet = pq.ParquetFile(path)
+        missing = [c for c in columns if c not in parquet.schema_arrow.names]
+        if missing:
+            raise CommandError(f"Input is missing columns: {', '.join(missing)}")
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+        header = list(pd.read_csv(path, nrows=0).columns)
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise CommandError(f"Input is missing columns: {', '.join(missing)}")
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+class _Writer:
+    """Appends result chunks to a CSV or Parquet file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._first = True
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError('Writing Parquet needs pyarrow (pip install pyarrow)')
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class Command(BaseCommand):
+    help = 'Score a CSV or Parquet export of feature windows with the current model, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='CSV or .parquet file with the features.json columns')
+        parser.add_argument('output', help='CSV or .parquet file to write predictions to')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows read and scored per chunk')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Scoring processes (0 = score in this process)')
+        parser.add_argument('--keep', default='',
+                            help='Comma-separated input columns copied to the output, e.g. subject,label')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['input']):
+            raise CommandError(f"No such file: {options['input']}")
+        chunk_size = max(1, options['chunk_size'])
+        processes = max(0, options['processes'])
+        keep = [c for c in options['keep'].split(',') if c]
+
+        with tempfile.TemporaryDirectory(prefix='score_file-') as model_dir:
+            _snapshot_model(model_dir)
+            _init_worker(model_dir)
+            if not _predictor.is_loaded():
+                raise CommandError('ML model not loaded')
+            self._run(options, chunk_size, processes, keep, model_dir)
+
+    def _run(self, options, chunk_size, processes, keep, model_dir):
+        import numpy as np
+
+        features = _predictor.get_required_features()
+        self.stdout.write(f'Model version {_predictor.version}, {len(features)} features, '
+                          f'{processes or "no"} worker processes')
+
+        columns = list(dict.fromkeys(features + keep))
+        chunks = _read_chunks(options['input'], chunk_size, columns)
+        writer = _Writer(options['output'])
+        pool = (ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(model_dir,))
+                if processes else None)
+
+        start = time.perf_counter()
+        written = 0
+        rejected = 0
+        next_row = 0
+        # Chunks in flight, oldest first; results are written in input order
+        pending = deque()
+        max_pending = 2 * max(processes, 1)
+
+        def write_oldest():
+            nonlocal written, rejected
+            frame, first_row, future = pending.popleft()
+            labels, probabilities, class_labels, problems = future.result()
+            out = frame[keep].reset_index(drop=True)
+            out.insert(0, 'row', np.arange(first_row, first_row + len(frame)))
+            out['predicted_level'] = labels
+            for i, label in enumerate(class_labels):
+                out[f'prob_{label}'] = probabilities[:, i]
+            out['problems'] = problems
+            writer.write(out)
+            written += len(frame)
+            rejected += sum(1 for problem in problems if problem)
+            self.stdout.write(f'{written} rows scored, {written / (time.perf_counter() - start):,.0f} rows/s')
+
+        try:
+            for frame in chunks:
+                if pool is None:
+                    future = _ImmediateResult(_score(frame[features]))
+                else:
+                    future = pool.submit(_score, frame[features])
+                pending.append((frame, next_row, future))
+                next_row += len(frame)
+                # Write whatever is finished; only wait when too many chunks are in flight
+                while pending and (len(pending) > max_pending or pending[0][2].done()):
+                    write_oldest()
+            while pending:
+                write_oldest()
+        finally:
+            writer.close()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - start
+        rate = written / elapsed if elapsed else 0
+        if rejected:
+            self.stdout.write(self.style.WARNING(
+                f'{rejected} rows failed validation and were not scored (see the problems column)'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} predictions to {options['output']} in {elapsed:.2f}s ({rate:,.0f} rows/s)"
+        ))
+
+
+class _ImmediateResult:
+    """Future-like wrapper for chunks scored in this process"""
+
+    def __init__(self, result):
+        self._result = result
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self._result
@@ -0,0 +1,141 @@
+import os
+import json
+import pickle
+import warnings
+from django.core.management.base import BaseCommand, CommandError
+from predictor import benchmarks, slimming, training
+from predictor.preprocessing import compute_feature_stats
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def _depth_list(value):
+    return [None if v.lower() == 'none' else int(v) for v in value.split(',') if v]
+
+
+class Command(BaseCommand):
+    help = 'Sweep smaller forests, write a Pareto report of accuracy vs latency and optionally promote one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', default=training.DATA_PATH, help='Path to merged.csv')
+        parser.add_argument('--test-size', type=float, default=0.1, help='Must match the split the serving model used')
+        parser.add_argument('--random-state', type=int, default=0)
+        parser.add_argument('--group-split', action='store_true')
+        parser.add_argument('--jobs', type=int, default=-1, help='Cores used for fitting (-1 = all)')
+        parser.add_argument('--n-estimators', default=','.join(map(str, slimming.DEFAULT_N_ESTIMATORS)))
+        parser.add_argument('--max-depth', default=','.join(str(d).lower() for d in slimming.DEFAULT_MAX_DEPTHS),
+                            help="Comma-separated depths; 'none' is unbounded")
+        parser.add_argument('--min-samples-leaf', default=','.join(map(str, slimming.DEFAULT_MIN_SAMPLES_LEAF)))
+        parser.add_argument('--no-fit', action='store_true', help='Only prune the serving forest')
+        parser.add_argument('--no-prune', action='store_true', help='Only refit')
+        parser.add_argument('--repeat', type=int, default=300, help='Single-row predictions timed per candidate')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--output', default='slim_report.json', help='Where the JSON report is written')
+        parser.add_argument('--promote', metavar='ID',
+                            help="Save and promote this candidate, or 'auto' for the fastest within --max-accuracy-loss")
+        parser.add_argument('--max-accuracy-loss', type=float, default=0.5,
+                            help="Accuracy points 'auto' may give up against the serving model (default 0.5)")
+        parser.add_argument('--model-dir', default=training.MODEL_DIR)
+
+    def handle(self, *args, **options):
+        X, y, groups, data_hash = training.load_dataset(options['data'])
+        X_train, X_test, y_train, y_test = training.split_dataset(
+            X, y, groups, test_size=options['test_size'], random_state=options['random_state'],
+            group_split=options['group_split'],
+        )
+        base_model = self._serving_model(options['model_dir'], X.shape[1])
+        build = dict(n_jobs=options['jobs'], random_state=options['random_state'])
+
+        promote = options['promote']
+        if promote and promote != 'auto':
+            # A named candidate is rebuilt and timed against the serving model;
+            # fits are deterministic under --random-state
+            try:
+                specs = [slimming.parse_id(promote)]
+            except ValueError as e:
+                raise CommandError(str(e))
+            if specs[0]['kind'] == 'prune' and base_model is None:
+                raise CommandError('No serving model to prune')
+        else:
+            specs = slimming.grid(
+                _int_list(options['n_estimators']), _depth_list(options['max_depth']),
+                _int_list(options['min_samples_leaf']), fit=not options['no_fit'], prune=not options['no_prune'],
+                base_trees=len(base_model.estimators_) if base_model is not None else None,
+            )
+        if not specs:
+            raise CommandError('Nothing to sweep')
+        self.stdout.write(f'Sweeping {len(specs)} candidates on {X_train.shape[0]} training / '
+                          f'{X_test.shape[0]} held-out rows...')
+        results = slimming.sweep(specs, X_train, y_train, X_test, y_test, base_model,
+                                 repeat=options['repeat'], batch_size=options['batch_size'],
+                                 log=self.stdout.write, **build)
+
+        report = {
+            'environment': benchmarks.environment(),
+            'data': {'path': options['data'], 'sha256': data_hash, 'train_rows': int(X_train.shape[0]),
+                     'test_rows': int(X_test.shape[0]), 'group_split': options['group_split']},
+            'baseline': results[0]['id'],
+            'pareto': [r['id'] for r in slimming.pareto(results)],
+            'candidates': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self._summary(results, X_test.shape[0])
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+        if not promote:
+            return
+        if promote == 'auto':
+            chosen = slimming.choose(results, results[0], options['max_accuracy_loss'])
+            if chosen is None:
+                self.stdout.write(self.style.WARNING('No candidate is faster within the accuracy budget; nothing promoted'))
+                return
+        else:
+            chosen = results[-1]
+        model, _ = slimming.build(slimming.parse_id(chosen['id']), X_train, y_train, base_model, **build)
+        self._promote(model, chosen, X_train, y_test, data_hash, options)
+
+    def _serving_model(self, model_dir, n_features):
+        path = os.path.join(model_dir, 'stress_model.joblib')
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING('No serving model; pruned candidates are skipped'))
+            return None
+        with warnings.catch_warnings():
+            # Artifacts pickled by an older scikit-learn still predict correctly
+            warnings.simplefilter('ignore')
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+        if getattr(model, 'n_features_in_', n_features) != n_features:
+            raise CommandError(f'Serving model expects {model.n_features_in_} features, the data has {n_features}')
+        return model
+
+    def _summary(self, results, test_rows):
+        self.stdout.write(f"{'candidate':24} {'acc %':>7} {'Δacc':>6} {'p50 ms':>8} {'speedup':>7} "
+                          f"{'batch ms':>9} {'size KB':>8} {'load ms':>8}")
+        for r in sorted(results, key=lambda r: r['single_p50_ms']):
+            line = (f"{r['id']:24} {r['accuracy']:7.2f} {r['accuracy_delta']:+6.2f} {r['single_p50_ms']:8.3f} "
+                    f"{r['speedup']:6.1f}x {r['batch_ms']:9.2f} {r['artifact_bytes'] / 1024:8.0f} {r['load_ms']:8.2f}")
+            self.stdout.write(self.style.SUCCESS(line) if r['pareto'] else line)
+        self.stdout.write(f'Pareto candidates are highlighted; one held-out row is {100 / test_rows:.2f} accuracy points')
+
+    def _promote(self, model, result, X_train, y_test, data_hash, options):
+        metrics = {
+            'accuracy': result['accuracy'],
+            'single_p50_ms': round(result['single_p50_ms'], 4),
+            'train_rows': int(X_train.shape[0]),
+            'test_rows': int(y_test.shape[0]),
+            'group_split': options['group_split'],
+            'data_sha256': data_hash,
+            'slimmed_candidate': result['id'],
+        }
+        manifest = training.save_artifacts(
+            model, model_dir=options['model_dir'], version=training.new_version(data_hash), metrics=metrics,
+            feature_stats=compute_feature_stats(X_train, training.SELECTED_FEATURES),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Promoted {result['id']} as version {manifest['version']}: accuracy {result['accuracy']:.2f}%, "
+            f"p50 {result['single_p50_ms']:.3f} ms, {result['artifact_bytes'] / 1024:.0f} KB; "
+            f"running predictors pick it up on their next reload"
+        ))
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import subprocess
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so the numbers are real cold-start timings
+PROBE = r'''
+import os, sys, json, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from importlib import import_module
+from django.conf import settings
+import_module(settings.ROOT_URLCONF)
+t2 = time.perf_counter()
+heavy = [m for m in ('numpy', 'pandas', 'sklearn') if m in sys.modules]
+from predictor.ml_predictor import get_predictor
+t3 = time.perf_counter()
+predictor = get_predictor()
+predictor.warm_up()
+t4 = time.perf_counter()
+print(json.dumps({
+    'django_setup_seconds': t1 - t0,
+    'urlconf_import_seconds': t2 - t1,
+    'heavy_modules_after_urlconf': heavy,
+    'predictor_import_seconds': t3 - t2,
+    'model_load_seconds': t4 - t3,
+    'model_source': predictor.load_stats.get('source'),
+    'model_version': predictor.load_stats.get('version'),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Report cold-start timings: Django setup, URLconf import and model load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the raw JSON report')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'stress_project.settings'))
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            self.stderr.write(result.stderr)
+            return
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"Django setup:        {report['django_setup_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(f"URLconf import:      {report['urlconf_import_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(f"Predictor import:    {report['predictor_import_seconds'] * 1000:8.1f} ms")
+        self.stdout.write(f"Model load ({report['model_source']}): {report['model_load_seconds'] * 1000:8.1f} ms")
+        heavy = report['heavy_modules_after_urlconf']
+        if heavy:
+            self.stdout.write(self.style.WARNING(f"Imported during URLconf load: {', '.join(heavy)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('No ML libraries imported before first prediction'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from predictor import training
+
+
+class Command(BaseCommand):
+    help = 'Train the stress detection model and write versioned artifacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', default=training.DATA_PATH, help='Path to merged.csv')
+        parser.add_argument('--test-size', type=float, default=0.1)
+        parser.add_argument('--random-state', type=int, default=0)
+        parser.add_argument('--group-split', action='store_true',
+                            help='Hold out whole subjects instead of random rows')
+        parser.add_argument('--jobs', type=int, default=-1, help='Cores used for fitting (-1 = all)')
+        parser.add_argument('--n-estimators', type=int, default=100)
+        parser.add_argument('--max-depth', type=int, default=None)
+        parser.add_argument('--min-samples-leaf', type=int, default=1)
+        parser.add_argument('--no-cache', action='store_true', help='Re-parse the CSV even if a snapshot exists')
+        parser.add_argument('--model-dir', help='Where artifacts are written (default: the serving slot)')
+        parser.add_argument('--normalize-subjects', action='store_true',
+                            help='Train the personalized variant on per-subject z-scored features')
+        parser.add_argument('--no-save', action='store_true', help='Only report accuracy, keep current artifacts')
+
+    def handle(self, *args, **options):
+        manifest = training.train(
+            data_path=options['data'],
+            test_size=options['test_size'],
+            random_state=options['random_state'],
+            group_split=options['group_split'],
+            n_jobs=options['jobs'],
+            use_cache=not options['no_cache'],
+            save=not options['no_save'],
+            model_dir=options['model_dir'],
+            normalize_subjects=options['normalize_subjects'],
+            log=self.stdout.write,
+            n_estimators=options['n_estimators'],
+            max_depth=options['max_depth'],
+            min_samples_leaf=options['min_samples_leaf'],
+        )
+        metrics = manifest['metrics']
+        self.stdout.write(self.style.SUCCESS(
+            f"Version {manifest['version']}: accuracy {metrics['accuracy']:.2f}% "
+            f"(fit {metrics['fit_seconds']:.2f}s, data load {metrics['load_seconds']:.2f}s)"
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0003_predictionjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('period_start', models.DateField()),
+                ('response_low', models.IntegerField(default=0)),
+                ('response_medium', models.IntegerField(default=0)),
+                ('response_high', models.IntegerField(default=0)),
+                ('ml_amused', models.IntegerField(default=0)),
+                ('ml_neutral', models.IntegerField(default=0)),
+                ('ml_stressed', models.IntegerField(default=0)),
+                ('confidence_stressed_sum', models.FloatField(default=0)),
+                ('confidence_stressed_count', models.IntegerField(default=0)),
+                ('mood_sum', models.IntegerField(default=0)),
+                ('mood_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'period_start'), name='unique_user_rollup')],
+            },
+        ),
+    ]
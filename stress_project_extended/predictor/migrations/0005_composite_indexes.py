@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0004_userrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(condition=models.Q(('anonymous', True)), fields=['-created_at', '-id'], name='journal_anon_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='journal_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moodentry',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='mood_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='physiologicaldata',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='physio_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='response_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'completed', 'due_date'], name='task_user_completed_due_idx'),
+        ),
+    ]
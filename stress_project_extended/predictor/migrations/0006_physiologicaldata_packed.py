@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:37
+
+import math
+import struct
+from django.db import migrations, models
+
+# Layout at the time of this migration (models.PACKED_FIELDS)
+PACKED_FIELDS = [
+    'BVP_mean', 'BVP_std', 'EDA_phasic_mean', 'EDA_phasic_min', 'EDA_smna_min',
+    'EDA_tonic_mean', 'Resp_mean', 'Resp_std', 'TEMP_mean', 'TEMP_std', 'TEMP_slope',
+    'BVP_peak_freq', 'age', 'height', 'weight',
+    'confidence_amused', 'confidence_neutral', 'confidence_stressed',
+]
+PACKED_FORMAT = f'<{len(PACKED_FIELDS)}f'
+
+
+def pack_existing(apps, schema_editor):
+    PhysiologicalData = apps.get_model('predictor', 'PhysiologicalData')
+    batch = []
+    for obj in PhysiologicalData.objects.filter(packed__isnull=True).iterator(chunk_size=2000):
+        values = [getattr(obj, f) for f in PACKED_FIELDS]
+        obj.packed = struct.pack(PACKED_FORMAT, *(math.nan if v is None else float(v) for v in values))
+        batch.append(obj)
+        if len(batch) >= 2000:
+            PhysiologicalData.objects.bulk_update(batch, ['packed'])
+            batch = []
+    if batch:
+        PhysiologicalData.objects.bulk_update(batch, ['packed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0005_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='physiologicaldata',
+            name='packed',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(pack_existing, migrations.RunPython.noop),
+    ]
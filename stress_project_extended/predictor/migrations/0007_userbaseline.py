@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:49
+
+import math
+import struct
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Layout at the time of this migration (models.BASELINE_FIELDS / BASELINE_FORMAT)
+BASELINE_FIELDS = [
+    'BVP_mean', 'BVP_std', 'EDA_phasic_mean', 'EDA_phasic_min', 'EDA_smna_min',
+    'EDA_tonic_mean', 'Resp_mean', 'Resp_std', 'TEMP_mean', 'TEMP_std', 'TEMP_slope',
+    'BVP_peak_freq',
+]
+BASELINE_FORMAT = f'<{2 * len(BASELINE_FIELDS)}d'
+
+
+def build_baselines(apps, schema_editor):
+    PhysiologicalData = apps.get_model('predictor', 'PhysiologicalData')
+    UserBaseline = apps.get_model('predictor', 'UserBaseline')
+    moments = {}
+    rows = (PhysiologicalData.objects.order_by('user_id', 'created_at', 'id')
+            .values_list('user_id', *BASELINE_FIELDS).iterator(chunk_size=2000))
+    for user_id, *x in rows:
+        if not all(v is not None and math.isfinite(v) for v in x):
+            continue
+        count, mean, m2 = moments.setdefault(user_id, [0, [0.0] * len(x), [0.0] * len(x)])
+        count += 1
+        for i, value in enumerate(x):
+            delta = value - mean[i]
+            mean[i] += delta / count
+            m2[i] += delta * (value - mean[i])
+        moments[user_id][0] = count
+    UserBaseline.objects.bulk_create([
+        UserBaseline(user_id=user_id, count=count, stats=struct.pack(BASELINE_FORMAT, *mean, *m2))
+        for user_id, (count, mean, m2) in moments.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0006_physiologicaldata_packed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBaseline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('stats', models.BinaryField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='baseline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(build_baselines, migrations.RunPython.noop),
+    ]
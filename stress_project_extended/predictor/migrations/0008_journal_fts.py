@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:54
+
+from django.db import migrations
+
+# Schema at the time of this migration (journal_search.CREATE_SQL / DROP_SQL)
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS predictor_journal_fts USING fts5("
+    "content, content='predictor_journalentry', content_rowid='id', tokenize='porter unicode61', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS predictor_journal_fts_ai AFTER INSERT ON predictor_journalentry BEGIN "
+    "INSERT INTO predictor_journal_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS predictor_journal_fts_ad AFTER DELETE ON predictor_journalentry BEGIN "
+    "INSERT INTO predictor_journal_fts(predictor_journal_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS predictor_journal_fts_au AFTER UPDATE OF content ON predictor_journalentry BEGIN "
+    "INSERT INTO predictor_journal_fts(predictor_journal_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO predictor_journal_fts(rowid, content) VALUES (new.id, new.content); END",
+    "INSERT INTO predictor_journal_fts(predictor_journal_fts) VALUES ('rebuild')",
+]
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS predictor_journal_fts_au',
+    'DROP TRIGGER IF EXISTS predictor_journal_fts_ad',
+    'DROP TRIGGER IF EXISTS predictor_journal_fts_ai',
+    'DROP TABLE IF EXISTS predictor_journal_fts',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends use the substring fallback in journal_search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictor', '0007_userbaseline'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -4,53 +4,366 @@ Loads the trained Random Forest model and makes predictions
 """
 import os
 import json
+import time
 import pickle
+import threading
 import numpy as np
+from .forest import CompiledForest, COMPILED_DIRNAME, artifact_sha256, read_meta
+from .prediction_cache import PredictionCache
+from .preprocessing import FeaturePipeline, InvalidFeatures, DEFAULT_RANGE_TOLERANCE
+from .instrumentation import timed
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'model')
+# Serving slot of the model variant trained on subject-normalized features
+NORMALIZED_MODEL_DIR = os.path.join(MODEL_DIR, 'normalized')
+
+DEFAULT_LABELS = {0: "Amused", 1: "Neutral", 2: "Stressed"}
+DEFAULT_FEATURES = [
+    'BVP_mean', 'BVP_std', 'EDA_phasic_mean', 'EDA_phasic_min', 'EDA_smna_min', 
+    'EDA_tonic_mean', 'Resp_mean', 'Resp_std', 'TEMP_mean', 'TEMP_std', 'TEMP_slope',
+    'BVP_peak_freq', 'age', 'height', 'weight'
+]
+
+class ModelState:
+    """Everything one model version needs to score; replaced as a whole on reload"""
+    def __init__(self, model=None, labels=None, features=None, version=None, manifest=None,
+                 signature=None, source=None, pipeline=None):
+        self.model = model
+        self.source = source
+        self.labels = labels or dict(DEFAULT_LABELS)
+        self.features = features or list(DEFAULT_FEATURES)
+        self.version = version
+        self.manifest = manifest or {}
+        self.signature = signature
+        self.pipeline = pipeline or FeaturePipeline(self.features)
+        # CompiledForest used for explanations; the model itself when it is one
+        self.explainer = model if isinstance(model, CompiledForest) else None
 
 class StressPredictor:
-    def __init__(self):
-        self.model = None
-        self.labels = {0: "Amused", 1: "Neutral", 2: "Stressed"}
-        self.features = [
-            'BVP_mean', 'BVP_std', 'EDA_phasic_mean', 'EDA_phasic_min', 'EDA_smna_min', 
-            'EDA_tonic_mean', 'Resp_mean', 'Resp_std', 'TEMP_mean', 'TEMP_std', 'TEMP_slope',
-            'BVP_peak_freq', 'age', 'height', 'weight'
-        ]
-        self.load_model()
+    def __init__(self, use_compiled=True, cache=None, reload_interval=None, lazy=False,
+                 range_tolerance=DEFAULT_RANGE_TOLERANCE, model_dir=MODEL_DIR):
+        """
+        Args:
+            use_compiled: Prefer the memory-mapped compiled forest when available
+            cache: Optional PredictionCache for repeated feature vectors
+            reload_interval: Seconds between checks for a new model artifact;
+                None disables hot reloading
+            lazy: Defer loading the model until it is first used
+            range_tolerance: How far outside the training range (in multiples
+                of that range) inputs may fall; None disables range checks
+            model_dir: Directory holding the serving artifacts
+        """
+        self.model_dir = model_dir
+        self.use_compiled = use_compiled
+        self.range_tolerance = range_tolerance
+        self.cache = cache
+        self.reload_interval = reload_interval
+        self.load_stats = {}
+        self._state = ModelState()
+        self._load_attempted = False
+        self._last_check = time.monotonic()
+        self._init_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        if not lazy:
+            self.load_model()
+    
+    def _current_state(self):
+        """Return the active ModelState, loading the model on first use"""
+        if not self._load_attempted:
+            with self._init_lock:
+                if not self._load_attempted:
+                    with timed('load'):
+                        self.load_model()
+        return self._state
+    
+    # The active model version; requests take one reference and keep using it
+    model = property(lambda self: self._current_state().model)
+    labels = property(lambda self: self._current_state().labels)
+    features = property(lambda self: self._current_state().features)
+    version = property(lambda self: self._current_state().version)
+    manifest = property(lambda self: self._current_state().manifest)
+    
+    def warm_up(self, background=False):
+        """Load the model now instead of on the first prediction"""
+        if background:
+            threading.Thread(target=self._current_state, name='stress-model-warmup', daemon=True).start()
+        else:
+            self._current_state()
+    
+    def artifact_signature(self):
+        """(mtime, size) of the model pickle and manifest; changes when a new model is deployed"""
+        signature = []
+        for name in ('stress_model.joblib', 'manifest.json'):
+            try:
+                stat = os.stat(os.path.join(self.model_dir, name))
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
     
     def load_model(self):
-        """Load the trained model and labels"""
-        model_path = os.path.join(os.path.dirname(__file__), 'model', 'stress_model.joblib')
-        labels_path = os.path.join(os.path.dirname(__file__), 'model', 'labels.json')
-        features_path = os.path.join(os.path.dirname(__file__), 'model', 'features.json')
+        """Load the trained model and labels, then swap them in atomically"""
+        start = time.perf_counter()
+        state = self._load_state()
+        self._load_attempted = True
+        if state is None:
+            return False
+        self.load_stats = {
+            'load_seconds': time.perf_counter() - start,
+            'source': state.source,
+            'version': state.version,
+            'loaded_at': time.time(),
+        }
+        if self.cache is not None:
+            self.cache.set_version(state.version)
+        # A single attribute assignment: in-flight predictions keep the old state
+        self._state = state
+        return True
+    
+    def _load_state(self):
+        """Build a ModelState from the files in model_dir, or None on failure"""
+        model_path = os.path.join(self.model_dir, 'stress_model.joblib')
+        labels_path = os.path.join(self.model_dir, 'labels.json')
+        features_path = os.path.join(self.model_dir, 'features.json')
+        forest_dir = os.path.join(self.model_dir, COMPILED_DIRNAME)
+        manifest_path = os.path.join(self.model_dir, 'manifest.json')
         
         try:
-            # Load model
+            signature = self.artifact_signature()
+            
+            # Load model, preferring the memory-mapped compiled forest when it
+            # was exported from the current pickle
             if os.path.exists(model_path):
-                with open(model_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                print(f"Model loaded successfully from {model_path}")
+                model_hash = artifact_sha256(model_path)
+                meta = read_meta(forest_dir) if self.use_compiled else None
+                if meta and meta.get('source_sha256') == model_hash:
+                    model = CompiledForest.load(forest_dir)
+                    source = 'compiled'
+                    print(f"Compiled model loaded successfully from {forest_dir}")
+                else:
+                    with open(model_path, 'rb') as f:
+                        model = pickle.load(f)
+                    source = 'pickle'
+                    print(f"Model loaded successfully from {model_path}")
             else:
                 print(f"Model file not found at {model_path}")
-                return False
+                return None
+            
+            # The content hash identifies the model for cache keys
+            state = ModelState(model=model, version=model_hash[:16], signature=signature, source=source)
             
             # Load labels
             if os.path.exists(labels_path):
                 with open(labels_path, 'r') as f:
                     labels_dict = json.load(f)
                     # Convert string keys to int
-                    self.labels = {int(k): v for k, v in labels_dict.items()}
+                    state.labels = {int(k): v for k, v in labels_dict.items()}
             
             # Load features
             if os.path.exists(features_path):
                 with open(features_path, 'r') as f:
-                    self.features = json.load(f)
+                    state.features = json.load(f)
             
-            return True
+            # Load training manifest (version name and metrics), if any
+            if os.path.exists(manifest_path):
+                with open(manifest_path, 'r') as f:
+                    state.manifest = json.load(f)
+            
+            # Validation and gap filling, compiled once for this feature order
+            state.pipeline = FeaturePipeline.from_model_dir(self.model_dir, state.features, self.range_tolerance)
+            if state.pipeline.medians is None:
+                print("feature_stats.json not found: missing features will be rejected, ranges not checked")
+            
+            return state
         except Exception as e:
             print(f"Error loading model: {e}")
+            return None
+    
+    def maybe_reload(self):
+        """
+        Start a background reload if the artifact changed since it was loaded
+
+        Checks at most once per reload_interval (one stat call), so it is cheap
+        enough to run on every prediction. The new model is loaded off the
+        request path and swapped in when ready.
+        """
+        if self.reload_interval is None:
+            return False
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
             return False
+        self._last_check = now
+        if self.artifact_signature() == self._state.signature:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False  # a reload is already running
+        
+        def reload():
+            try:
+                self.load_model()
+            finally:
+                self._reload_lock.release()
+        
+        threading.Thread(target=reload, name='stress-model-reload', daemon=True).start()
+        return True
     
+    def prepare(self, rows, fill_missing=False):
+        """
+        Validate a batch and convert it to the active model's feature matrix
+
+        Missing values are filled with training medians; rows that cannot be
+        scored are listed in the result's problems instead of being guessed.
+
+        Args:
+            rows: List of feature dicts, a pandas DataFrame with the feature
+                columns, or a 2-D NumPy array already in feature order
+            fill_missing: Opt in to median-filling rows that lack whole
+                signals (e.g. extracted without Resp and TEMP); by default
+                rows missing more than a quarter of the features are rejected
+
+        Returns:
+            PreparedRows: matrix, valid mask, problems and filled cell count
+        """
+        return self._current_state().pipeline.transform(rows, fill_missing=fill_missing)
+
+    def predict_many(self, rows, fill_missing=False):
+        """
+        Predict stress levels for a batch of feature rows in one pass
+
+        Args:
+            rows: List of feature dicts, a pandas DataFrame or a 2-D NumPy array
+            fill_missing: Median-fill rows that lack whole signals, as in prepare()
+
+        Returns:
+            tuple: (class_indices, probabilities) where class_indices is an int
+            array of shape (n_rows,) and probabilities is a float array of
+            shape (n_rows, n_classes) with columns in model.classes_ order
+
+        Raises:
+            InvalidFeatures: If any row fails validation; nothing is scored
+        """
+        state = self._current_state()
+        self.maybe_reload()
+        return self._predict_many(rows, state, fill_missing)
+
+    def _predict_many(self, rows, state, fill_missing=False):
+        if state.model is None:
+            raise RuntimeError("Model not loaded")
+        with timed('predict'):
+            return self._predict_rows(rows, state, fill_missing)
+
+    def _predict_rows(self, rows, state, fill_missing=False):
+        prepared = state.pipeline.transform(rows, fill_missing=fill_missing)
+        if prepared.problems:
+            raise InvalidFeatures(prepared.problems)
+        feature_array = prepared.matrix
+        if feature_array.shape[0] == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(state.model.classes_)))
+        if self.cache is None:
+            return self._score(feature_array, state.model)
+
+        # Only rows whose quantized vector is not cached go through the forest
+        keys = self.cache.keys_for(feature_array, state.version)
+        found = self.cache.get_many(keys)
+        miss_rows = [i for i, key in enumerate(keys) if key not in found]
+        if miss_rows:
+            miss_indices, miss_probabilities = self._score(feature_array[miss_rows], state.model)
+            self.cache.set_many({
+                keys[i]: (int(c), p) for i, c, p in zip(miss_rows, miss_indices, miss_probabilities)
+            })
+            for i, c, p in zip(miss_rows, miss_indices, miss_probabilities):
+                found[keys[i]] = (c, p)
+
+        class_indices = np.array([found[key][0] for key in keys], dtype=np.int64)
+        probabilities = np.vstack([found[key][1] for key in keys])
+        return class_indices, probabilities
+
+    @staticmethod
+    def _score(feature_array, model):
+        # A single pass through the forest; labels come from the argmax
+        probabilities = model.predict_proba(feature_array)
+        class_indices = np.asarray(model.classes_)[probabilities.argmax(axis=1)]
+        return class_indices.astype(np.int64), probabilities
+
+    @staticmethod
+    def _class_labels(state):
+        return [state.labels.get(int(c), "Unknown") for c in state.model.classes_]
+
+    def class_labels(self):
+        """Get label names in the column order of predict_many probabilities"""
+        return self._class_labels(self._current_state())
+
+    def predict_labeled(self, rows, fill_missing=False):
+        """
+        Predict a batch and resolve label names with the same model version
+
+        Args:
+            rows: As for predict_many()
+            fill_missing: Median-fill rows that lack whole signals, as in prepare()
+
+        Returns:
+            list: (predicted_label, confidence_dict) per row
+        """
+        state = self._current_state()
+        self.maybe_reload()
+        class_indices, probabilities = self._predict_many(rows, state, fill_missing)
+        class_labels = self._class_labels(state)
+        return [
+            (state.labels.get(int(c), "Unknown"),
+             {label: float(p) for label, p in zip(class_labels, probs)})
+            for c, probs in zip(class_indices, probabilities)
+        ]
+
+    def explain_labeled(self, rows, top=None):
+        """
+        Predict a batch and attribute each prediction to the input features
+
+        Uses Saabas path contributions from the forest's precomputed leaf
+        tables, so explaining costs about as much as predicting. Scores are
+        computed fresh (the prediction cache is not consulted).
+
+        Args:
+            rows: As for predict_many
+            top: Keep only this many contributions per row, largest first
+
+        Returns:
+            list: (predicted_label, confidence_dict, explanation) per row.
+            explanation is {'label', 'base', 'contributions'} where base is
+            the forest's average probability of the predicted class and
+            contributions lists {'feature', 'value', 'contribution'} dicts
+            sorted by absolute contribution; base plus all contributions
+            equals the predicted class's confidence
+
+        Raises:
+            InvalidFeatures: If any row fails validation
+        """
+        state = self._current_state()
+        self.maybe_reload()
+        if state.model is None:
+            raise RuntimeError("Model not loaded")
+        prepared = state.pipeline.transform(rows)
+        if prepared.problems:
+            raise InvalidFeatures(prepared.problems)
+        if state.explainer is None:
+            state.explainer = CompiledForest.from_model(state.model)
+        with timed('explain'):
+            probabilities, bias, contributions = state.explainer.explain(prepared.matrix)
+
+        class_labels = self._class_labels(state)
+        results = []
+        for x, probs, contrib in zip(prepared.matrix, probabilities, contributions):
+            k = int(probs.argmax())
+            order = np.argsort(-np.abs(contrib[:, k]), kind='stable')[:top]
+            results.append((class_labels[k], {label: float(p) for label, p in zip(class_labels, probs)}, {
+                'label': class_labels[k],
+                'base': float(bias[k]),
+                'contributions': [
+                    {'feature': state.features[j], 'value': float(x[j]), 'contribution': float(contrib[j, k])}
+                    for j in order
+                ],
+            }))
+        return results
+
     def predict(self, features_dict):
         """
         Predict stress level from physiological features
@@ -65,20 +378,7 @@ class StressPredictor:
             return "Model not loaded", None
         
         try:
-            # Extract features in the correct order
-            feature_values = [features_dict.get(feat, 0) for feat in self.features]
-            feature_array = np.array(feature_values).reshape(1, -1)
-            
-            # Make prediction
-            prediction = self.model.predict(feature_array)[0]
-            probabilities = self.model.predict_proba(feature_array)[0]
-            
-            # Get label
-            predicted_label = self.labels.get(int(prediction), "Unknown")
-            
-            # Create confidence dict
-            confidence = {self.labels[i]: float(prob) for i, prob in enumerate(probabilities)}
-            
+            predicted_label, confidence = self.predict_labeled([features_dict])[0]
             return predicted_label, confidence
         except Exception as e:
             print(f"Prediction error: {e}")
@@ -86,18 +386,68 @@ class StressPredictor:
     
     def is_loaded(self):
         """Check if model is loaded"""
-        return self.model is not None
+        return self._current_state().model is not None
     
     def get_required_features(self):
         """Get list of required features"""
         return self.features.copy()
 
-# Global predictor instance
+# Global predictor instances
 _predictor = None
+_personalized_predictor = None
+
+def _cache_from_settings():
+    """Build the PredictionCache configured by settings.PREDICTOR_CACHE, if any"""
+    try:
+        from django.conf import settings
+        config = getattr(settings, 'PREDICTOR_CACHE', None)
+    except Exception:
+        config = None
+    if not config:
+        return None
+    return PredictionCache(
+        max_size=config.get('MAX_SIZE', 1024),
+        precision=config.get('PRECISION', 4),
+        backend=config.get('BACKEND'),
+        timeout=config.get('TIMEOUT', 300),
+    )
+
+def _range_tolerance_from_settings():
+    """Allowed distance outside the training range (settings.PREDICTOR_RANGE_TOLERANCE, None disables)"""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'PREDICTOR_RANGE_TOLERANCE', DEFAULT_RANGE_TOLERANCE)
+    except Exception:
+        return DEFAULT_RANGE_TOLERANCE
+
+def _reload_interval_from_settings():
+    """Seconds between artifact checks (settings.PREDICTOR_RELOAD_INTERVAL, None disables)"""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'PREDICTOR_RELOAD_INTERVAL', 5)
+    except Exception:
+        return None
 
 def get_predictor():
     """Get or create the global predictor instance"""
     global _predictor
     if _predictor is None:
-        _predictor = StressPredictor()
+        _predictor = StressPredictor(
+            cache=_cache_from_settings(),
+            reload_interval=_reload_interval_from_settings(),
+            range_tolerance=_range_tolerance_from_settings(),
+            lazy=True,
+        )
     return _predictor
+
+def get_personalized_predictor():
+    """Get or create the global predictor for the subject-normalized model variant"""
+    global _personalized_predictor
+    if _personalized_predictor is None:
+        _personalized_predictor = StressPredictor(
+            reload_interval=_reload_interval_from_settings(),
+            range_tolerance=_range_tolerance_from_settings(),
+            model_dir=NORMALIZED_MODEL_DIR,
+            lazy=True,
+        )
+    return _personalized_predictor
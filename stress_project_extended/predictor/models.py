@@ -1,5 +1,7 @@
 
-from django.db import models
+import math
+import struct
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 class Response(models.Model):
@@ -17,9 +19,100 @@ class Response(models.Model):
     predicted_level = models.CharField(max_length=30, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='response_user_created_idx')]
+
     def __str__(self):
         return f"{self.user.username} - {self.predicted_level or 'Pending'}"
 
+# Feature columns of PhysiologicalData, in the order the model expects them
+FEATURE_FIELDS = [
+    'BVP_mean', 'BVP_std', 'EDA_phasic_mean', 'EDA_phasic_min', 'EDA_smna_min',
+    'EDA_tonic_mean', 'Resp_mean', 'Resp_std', 'TEMP_mean', 'TEMP_std', 'TEMP_slope',
+    'BVP_peak_freq', 'age', 'height', 'weight'
+]
+CONFIDENCE_FIELDS = ['confidence_amused', 'confidence_neutral', 'confidence_stressed']
+
+# Fixed layout of PhysiologicalData.packed: little-endian float32 features in
+# FEATURE_FIELDS order, then the confidences (NaN until predicted)
+PACKED_FIELDS = FEATURE_FIELDS + CONFIDENCE_FIELDS
+PACKED_FORMAT = f'<{len(PACKED_FIELDS)}f'
+PACKED_SIZE = struct.calcsize(PACKED_FORMAT)
+
+class PhysiologicalDataQuerySet(models.QuerySet):
+    """Keeps the packed blob in step on bulk writes and updates and reads it back as matrices"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.pack()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if set(fields) & set(PACKED_FIELDS):
+            objs = list(objs)
+            for obj in objs:
+                obj.pack()
+            fields = [*fields, 'packed']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        """Plain UPDATE, re-packing the touched rows when a packed column changes"""
+        if not set(kwargs) & set(PACKED_FIELDS):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            ids = list(self.values_list('pk', flat=True))
+            count = super().update(**kwargs)
+            rows = self.model._base_manager.using(self.db)
+            for start in range(0, len(ids), 2000):
+                objs = list(rows.filter(pk__in=ids[start:start + 2000]))
+                for obj in objs:
+                    obj.pack()
+                rows.bulk_update(objs, ['packed'])
+        return count
+
+    def _blobs(self, user, chunk_size):
+        queryset = self if user is None else self.filter(user=user)
+        return (queryset.filter(packed__isnull=False).order_by('created_at', 'id')
+                .values_list('packed', flat=True).iterator(chunk_size=chunk_size))
+
+    @staticmethod
+    def _to_matrix(buffer, confidences):
+        import numpy as np
+        matrix = np.frombuffer(buffer, dtype='<f4').reshape(-1, len(PACKED_FIELDS))
+        return matrix if confidences else matrix[:, :len(FEATURE_FIELDS)]
+
+    def feature_matrix(self, user=None, confidences=False, chunk_size=2000):
+        """
+        Load stored feature vectors, oldest first, straight from the packed blobs
+
+        No model instances are built: the blobs are concatenated and viewed
+        as one float32 array.
+
+        Args:
+            user: Only this user's rows (default: every row of the queryset)
+            confidences: Also return the three confidence columns
+            chunk_size: Rows fetched from the database per round trip
+
+        Returns:
+            np.ndarray: (n_rows, 15) or, with confidences, (n_rows, 18) float32
+        """
+        buffer = bytearray()
+        for blob in self._blobs(user, chunk_size):
+            buffer += blob
+        return self._to_matrix(buffer, confidences)
+
+    def iter_feature_matrices(self, user=None, batch_rows=10000, confidences=False):
+        """Yield the same rows as feature_matrix() in (<= batch_rows, n) blocks"""
+        buffer = bytearray()
+        for blob in self._blobs(user, min(batch_rows, 2000)):
+            buffer += blob
+            if len(buffer) >= batch_rows * PACKED_SIZE:
+                yield self._to_matrix(bytes(buffer), confidences)
+                buffer.clear()
+        if buffer:
+            yield self._to_matrix(bytes(buffer), confidences)
+
 class PhysiologicalData(models.Model):
     """Store physiological sensor data for ML prediction"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -54,17 +147,90 @@ class PhysiologicalData(models.Model):
     confidence_amused = models.FloatField(null=True, blank=True)
     confidence_neutral = models.FloatField(null=True, blank=True)
     confidence_stressed = models.FloatField(null=True, blank=True)
+
+    # Features and confidences packed as PACKED_FORMAT, written on every save
+    packed = models.BinaryField(null=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = PhysiologicalDataQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='physio_user_created_idx')]
+
+    def pack(self):
+        """Refresh the packed blob from the field values"""
+        values = [getattr(self, f) for f in PACKED_FIELDS]
+        self.packed = struct.pack(PACKED_FORMAT, *(math.nan if v is None else float(v) for v in values))
+        return self.packed
+
+    def save(self, *args, **kwargs):
+        self.pack()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(PACKED_FIELDS):
+            kwargs['update_fields'] = [*update_fields, 'packed']
+        super().save(*args, **kwargs)
+
+    @property
+    def unpacked(self):
+        """Field values read back from the packed blob, as the model sees them (float32)"""
+        if self.packed is None:
+            return {f: getattr(self, f) for f in PACKED_FIELDS}
+        values = struct.unpack(PACKED_FORMAT, bytes(self.packed))
+        return {f: None if math.isnan(v) else v for f, v in zip(PACKED_FIELDS, values)}
+
+    @property
+    def features(self):
+        """Feature dict in FEATURE_FIELDS order, ready for StressPredictor"""
+        unpacked = self.unpacked
+        return {f: unpacked[f] for f in FEATURE_FIELDS}
+
+    @property
+    def confidence(self):
+        """Stored confidences keyed by label, like StressPredictor.predict() returns"""
+        unpacked = self.unpacked
+        return {f.split('_', 1)[1].capitalize(): unpacked[f] for f in CONFIDENCE_FIELDS}
+
     def __str__(self):
         return f"{self.user.username} - {self.predicted_level or 'Pending'} at {self.created_at}"
 
+class PredictionJob(models.Model):
+    """Queued ML prediction for a PhysiologicalData row, drained by run_prediction_workers"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    data = models.OneToOneField(PhysiologicalData, on_delete=models.CASCADE, related_name='job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=64, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'], name='predjob_status_created_idx')]
+
+    def __str__(self):
+        return f"Job {self.pk} for data {self.data_id} - {self.status}"
+
 class MoodEntry(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     mood_scale = models.IntegerField()  # 1-10
     note = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='mood_user_created_idx')]
+
     def __str__(self):
         return f"{self.user.username} - {self.mood_scale} on {self.created_at.date()}"
 
@@ -74,6 +240,10 @@ class Task(models.Model):
     due_date = models.DateField(null=True, blank=True)
     completed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'completed', 'due_date'], name='task_user_completed_due_idx')]
+
     def __str__(self):
         return f"{self.title} - {'Done' if self.completed else 'Pending'}"
 
@@ -82,6 +252,120 @@ class JournalEntry(models.Model):
     anonymous = models.BooleanField(default=False)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # journal_list reads the anonymous feed and a user's own entries as two
+        # separate newest-first slices, one per index. The anonymous one is
+        # partial because Django filters booleans as a bare `WHERE anonymous`,
+        # which SQLite only matches against an index with the same condition
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(anonymous=True),
+                         name='journal_anon_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='journal_user_created_idx'),
+        ]
+
     def __str__(self):
         who = 'Anonymous' if self.anonymous else (self.user.username if self.user else 'Anonymous')
         return f"{who} - {self.created_at.date()}"
+
+class UserRollup(models.Model):
+    """Per-user daily/weekly aggregates for the dashboard, maintained by predictor.rollups"""
+    DAY = 'day'
+    WEEK = 'week'
+    PERIOD_CHOICES = [(DAY, 'Day'), (WEEK, 'Week')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+
+    # Questionnaire results (Response.predicted_level)
+    response_low = models.IntegerField(default=0)
+    response_medium = models.IntegerField(default=0)
+    response_high = models.IntegerField(default=0)
+
+    # ML predictions (PhysiologicalData.predicted_level)
+    ml_amused = models.IntegerField(default=0)
+    ml_neutral = models.IntegerField(default=0)
+    ml_stressed = models.IntegerField(default=0)
+    confidence_stressed_sum = models.FloatField(default=0)
+    confidence_stressed_count = models.IntegerField(default=0)
+
+    # Mood entries
+    mood_sum = models.IntegerField(default=0)
+    mood_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'period_start'], name='unique_user_rollup'),
+        ]
+
+    @property
+    def response_count(self):
+        return self.response_low + self.response_medium + self.response_high
+
+    @property
+    def ml_count(self):
+        return self.ml_amused + self.ml_neutral + self.ml_stressed
+
+    @property
+    def mean_stress_level(self):
+        """Average questionnaire level on the dashboard's 1 (Low) to 3 (High) scale"""
+        if not self.response_count:
+            return None
+        return (self.response_low + 2 * self.response_medium + 3 * self.response_high) / self.response_count
+
+    @property
+    def mean_confidence_stressed(self):
+        if not self.confidence_stressed_count:
+            return None
+        return self.confidence_stressed_sum / self.confidence_stressed_count
+
+    @property
+    def mean_mood(self):
+        return self.mood_sum / self.mood_count if self.mood_count else None
+
+    def __str__(self):
+        return f"{self.user.username} - {self.period} of {self.period_start}"
+
+# Features with a per-user baseline; demographics are constant per user
+BASELINE_FIELDS = [f for f in FEATURE_FIELDS if f not in ('age', 'height', 'weight')]
+# Layout of UserBaseline.stats: float64 running means, then the sums of squared deviations
+BASELINE_FORMAT = f'<{2 * len(BASELINE_FIELDS)}d'
+
+
+class UserBaseline(models.Model):
+    """
+    Running mean/variance of a user's physiological features, maintained by predictor.baselines
+
+    Welford's algorithm: adding or removing one window is O(1), no history rescans.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='baseline')
+    count = models.IntegerField(default=0)
+    stats = models.BinaryField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def moments(self):
+        """(mean, m2) lists in BASELINE_FIELDS order"""
+        n = len(BASELINE_FIELDS)
+        if not self.stats:
+            return [0.0] * n, [0.0] * n
+        values = struct.unpack(BASELINE_FORMAT, bytes(self.stats))
+        return list(values[:n]), list(values[n:])
+
+    def set_moments(self, mean, m2):
+        self.stats = struct.pack(BASELINE_FORMAT, *mean, *m2)
+
+    @property
+    def std(self):
+        """Population standard deviation per feature, as a label-keyed dict"""
+        _, m2 = self.moments
+        return {f: math.sqrt(max(v, 0.0) / self.count) if self.count else None
+                for f, v in zip(BASELINE_FIELDS, m2)}
+
+    @property
+    def mean(self):
+        return dict(zip(BASELINE_FIELDS, self.moments[0])) if self.count else {}
+
+    def __str__(self):
+        return f"{self.user.username} - baseline of {self.count} windows"
@@ -0,0 +1,80 @@
+"""
+Keyset pagination module
+Cursor pages over (created_at, id), so a page costs the same however deep the user scrolls
+"""
+import base64
+from datetime import datetime
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def encode_cursor(obj):
+    """Opaque cursor pointing just past obj in newest-first order"""
+    raw = f'{obj.created_at.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Parse a cursor made by encode_cursor
+
+    Returns:
+        tuple: (created_at, id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    """Page size from a query parameter, clamped to 1..MAX_LIMIT"""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def after(queryset, cursor):
+    """
+    Restrict a newest-first queryset to rows strictly older than the cursor
+
+    Written as `created_at <= ts AND NOT (created_at = ts AND id >= pk)`, so
+    the created_at bound becomes a range on the (user, -created_at, -id)
+    indexes and only rows sharing the cursor's timestamp are filtered.
+    """
+    if cursor is None:
+        return queryset
+    created_at, pk = cursor
+    return queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+
+
+def keyset_page(querysets, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Fetch one page from one or more newest-first querysets
+
+    Each queryset reads at most limit + 1 rows past the cursor; several
+    querysets (the journal feed's anonymous and own slices) are merged on
+    (created_at, id).
+
+    Args:
+        querysets: List of querysets ordered by ('-created_at', '-id')
+        cursor: Decoded cursor from the previous page, or None for the first
+        limit: Page size
+
+    Returns:
+        tuple: (items, next_cursor); next_cursor is None on the last page
+    """
+    rows = [obj for queryset in querysets for obj in after(queryset, cursor)[:limit + 1]]
+    if len(querysets) > 1:
+        rows.sort(key=lambda obj: (obj.created_at, obj.pk), reverse=True)
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return items, next_cursor
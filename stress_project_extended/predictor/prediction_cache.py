@@ -0,0 +1,126 @@
+"""
+Prediction cache module
+Bounded LRU cache of predictions keyed on model version + quantized feature vector
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class PredictionCache:
+    """
+    In-process LRU cache with an optional shared Django cache behind it
+
+    Keys combine the model version with the feature vector rounded to
+    `precision` decimals, so nearly identical windows share an entry and a new
+    model never serves results computed by the old one.
+    """
+
+    def __init__(self, max_size=1024, precision=4, backend=None, timeout=300):
+        """
+        Args:
+            max_size: Maximum number of entries kept in process memory
+            precision: Decimals the feature values are rounded to
+            backend: Optional Django cache alias (e.g. 'default') shared by workers
+            timeout: Expiry in seconds for entries in the shared backend
+        """
+        self.max_size = max_size
+        self.precision = precision
+        self.backend = backend
+        self.timeout = timeout
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _shared(self):
+        if not self.backend:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend]
+
+    def set_version(self, version):
+        """Switch to a new model version, dropping everything cached for the old one"""
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+
+    def keys_for(self, matrix, version=None):
+        """
+        Build one cache key per row of a (n_rows, n_features) float array
+
+        Pass the version of the model that will score the rows, so a
+        prediction still running on an old model never lands under the new
+        version's keys.
+        """
+        version = self.version if version is None else version
+        quantized = np.round(np.asarray(matrix, dtype=np.float64), self.precision) + 0.0
+        return [
+            f"stress_pred:{version}:{hashlib.sha1(row.tobytes()).hexdigest()}"
+            for row in quantized
+        ]
+
+    def get_many(self, keys):
+        """
+        Look up keys, falling back to the shared backend for local misses
+
+        Returns:
+            dict: key -> (class_index, probabilities) for every hit
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                else:
+                    missing.append(key)
+
+        shared = self._shared()
+        if shared is not None and missing:
+            remote = shared.get_many(missing)
+            for key, value in remote.items():
+                found[key] = value
+                self._store(key, value)
+
+        with self._lock:
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def set_many(self, items):
+        """Store key -> (class_index, probabilities) pairs"""
+        for key, value in items.items():
+            self._store(key, value)
+        shared = self._shared()
+        if shared is not None and items:
+            shared.set_many(items, timeout=self.timeout)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
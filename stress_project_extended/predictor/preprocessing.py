@@ -0,0 +1,210 @@
+"""
+Feature preprocessing module
+Validates model inputs, fills gaps with training medians and builds the float matrix the forest scores
+"""
+import os
+import json
+import numbers
+import numpy as np
+
+FEATURE_STATS_FILENAME = 'feature_stats.json'
+
+# Values further than this fraction of the training range outside [min, max] are rejected
+DEFAULT_RANGE_TOLERANCE = 0.25
+
+# Rows missing more than this share of features are rejected rather than filled
+MAX_MISSING_FRACTION = 0.25
+
+
+class InvalidFeatures(ValueError):
+    """Raised for rows that cannot be scored; .problems describes each bad row"""
+
+    def __init__(self, problems):
+        self.problems = problems
+        rows = ', '.join(str(p['row']) for p in problems[:10])
+        more = f' (+{len(problems) - 10} more)' if len(problems) > 10 else ''
+        super().__init__(f'{len(problems)} invalid feature row(s): {rows}{more}')
+
+
+def compute_feature_stats(X, features):
+    """
+    Per-feature median, min and max of a training matrix
+
+    Args:
+        X: 2-D array of training rows in feature order
+        features: Column names
+
+    Returns:
+        dict: JSON-serializable stats, the content of feature_stats.json
+    """
+    X = np.asarray(X, dtype=np.float64)
+    return {
+        'features': list(features),
+        'rows': int(X.shape[0]),
+        'median': dict(zip(features, np.nanmedian(X, axis=0).tolist())),
+        'min': dict(zip(features, np.nanmin(X, axis=0).tolist())),
+        'max': dict(zip(features, np.nanmax(X, axis=0).tolist())),
+    }
+
+
+def read_feature_stats(model_dir):
+    """Load feature_stats.json from model_dir, or None if there is none"""
+    path = os.path.join(model_dir, FEATURE_STATS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def standardize(matrix, mean, std, columns):
+    """
+    Z-score the given columns against a subject's mean and standard deviation
+
+    Columns with zero spread are only centred. Training (per subject) and
+    personalized scoring (per user baseline) both go through here.
+
+    Args:
+        matrix: 2-D array of rows in feature order
+        mean, std: Per-column statistics, in the order of columns
+        columns: Indices of the columns to normalize
+
+    Returns:
+        np.ndarray: A float64 copy with those columns replaced
+    """
+    out = np.array(matrix, dtype=np.float64, order='C', ndmin=2)
+    std = np.asarray(std, dtype=np.float64)
+    out[:, columns] = (out[:, columns] - np.asarray(mean, dtype=np.float64)) / np.where(std > 0, std, 1.0)
+    return out
+
+
+class PreparedRows:
+    """
+    Result of FeaturePipeline.transform
+
+    matrix is C-contiguous float64 in feature order with gaps filled; rows
+    listed in problems must not be scored. valid is the matching boolean
+    mask and filled counts the cells replaced by a median.
+    """
+    __slots__ = ('matrix', 'valid', 'problems', 'filled')
+
+    def __init__(self, matrix, valid, problems, filled):
+        self.matrix = matrix
+        self.valid = valid
+        self.problems = problems
+        self.filled = filled
+
+
+class FeaturePipeline:
+    """
+    Input validation and conversion for one model version
+
+    Built once per loaded model from features.json and feature_stats.json:
+    the name-to-column map, medians and allowed ranges are arrays, so
+    checking a batch is a handful of vectorized comparisons. A row is bad
+    when a value is non-numeric or infinite, falls outside the training
+    range widened by `tolerance` times that range on each side, or is missing and
+    there is no median to fill it with. Rows missing more than
+    MAX_MISSING_FRACTION of the features are rejected too: filling most of
+    a row with medians would just score the median person.
+    """
+
+    def __init__(self, features, stats=None, tolerance=DEFAULT_RANGE_TOLERANCE):
+        self.features = list(features)
+        self.index = {name: i for i, name in enumerate(self.features)}
+        self.max_missing = int(len(self.features) * MAX_MISSING_FRACTION)
+        self.medians = None
+        self.low = self.high = None
+        if stats and all(f in stats.get('median', {}) for f in self.features):
+            self.medians = np.array([stats['median'][f] for f in self.features], dtype=np.float64)
+            if tolerance is not None:
+                lo = np.array([stats['min'][f] for f in self.features], dtype=np.float64)
+                hi = np.array([stats['max'][f] for f in self.features], dtype=np.float64)
+                margin = (hi - lo) * tolerance
+                self.low, self.high = lo - margin, hi + margin
+
+    @classmethod
+    def from_model_dir(cls, model_dir, features, tolerance=DEFAULT_RANGE_TOLERANCE):
+        return cls(features, read_feature_stats(model_dir), tolerance)
+
+    def describe(self):
+        return {
+            'features': len(self.features),
+            'median_fill': self.medians is not None,
+            'range_checks': self.low is not None,
+        }
+
+    def _read(self, rows):
+        """Raw matrix with NaN for missing cells, plus a mask of unusable cells"""
+        n_features = len(self.features)
+        if isinstance(rows, np.ndarray):
+            matrix = np.array(rows, dtype=np.float64, order='C', ndmin=2)
+            if matrix.ndim != 2 or matrix.shape[1] != n_features:
+                raise ValueError(f"Expected {n_features} features per row, got shape {rows.shape}")
+            return matrix, np.isinf(matrix)
+
+        if hasattr(rows, 'columns'):
+            # pandas DataFrame: absent columns become NaN, non-numeric cells are invalid
+            import pandas as pd
+            frame = rows.reindex(columns=self.features)
+            numeric = frame.apply(pd.to_numeric, errors='coerce')
+            matrix = np.ascontiguousarray(numeric.to_numpy(dtype=np.float64))
+            return matrix, (numeric.isna().to_numpy() & frame.notna().to_numpy()) | np.isinf(matrix)
+
+        matrix = np.full((len(rows), n_features), np.nan)
+        invalid = np.zeros(matrix.shape, dtype=bool)
+        index = self.index
+        for r, row in enumerate(rows):
+            for name, value in row.items():
+                j = index.get(name)
+                if j is None or value is None:
+                    continue
+                if isinstance(value, numbers.Real) and not isinstance(value, bool):
+                    matrix[r, j] = value
+                else:
+                    invalid[r, j] = True
+        return matrix, invalid | np.isinf(matrix)
+
+    def transform(self, rows, fill_missing=False):
+        """
+        Validate and convert a batch in one pass
+
+        Args:
+            rows: List of feature dicts, a pandas DataFrame or a 2-D NumPy
+                array already in feature order
+            fill_missing: Median-fill any number of missing features instead
+                of rejecting rows missing more than MAX_MISSING_FRACTION
+
+        Returns:
+            PreparedRows
+        """
+        matrix, invalid = self._read(rows)
+        missing = np.isnan(matrix) & ~invalid
+        bad = invalid.any(axis=1)
+        filled = 0
+        if missing.any():
+            if self.medians is None:
+                unfillable = missing.any(axis=1)
+            else:
+                max_missing = len(self.features) if fill_missing else self.max_missing
+                unfillable = missing.sum(axis=1) > max_missing
+                filled = int(missing[~unfillable].sum())
+                np.copyto(matrix, self.medians, where=missing)
+            bad |= unfillable
+        else:
+            unfillable = np.zeros(matrix.shape[0], dtype=bool)
+        out_of_range = None
+        if self.low is not None:
+            out_of_range = ((matrix < self.low) | (matrix > self.high)) & ~invalid
+            bad |= out_of_range.any(axis=1)
+
+        problems = []
+        for r in np.flatnonzero(bad):
+            problem = {'row': int(r)}
+            if invalid[r].any():
+                problem['invalid'] = [self.features[j] for j in np.flatnonzero(invalid[r])]
+            if unfillable[r]:
+                problem['missing'] = [self.features[j] for j in np.flatnonzero(missing[r])]
+            if out_of_range is not None and out_of_range[r].any():
+                problem['out_of_range'] = [self.features[j] for j in np.flatnonzero(out_of_range[r])]
+            problems.append(problem)
+        return PreparedRows(matrix, ~bad, problems, filled)
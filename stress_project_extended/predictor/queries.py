@@ -0,0 +1,136 @@
+"""
+Per-user list queries
+The querysets behind the dashboard, task and journal pages, shaped to match the composite indexes
+"""
+from .models import Response, MoodEntry, Task, JournalEntry, PhysiologicalData
+from .pagination import after, DEFAULT_LIMIT
+
+# Newest first, with id as tie-breaker so the order matches the
+# (user, -created_at, -id) indexes exactly and needs no extra sort
+NEWEST_FIRST = ('-created_at', '-id')
+
+
+def recent_responses(user, limit=6):
+    return Response.objects.filter(user=user).order_by(*NEWEST_FIRST)[:limit]
+
+
+def recent_moods(user, limit=5):
+    return MoodEntry.objects.filter(user=user).order_by(*NEWEST_FIRST)[:limit]
+
+
+def recent_predictions(user, limit=5):
+    return PhysiologicalData.objects.filter(user=user).order_by(*NEWEST_FIRST)[:limit]
+
+
+def user_tasks(user):
+    return Task.objects.filter(user=user).order_by('completed', 'due_date')
+
+
+def journal_querysets(user=None):
+    """
+    The newest-first querysets the journal feed is merged from
+
+    `anonymous OR user` can't be served by a single index, so the anonymous
+    feed and the user's own named entries are read separately, each walking
+    its own index.
+
+    Returns:
+        list: One unsliced queryset per source
+    """
+    entries = JournalEntry.objects.order_by(*NEWEST_FIRST)
+    # Anonymous entries never show an author; joining auth_user there would
+    # also stop SQLite from walking the index in order
+    querysets = [entries.filter(anonymous=True)]
+    if user is not None and user.is_authenticated:
+        querysets.append(entries.select_related('user').filter(user=user, anonymous=False))
+    return querysets
+
+
+def journal_slices(user=None, limit=50):
+    """The journal sources, each stopping after `limit` rows"""
+    return [queryset[:limit] for queryset in journal_querysets(user)]
+
+
+# Scrollable history feeds: kind -> newest-first querysets for a user
+HISTORY = {
+    'predictions': lambda user: [PhysiologicalData.objects.filter(user=user).order_by(*NEWEST_FIRST)],
+    'moods': lambda user: [MoodEntry.objects.filter(user=user).order_by(*NEWEST_FIRST)],
+    'responses': lambda user: [Response.objects.filter(user=user).order_by(*NEWEST_FIRST)],
+    'journal': journal_querysets,
+}
+
+
+def history_querysets(kind, user):
+    """
+    Get the querysets behind a history feed
+
+    Raises:
+        KeyError: If kind is not one of HISTORY
+    """
+    return HISTORY[kind](user)
+
+
+def dashboard_querysets(user, cursor=None):
+    """
+    Named querysets of the list pages, used by check_query_plans
+
+    Args:
+        user: User the queries are built for
+        cursor: Decoded keyset cursor; history pages are explained past it
+    """
+    querysets = {
+        'dashboard.responses': recent_responses(user),
+        'dashboard.moods': recent_moods(user),
+        'dashboard.ml_predictions': recent_predictions(user),
+        'tasks_list': user_tasks(user),
+    }
+    anonymous, own = journal_slices(user)
+    querysets['journal_list.anonymous'] = anonymous
+    querysets['journal_list.own'] = own
+    for kind in ('predictions', 'moods', 'responses'):
+        (queryset,) = history_querysets(kind, user)
+        querysets[f'history.{kind}'] = after(queryset, cursor)[:DEFAULT_LIMIT + 1]
+    anonymous, own = history_querysets('journal', user)
+    querysets['history.journal.anonymous'] = after(anonymous, cursor)[:DEFAULT_LIMIT + 1]
+    querysets['history.journal.own'] = after(own, cursor)[:DEFAULT_LIMIT + 1]
+    return querysets
+
+
+# Index each list query is expected to walk
+EXPECTED_INDEXES = {
+    'dashboard.responses': 'response_user_created_idx',
+    'dashboard.moods': 'mood_user_created_idx',
+    'dashboard.ml_predictions': 'physio_user_created_idx',
+    'tasks_list': 'task_user_completed_due_idx',
+    'journal_list.anonymous': 'journal_anon_created_idx',
+    'journal_list.own': 'journal_user_created_idx',
+    'history.predictions': 'physio_user_created_idx',
+    'history.moods': 'mood_user_created_idx',
+    'history.responses': 'response_user_created_idx',
+    'history.journal.anonymous': 'journal_anon_created_idx',
+    'history.journal.own': 'journal_user_created_idx',
+}
+
+
+def check_query_plans(user, cursor=None):
+    """
+    EXPLAIN QUERY PLAN every list query (SQLite)
+
+    A query regresses when its plan stops naming the expected index or
+    sorts in a temporary b-tree.
+
+    Returns:
+        list: (name, problems, plan) per query; problems is empty when the
+        plan is as expected
+    """
+    results = []
+    for name, queryset in dashboard_querysets(user, cursor).items():
+        plan = queryset.explain()
+        problems = []
+        index = EXPECTED_INDEXES.get(name)
+        if index and index not in plan:
+            problems.append(f'does not use {index}')
+        if 'USE TEMP B-TREE' in plan:
+            problems.append('sorts in a temporary b-tree')
+        results.append((name, problems, plan))
+    return results
@@ -0,0 +1,161 @@
+"""
+Dashboard rollups
+Incrementally maintained per-user daily/weekly aggregates (see UserRollup)
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Response, MoodEntry, PhysiologicalData, UserRollup
+
+RESPONSE_FIELDS = {
+    'Low Stress': 'response_low',
+    'Medium Stress': 'response_medium',
+    'High Stress': 'response_high',
+}
+ML_FIELDS = {
+    'Amused': 'ml_amused',
+    'Neutral': 'ml_neutral',
+    'Stressed': 'ml_stressed',
+}
+
+
+def _typed(field, value):
+    return value if field == 'confidence_stressed_sum' else int(round(value))
+
+
+def _periods(created_at):
+    """(period, period_start) pairs a timestamp falls into, in local time"""
+    day = timezone.localdate(created_at) if created_at else timezone.localdate()
+    return ((UserRollup.DAY, day), (UserRollup.WEEK, day - timedelta(days=day.weekday())))
+
+
+def response_deltas(resp, sign=1):
+    field = RESPONSE_FIELDS.get(resp.predicted_level)
+    return {field: sign} if field else {}
+
+
+def mood_deltas(mood, sign=1):
+    return {'mood_sum': sign * mood.mood_scale, 'mood_count': sign}
+
+
+def physiological_deltas(data, sign=1):
+    """Only rows with a real prediction count; queued rows are added when scored"""
+    field = ML_FIELDS.get(data.predicted_level)
+    if not field:
+        return {}
+    deltas = {field: sign}
+    if data.confidence_stressed is not None:
+        deltas['confidence_stressed_sum'] = sign * data.confidence_stressed
+        deltas['confidence_stressed_count'] = sign
+    return deltas
+
+
+def apply(items):
+    """
+    Add (user_id, created_at, deltas) items to the rollup rows
+
+    Items are merged per rollup row first, so a bulk insert of hundreds of rows
+    costs one UPDATE per affected day/week. Rows are only created for
+    increments: a pure decrement updates existing rows, so the deletes
+    cascaded from a User never recreate the rollups being deleted with it.
+    """
+    merged = defaultdict(lambda: defaultdict(float))
+    for user_id, created_at, deltas in items:
+        if not deltas:
+            continue
+        for period, start in _periods(created_at):
+            for field, value in deltas.items():
+                merged[(user_id, period, start)][field] += value
+    if not merged:
+        return
+    with transaction.atomic():
+        for (user_id, period, start), deltas in merged.items():
+            if any(value > 0 for value in deltas.values()):
+                UserRollup.objects.get_or_create(user_id=user_id, period=period, period_start=start)
+            UserRollup.objects.filter(user_id=user_id, period=period, period_start=start).update(
+                **{field: F(field) + _typed(field, value) for field, value in deltas.items()}
+            )
+
+
+def record_response(resp, sign=1):
+    apply([(resp.user_id, resp.created_at, response_deltas(resp, sign))])
+
+
+def record_mood(mood, sign=1):
+    apply([(mood.user_id, mood.created_at, mood_deltas(mood, sign))])
+
+
+def record_physiological(rows, sign=1):
+    """Account for PhysiologicalData rows saved without signals (bulk_create / bulk_update)"""
+    apply([(data.user_id, data.created_at, physiological_deltas(data, sign)) for data in rows])
+
+
+def rebuild(user=None):
+    """
+    Recompute rollups from the raw tables
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    filters = {'user': user} if user is not None else {}
+    totals = defaultdict(lambda: defaultdict(float))
+
+    def add(user_id, created_at, deltas):
+        for period, start in _periods(created_at):
+            for field, value in deltas.items():
+                totals[(user_id, period, start)][field] += value
+
+    for obj in Response.objects.filter(**filters).only('user_id', 'predicted_level', 'created_at').iterator():
+        add(obj.user_id, obj.created_at, response_deltas(obj))
+    for obj in MoodEntry.objects.filter(**filters).only('user_id', 'mood_scale', 'created_at').iterator():
+        add(obj.user_id, obj.created_at, mood_deltas(obj))
+    for obj in (PhysiologicalData.objects.filter(**filters)
+                .only('user_id', 'predicted_level', 'confidence_stressed', 'created_at').iterator()):
+        add(obj.user_id, obj.created_at, physiological_deltas(obj))
+
+    rollups = [
+        UserRollup(user_id=user_id, period=period, period_start=start,
+                   **{field: _typed(field, value) for field, value in fields.items()})
+        for (user_id, period, start), fields in totals.items()
+    ]
+    with transaction.atomic():
+        UserRollup.objects.filter(**filters).delete()
+        UserRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(rollups)
+
+
+def dashboard_summary(user, days=30):
+    """
+    Chart series and totals for the dashboard from the rollup rows
+
+    Returns:
+        dict: chart_labels/chart_data for the last `days` days with
+        assessments, plus all-time totals
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    daily = list(
+        UserRollup.objects.filter(user=user, period=UserRollup.DAY, period_start__gte=since)
+        .order_by('period_start')
+    )
+    chart = [(r.period_start.strftime('%Y-%m-%d'), round(r.mean_stress_level, 2))
+             for r in daily if r.response_count]
+
+    sums = UserRollup.objects.filter(user=user, period=UserRollup.WEEK).aggregate(
+        **{field: Sum(field) for field in (
+            'response_low', 'response_medium', 'response_high', 'mood_count',
+            'ml_amused', 'ml_neutral', 'ml_stressed',
+        )}
+    )
+    sums = {field: value or 0 for field, value in sums.items()}
+    totals = {
+        'responses': sums['response_low'] + sums['response_medium'] + sums['response_high'],
+        'moods': sums['mood_count'],
+        'ml_predictions': sums['ml_amused'] + sums['ml_neutral'] + sums['ml_stressed'],
+    }
+    return {
+        'chart_labels': [label for label, _ in chart],
+        'chart_data': [value for _, value in chart],
+        'totals': totals,
+    }
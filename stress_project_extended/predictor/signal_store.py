@@ -0,0 +1,127 @@
+"""
+Binary columnar store for raw signal CSVs
+Converts sparse `seconds,<signal>` files into memory-mappable .npy columns
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+CACHE_DIRNAME = '.npy_cache'
+FORMAT_VERSION = 1
+
+
+def cache_paths(csv_path, cache_dir=None):
+    """Get the (timestamps, values, manifest) paths used for a source CSV"""
+    csv_path = os.path.abspath(csv_path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(csv_path), CACHE_DIRNAME)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return (
+        os.path.join(cache_dir, f'{stem}.t.npy'),
+        os.path.join(cache_dir, f'{stem}.v.npy'),
+        os.path.join(cache_dir, f'{stem}.json'),
+    )
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def is_stale(csv_path, cache_dir=None):
+    """Check whether the binary copy of csv_path is missing or out of date"""
+    t_path, v_path, manifest_path = cache_paths(csv_path, cache_dir)
+    if not all(os.path.exists(p) for p in (t_path, v_path, manifest_path)):
+        return True
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return True
+    return (manifest.get('format') != FORMAT_VERSION
+            or manifest.get('source') != _source_signature(csv_path))
+
+
+def _save_atomic(path, array):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def convert_signal(csv_path, cache_dir=None, chunksize=100000):
+    """
+    Convert one raw signal CSV into timestamp (float64) and value (float32) .npy files
+
+    Empty rows are dropped while parsing, so only the real samples are stored.
+
+    Returns:
+        dict: The manifest written next to the arrays
+    """
+    t_path, v_path, manifest_path = cache_paths(csv_path, cache_dir)
+    os.makedirs(os.path.dirname(t_path), exist_ok=True)
+    signature = _source_signature(csv_path)
+
+    timestamps, values = [], []
+    signal = None
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        signal = chunk.columns[1]
+        chunk = chunk.dropna()
+        timestamps.append(chunk.iloc[:, 0].to_numpy(dtype=np.float64))
+        values.append(chunk.iloc[:, 1].to_numpy(dtype=np.float32))
+    t = np.concatenate(timestamps) if timestamps else np.empty(0, dtype=np.float64)
+    v = np.concatenate(values) if values else np.empty(0, dtype=np.float32)
+
+    _save_atomic(t_path, t)
+    _save_atomic(v_path, v)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'signal': signal,
+        'samples': int(t.size),
+        'source': signature,
+    }
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def load_signal(csv_path, cache_dir=None):
+    """
+    Open the binary copy of a signal CSV, converting it first if it is stale
+
+    Returns:
+        tuple: (timestamps, values) read-only memory-mapped arrays
+    """
+    if is_stale(csv_path, cache_dir):
+        convert_signal(csv_path, cache_dir)
+    t_path, v_path, _ = cache_paths(csv_path, cache_dir)
+    return np.load(t_path, mmap_mode='r'), np.load(v_path, mmap_mode='r')
+
+
+def iter_signal_chunks(csv_path, chunk_samples=65536, cache_dir=None):
+    """Yield (timestamps, values) slices of the memory-mapped signal for feature extraction"""
+    t, v = load_signal(csv_path, cache_dir)
+    for start in range(0, t.size, chunk_samples):
+        yield t[start:start + chunk_samples], v[start:start + chunk_samples]
+
+
+def convert_directory(data_dir, cache_dir=None, force=False):
+    """
+    Convert every signal CSV in data_dir whose binary copy is missing or stale
+
+    Returns:
+        list: (csv_path, converted) pairs
+    """
+    results = []
+    for name in sorted(os.listdir(data_dir)):
+        if not name.endswith('.csv'):
+            continue
+        csv_path = os.path.join(data_dir, name)
+        converted = force or is_stale(csv_path, cache_dir)
+        if converted:
+            convert_signal(csv_path, cache_dir)
+        results.append((csv_path, converted))
+    return results
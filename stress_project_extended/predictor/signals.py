@@ -0,0 +1,65 @@
+"""
+Signal handlers keeping the dashboard rollups, data versions, user baselines and community feed in step with the raw tables
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Response, MoodEntry, PhysiologicalData, JournalEntry
+from . import baselines, community_feed, data_versions, rollups
+
+
+@receiver(post_save, sender=Response)
+def response_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_response(instance)
+
+
+@receiver(post_delete, sender=Response)
+def response_deleted(sender, instance, **kwargs):
+    rollups.record_response(instance, sign=-1)
+
+
+@receiver(post_save, sender=MoodEntry)
+def mood_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_mood(instance)
+
+
+@receiver(post_delete, sender=MoodEntry)
+def mood_deleted(sender, instance, **kwargs):
+    rollups.record_mood(instance, sign=-1)
+
+
+@receiver(post_save, sender=PhysiologicalData)
+def physiological_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_physiological([instance])
+        baselines.record([instance])
+
+
+@receiver(post_delete, sender=PhysiologicalData)
+def physiological_deleted(sender, instance, **kwargs):
+    rollups.record_physiological([instance], sign=-1)
+    baselines.record([instance], sign=-1)
+
+
+@receiver(post_save, sender=Response)
+@receiver(post_save, sender=MoodEntry)
+@receiver(post_save, sender=PhysiologicalData)
+@receiver(post_delete, sender=Response)
+@receiver(post_delete, sender=MoodEntry)
+@receiver(post_delete, sender=PhysiologicalData)
+def dashboard_data_changed(sender, instance, **kwargs):
+    data_versions.bump(instance.user_id)
+
+
+@receiver(post_save, sender=JournalEntry)
+def journal_saved(sender, instance, created, **kwargs):
+    # An edit may have changed the text or the anonymous flag
+    if instance.anonymous or not created:
+        community_feed.invalidate()
+
+
+@receiver(post_delete, sender=JournalEntry)
+def journal_deleted(sender, instance, **kwargs):
+    if instance.anonymous:
+        community_feed.invalidate()
@@ -0,0 +1,318 @@
+"""
+Model slimming module
+Sweeps smaller forests (refitted or pruned from the serving model) and reports their accuracy/latency trade-off
+"""
+import os
+import re
+import copy
+import pickle
+import shutil
+import tempfile
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from .benchmarks import percentiles
+from .forest import CompiledForest, export_forest
+from .training import fit_model
+
+DEFAULT_N_ESTIMATORS = (10, 25, 50, 100)
+DEFAULT_MAX_DEPTHS = (6, 8, 12, None)
+DEFAULT_MIN_SAMPLES_LEAF = (1, 2, 4)
+BASELINE_ID = 'serving'
+
+_ID_PATTERN = re.compile(r'^(fit|prune)-n(\d+)-d(\d+|none)(?:-l(\d+))?$')
+
+
+def candidate_id(spec):
+    """Stable name of a candidate, e.g. fit-n50-d8-l2 or prune-n25-dnone"""
+    depth = 'none' if spec['max_depth'] is None else spec['max_depth']
+    name = f"{spec['kind']}-n{spec['n_estimators']}-d{depth}"
+    if spec['kind'] == 'fit':
+        name += f"-l{spec['min_samples_leaf']}"
+    return name
+
+
+def parse_id(name):
+    """
+    Inverse of candidate_id
+
+    Raises:
+        ValueError: If name is not a candidate id
+    """
+    match = _ID_PATTERN.match(name)
+    if not match or (match.group(1) == 'fit') != (match.group(4) is not None):
+        raise ValueError(f'Not a candidate id: {name!r}')
+    kind, n_estimators, depth, leaf = match.groups()
+    spec = {'kind': kind, 'n_estimators': int(n_estimators), 'max_depth': None if depth == 'none' else int(depth)}
+    if kind == 'fit':
+        spec['min_samples_leaf'] = int(leaf)
+    return spec
+
+
+def grid(n_estimators=DEFAULT_N_ESTIMATORS, max_depths=DEFAULT_MAX_DEPTHS,
+         min_samples_leaf=DEFAULT_MIN_SAMPLES_LEAF, fit=True, prune=True, base_trees=None):
+    """
+    Candidate specs of a sweep
+
+    Refits cover the whole grid; pruned candidates take the first
+    n_estimators trees of the serving forest (at most base_trees) cut to
+    each depth, skipping the unchanged forest itself.
+    """
+    specs = []
+    if fit:
+        specs += [{'kind': 'fit', 'n_estimators': n, 'max_depth': d, 'min_samples_leaf': leaf}
+                  for n in n_estimators for d in max_depths for leaf in min_samples_leaf]
+    if prune and base_trees:
+        for n in sorted({min(n, base_trees) for n in n_estimators}):
+            specs += [{'kind': 'prune', 'n_estimators': n, 'max_depth': d}
+                      for d in max_depths if n < base_trees or d is not None]
+    return specs
+
+
+def truncate_tree(estimator, max_depth):
+    """
+    Copy of a fitted decision tree with every node at max_depth turned into a leaf
+
+    Internal nodes already hold the class distribution of their samples, so
+    the cut tree needs no refit. Unreachable nodes are dropped and the rest
+    keep sklearn's depth-first order.
+    """
+    tree = estimator.tree_
+    if max_depth is None or tree.max_depth <= max_depth:
+        return estimator
+    cls, args, state = tree.__reduce__()
+    nodes, values = state['nodes'], state['values']
+
+    order, depths = [], []
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        order.append(node)
+        depths.append(depth)
+        if nodes['left_child'][node] != -1 and depth < max_depth:
+            stack.append((nodes['right_child'][node], depth + 1))
+            stack.append((nodes['left_child'][node], depth + 1))
+    order = np.asarray(order)
+    remap = np.full(len(nodes) + 1, -1, dtype=np.int64)  # remap[-1] stays -1 for leaves
+    remap[order] = np.arange(order.size)
+
+    kept = nodes[order].copy()
+    leaf = (np.asarray(depths) >= max_depth) | (kept['left_child'] == -1)
+    kept['left_child'] = np.where(leaf, -1, remap[kept['left_child']])
+    kept['right_child'] = np.where(leaf, -1, remap[kept['right_child']])
+    kept['feature'] = np.where(leaf, -2, kept['feature'])
+    kept['threshold'] = np.where(leaf, -2.0, kept['threshold'])
+
+    pruned_tree = cls(*args)
+    pruned_tree.__setstate__(dict(state, nodes=kept, values=np.ascontiguousarray(values[order]),
+                                  node_count=order.size, max_depth=min(state['max_depth'], max_depth)))
+    pruned = copy.copy(estimator)
+    pruned.tree_ = pruned_tree
+    return pruned
+
+
+def prune_forest(model, n_estimators=None, max_depth=None):
+    """
+    Smaller forest built from the first n_estimators trees of model, cut to max_depth
+
+    Trees of a random forest are exchangeable, so keeping a prefix is an
+    unbiased subsample of the ensemble.
+
+    Returns:
+        RandomForestClassifier: A fitted forest; model is left untouched
+    """
+    trees = model.estimators_[:n_estimators]
+    pruned = RandomForestClassifier(n_estimators=len(trees), max_depth=max_depth,
+                                    random_state=getattr(model, 'random_state', None))
+    pruned.estimators_ = [truncate_tree(tree, max_depth) for tree in trees]
+    for attr in ('classes_', 'n_classes_', 'n_outputs_', 'n_features_in_', 'feature_names_in_', 'estimator_'):
+        if hasattr(model, attr):
+            setattr(pruned, attr, getattr(model, attr))
+    return pruned
+
+
+def build(spec, X_train, y_train, base_model=None, n_jobs=-1, random_state=0):
+    """
+    Fit or prune the forest a spec describes
+
+    Returns:
+        tuple: (model, build_seconds)
+    """
+    if spec['kind'] == 'prune':
+        if base_model is None:
+            raise ValueError('Pruned candidates need the serving model')
+        start = time.perf_counter()
+        model = prune_forest(base_model, spec['n_estimators'], spec['max_depth'])
+        return model, time.perf_counter() - start
+    return fit_model(X_train, y_train, n_jobs=n_jobs, random_state=random_state,
+                     n_estimators=spec['n_estimators'], max_depth=spec['max_depth'],
+                     min_samples_leaf=spec['min_samples_leaf'])
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def measure(model, X_test, y_test):
+    """
+    Held-out accuracy, artifact sizes and load times of one forest
+
+    Scoring goes through CompiledForest, the evaluator StressPredictor
+    serves with. Latency is timed separately by time_latency, across all
+    candidates at once.
+
+    Returns:
+        tuple: (metrics dict, CompiledForest held in memory for timing)
+    """
+    blob = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    start = time.perf_counter()
+    pickle.loads(blob)
+    pickle_load_ms = (time.perf_counter() - start) * 1000
+
+    tmp_dir = tempfile.mkdtemp(prefix='slim-')
+    try:
+        forest_dir = os.path.join(tmp_dir, 'forest')
+        export_forest(model, forest_dir)
+        compiled_bytes = _dir_bytes(forest_dir)
+        start = time.perf_counter()
+        compiled = CompiledForest.load(forest_dir)
+        compiled.predict_proba(X_test[:1])  # first touch of the mapped pages
+        load_ms = (time.perf_counter() - start) * 1000
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    compiled = CompiledForest.from_model(model)
+    accuracy = float((compiled.predict(X_test) == y_test).mean() * 100)
+    meta = compiled.meta
+    return {
+        'accuracy': round(accuracy, 4),
+        'artifact_bytes': len(blob),
+        'compiled_bytes': compiled_bytes,
+        'load_ms': load_ms,
+        'pickle_load_ms': pickle_load_ms,
+        'n_trees': meta['n_trees'],
+        'n_nodes': meta['n_nodes'],
+        'max_depth': meta['max_depth'],
+    }, compiled
+
+
+def time_latency(forests, X, repeat=300, batch_size=1000, rounds=10, warmup=20, seed=0):
+    """
+    Single-row and batch latency of several compiled forests
+
+    The forests are timed round-robin, a slice of the samples per round, so
+    CPU frequency changes or background load during a long sweep shift every
+    candidate alike instead of skewing whichever ran at the time.
+
+    Returns:
+        list: One dict per forest with single_p50_ms, single_p99_ms,
+        batch_ms and batch_rows_per_second
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, X.shape[0], size=repeat)
+    batch = X[rng.integers(0, X.shape[0], size=batch_size)]
+    for forest in forests:
+        for row in picks[:warmup]:
+            forest.predict_proba(X[row:row + 1])
+        forest.predict_proba(batch)
+
+    single = [[] for _ in forests]
+    batches = [[] for _ in forests]
+    for chunk in np.array_split(picks, rounds):
+        for i, forest in enumerate(forests):
+            for row in chunk:
+                t0 = time.perf_counter()
+                forest.predict_proba(X[row:row + 1])
+                single[i].append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            forest.predict_proba(batch)
+            batches[i].append((time.perf_counter() - t0) * 1000)
+
+    results = []
+    for timings, batch_timings in zip(single, batches):
+        stats = percentiles(timings)
+        batch_ms = float(np.median(batch_timings))
+        results.append({
+            'single_p50_ms': stats['p50_ms'],
+            'single_p99_ms': stats['p99_ms'],
+            'batch_ms': batch_ms,
+            'batch_rows_per_second': batch_size / (batch_ms / 1000),
+        })
+    return results
+
+
+def pareto(results):
+    """
+    Mark candidates no other candidate beats on accuracy, single-row latency and size at once
+
+    Sets result['pareto'] on every entry and returns the frontier, fastest first.
+    """
+    def dominates(a, b):
+        no_worse = (a['accuracy'] >= b['accuracy'] and a['single_p50_ms'] <= b['single_p50_ms']
+                    and a['artifact_bytes'] <= b['artifact_bytes'])
+        better = (a['accuracy'] > b['accuracy'] or a['single_p50_ms'] < b['single_p50_ms']
+                  or a['artifact_bytes'] < b['artifact_bytes'])
+        return no_worse and better
+
+    for result in results:
+        result['pareto'] = not any(dominates(other, result) for other in results if other is not result)
+    return sorted((r for r in results if r['pareto']), key=lambda r: r['single_p50_ms'])
+
+
+def choose(results, baseline, max_accuracy_loss=0.5):
+    """
+    Fastest candidate within max_accuracy_loss points of the baseline's accuracy
+
+    Returns:
+        dict or None: The chosen result, or None if nothing beats the baseline's latency
+    """
+    floor = baseline['accuracy'] - max_accuracy_loss
+    eligible = [r for r in results if r['id'] != baseline['id'] and r['accuracy'] >= floor
+                and r['single_p50_ms'] < baseline['single_p50_ms']]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r['single_p50_ms'], r['artifact_bytes']))
+
+
+def sweep(specs, X_train, y_train, X_test, y_test, base_model=None, n_jobs=-1, random_state=0,
+          repeat=300, batch_size=1000, log=print):
+    """
+    Build and measure every candidate plus the serving baseline
+
+    Returns:
+        list: One result dict per candidate (baseline first) with id, kind,
+        params, the measure() and time_latency() figures, build_seconds,
+        accuracy_delta and speedup against the baseline, and the pareto flag
+    """
+    results, forests = [], []
+    if base_model is not None:
+        baseline = {'id': BASELINE_ID, 'kind': 'serving', 'params': {
+            'n_estimators': len(base_model.estimators_),
+            'max_depth': getattr(base_model, 'max_depth', None),
+            'min_samples_leaf': getattr(base_model, 'min_samples_leaf', None),
+        }, 'build_seconds': 0.0}
+        metrics, compiled = measure(base_model, X_test, y_test)
+        baseline.update(metrics)
+        results.append(baseline)
+        forests.append(compiled)
+    for i, spec in enumerate(specs, 1):
+        model, build_seconds = build(spec, X_train, y_train, base_model, n_jobs=n_jobs, random_state=random_state)
+        result = {'id': candidate_id(spec), 'kind': spec['kind'],
+                  'params': {k: v for k, v in spec.items() if k != 'kind'},
+                  'build_seconds': round(build_seconds, 4)}
+        metrics, compiled = measure(model, X_test, y_test)
+        result.update(metrics)
+        results.append(result)
+        forests.append(compiled)
+        log(f"[{i}/{len(specs)}] {result['id']}: {result['accuracy']:.2f}%, "
+            f"{result['n_nodes']} nodes, {result['artifact_bytes'] / 1024:.0f} KB")
+
+    log(f'Timing {len(forests)} forests...')
+    for result, latency in zip(results, time_latency(forests, X_test, repeat=repeat, batch_size=batch_size)):
+        result.update(latency)
+    reference = results[0]
+    for result in results:
+        result['accuracy_delta'] = round(result['accuracy'] - reference['accuracy'], 4)
+        result['speedup'] = reference['single_p50_ms'] / result['single_p50_ms']
+    pareto(results)
+    return results
@@ -0,0 +1,371 @@
+"""
+Streaming ingestion module
+Per-session ring buffers that turn pushed raw signal samples into completed feature windows
+"""
+import math
+import time
+import uuid
+import threading
+import numpy as np
+from .feature_extraction import (SIGNALS, DEMOGRAPHIC_FEATURES, WINDOW_FEATURES, min_window_samples,
+                                 window_features, window_lengths)
+
+
+class BufferFull(OverflowError):
+    """
+    Raised when a signal is more than a buffer ahead of the others
+
+    Samples up to the point of failure are kept; rows holds the feature
+    rows of the windows they completed.
+    """
+
+    def __init__(self, message, rows):
+        super().__init__(message)
+        self.rows = rows
+
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) buffer; the oldest samples are overwritten"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.t = np.empty(capacity, dtype=np.float64)
+        self.v = np.empty(capacity, dtype=np.float32)
+        self.head = 0  # next write position
+        self.size = 0
+        # Timestamp of the newest sample overwritten so far
+        self.evicted_until = -math.inf
+
+    @property
+    def nbytes(self):
+        return self.t.nbytes + self.v.nbytes
+
+    @property
+    def first(self):
+        return float(self.t[self.head if self.size == self.capacity else 0])
+
+    @property
+    def last(self):
+        return float(self.t[(self.head - 1) % self.capacity])
+
+    def extend(self, t, v):
+        evicted = self.size + t.size - self.capacity
+        if evicted > self.size:
+            self.evicted_until = float(t[evicted - self.size - 1])
+        elif evicted > 0:
+            self.evicted_until = float(self.t[(self.head - self.size + evicted - 1) % self.capacity])
+        t, v = t[-self.capacity:], v[-self.capacity:]
+        positions = (self.head + np.arange(t.size)) % self.capacity
+        self.t[positions] = t
+        self.v[positions] = v
+        self.head = (self.head + t.size) % self.capacity
+        self.size = min(self.size + t.size, self.capacity)
+
+    def ordered(self):
+        """Buffered (timestamps, values) in time order"""
+        if self.size < self.capacity:
+            return self.t[:self.size], self.v[:self.size]
+        order = np.r_[self.head:self.capacity, 0:self.head]
+        return self.t[order], self.v[order]
+
+    def between(self, lo, hi):
+        """Samples with lo <= t < hi, in time order"""
+        t, v = self.ordered()
+        start, stop = np.searchsorted(t, [lo, hi])
+        return t[start:stop], v[start:stop]
+
+    def first_after(self, lo):
+        """Earliest buffered timestamp >= lo, or inf"""
+        t, _ = self.ordered()
+        i = np.searchsorted(t, lo)
+        return float(t[i]) if i < t.size else math.inf
+
+
+class StreamSession:
+    """
+    One client's live recording
+
+    Samples are pushed per signal and windowed like extract_features():
+    windows are window_seconds long, start on multiples of step_seconds and
+    are emitted once every signal has data past their end. Lengths left
+    unset are derived from the sampling intervals (see window_lengths())
+    as soon as every signal has two samples. Memory is fixed
+    at `capacity` samples per signal; at sampling rates where a window holds
+    more than that, the window is computed over the newest samples. Samples
+    that a pending window still needs are never overwritten otherwise: a
+    push that would do so raises BufferFull.
+    """
+
+    def __init__(self, user_id, profile, signals=SIGNALS, window_seconds=None,
+                 step_seconds=None, min_samples=4, capacity=4096):
+        """
+        Raises:
+            ValueError: If no signals or an unknown one are given
+        """
+        unknown = [signal for signal in signals if signal not in WINDOW_FEATURES]
+        if unknown or not signals:
+            raise ValueError(f"Signals must be a non-empty subset of {SIGNALS}, got {list(signals)}")
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.profile = {k: profile[k] for k in DEMOGRAPHIC_FEATURES}
+        self.signals = tuple(signals)
+        # Sampling interval per signal, once window_lengths() has been settled
+        self.intervals = None
+        self.window_seconds = window_seconds
+        self.step_seconds = step_seconds
+        self.min_samples = min_samples
+        self.capacity = capacity
+        self.buffers = {signal: RingBuffer(capacity) for signal in self.signals}
+        self.start = None
+        self.samples = 0
+        self.windows = 0
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.buffers.values())
+
+    def push(self, signal, t, v):
+        """Append samples of one signal; see push_many"""
+        return self.push_many({signal: (t, v)})
+
+    def push_many(self, samples):
+        """
+        Append samples of several signals and return the feature rows of every window they complete
+
+        The samples are fed in time order, in slices that fit the ring
+        buffers, and the windows each slice completes are cut before the
+        next one goes in, so a push of any length loses nothing. Samples at
+        or before a signal's last buffered timestamp are dropped, so retried
+        chunks are harmless.
+
+        Args:
+            samples: Dict mapping signal name to (timestamps, values)
+
+        Raises:
+            ValueError: If a signal is unknown, its samples are malformed or
+                the window is too short for the EDA sampling rate; nothing is
+                buffered then
+            BufferFull: If a signal runs more than a buffer ahead of the
+                others, which must be sent first
+        """
+        pending = {}
+        for signal, (t, v) in samples.items():
+            t, v = self._new_samples(signal, t, v)
+            if t.size:
+                pending[signal] = (t, v)
+        if self.intervals is None:
+            self._resolve_lengths(pending)
+        self.last_seen = time.monotonic()
+
+        rows = []
+        while pending:
+            reach = {signal: self._reach(signal, t) for signal, (t, _) in pending.items()}
+            open_signals = [r for r in reach.values() if r is not None]
+            if not open_signals:
+                raise BufferFull(
+                    f"{', '.join(sorted(pending))} would overwrite samples that pending windows still need: "
+                    f"send the other signals up to t={min(t[0] for t, _ in pending.values()):g} first",
+                    rows,
+                )
+            cutoff = min(open_signals)
+            for signal in list(pending):
+                t, v = pending[signal]
+                n = int(np.searchsorted(t, cutoff, side='right')) if reach[signal] is not None else 0
+                if n:
+                    self.buffers[signal].extend(t[:n], v[:n])
+                    self.samples += n
+                if n == t.size:
+                    del pending[signal]
+                else:
+                    pending[signal] = (t[n:], v[n:])
+            rows.extend(self._complete_windows())
+        return rows
+
+    def _new_samples(self, signal, t, v):
+        if signal not in self.buffers:
+            raise ValueError(f"Signal '{signal}' is not part of this session {self.signals}")
+        t = np.asarray(t, dtype=np.float64)
+        v = np.asarray(v, dtype=np.float32)
+        if t.ndim != 1 or t.shape != v.shape:
+            raise ValueError('t and v must be equal-length lists')
+        if not (np.all(np.isfinite(t)) and np.all(np.isfinite(v))):
+            raise ValueError('Samples must be finite numbers')
+        if t.size > 1 and np.any(np.diff(t) <= 0):
+            raise ValueError('Timestamps must be strictly increasing')
+        buf = self.buffers[signal]
+        if buf.size:
+            keep = t > buf.last
+            t, v = t[keep], v[keep]
+        return t, v
+
+    def _resolve_lengths(self, pending):
+        """Settle the window lengths once every signal has two samples, buffered or pending"""
+        intervals = {}
+        for signal, buf in self.buffers.items():
+            t = buf.ordered()[0]
+            if signal in pending:
+                t = np.concatenate([t, pending[signal][0]])
+            if t.size < 2:
+                return
+            intervals[signal] = float(np.median(np.diff(t)))
+        self.window_seconds, self.step_seconds = window_lengths(intervals, self.window_seconds, self.step_seconds)
+        self.intervals = intervals
+
+    def _room(self, signal):
+        """Samples the signal's buffer takes without overwriting any a pending window needs"""
+        buf = self.buffers[signal]
+        if self.start is None:
+            return self.capacity - buf.size
+        if buf.evicted_until >= self.start:
+            # The current window outgrew the buffer and keeps its newest samples
+            return self.capacity
+        t, _ = buf.ordered()
+        room = self.capacity - (t.size - int(np.searchsorted(t, self.start)))
+        if room == 0 and buf.last < self.start + self.window_seconds:
+            return self.capacity
+        return room
+
+    def _reach(self, signal, t):
+        """Latest of the incoming timestamps the signal can take now, None when it has no room"""
+        room = self._room(signal)
+        if room <= 0:
+            return None
+        reach = float(t[min(room, t.size) - 1])
+        if self.start is not None:
+            # Stop at the current window's end, so the window is cut before
+            # newer samples can push its own out of the buffer
+            i = int(np.searchsorted(t, self.start + self.window_seconds))
+            if i < t.size:
+                reach = min(reach, float(t[i]))
+        return reach
+
+    def _complete_windows(self):
+        buffers = self.buffers.values()
+        if self.intervals is None or any(buf.size == 0 for buf in buffers):
+            return []
+        if self.start is None:
+            # First window every signal can cover
+            self.start = math.floor(max(buf.first for buf in buffers) / self.step_seconds) * self.step_seconds
+
+        rows = []
+        while all(buf.last >= self.start + self.window_seconds for buf in buffers):
+            end = self.start + self.window_seconds
+            windows = {signal: buf.between(self.start, end) for signal, buf in self.buffers.items()}
+            if all(t.size >= min_window_samples(signal, self.min_samples) for signal, (t, _) in windows.items()):
+                row = {'window_start': self.start, 'window_end': end}
+                for signal, (t, v) in windows.items():
+                    row.update(window_features(signal, t, v))
+                row.update(self.profile)
+                rows.append(row)
+                self.windows += 1
+            self.start += self.step_seconds
+
+            # Skip over gaps in the recording
+            earliest = min(buf.first_after(self.start) for buf in buffers)
+            if math.isfinite(earliest) and earliest >= self.start + self.window_seconds:
+                self.start = math.floor(earliest / self.step_seconds) * self.step_seconds
+        return rows
+
+    def describe(self):
+        return {
+            'session': self.id,
+            'signals': list(self.signals),
+            'window_seconds': self.window_seconds,
+            'step_seconds': self.step_seconds,
+            'samples': self.samples,
+            'windows': self.windows,
+            'next_window_start': self.start,
+            'buffer_bytes': self.nbytes,
+        }
+
+
+class SessionRegistry:
+    """
+    In-process table of live sessions
+
+    Sessions idle for longer than ttl seconds are dropped, and at most
+    max_sessions are kept, so total memory stays bounded at roughly
+    max_sessions * capacity * 12 bytes per signal.
+
+    Sessions live only in the process that opened them. A deployment with
+    several worker processes must route every request of a session to the
+    same worker (sticky routing on the session id in the URL); any other
+    worker answers 404.
+    """
+
+    def __init__(self, max_sessions=500, ttl=300, **session_options):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.session_options = session_options
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for key in [key for key, s in self._sessions.items() if s.last_seen < cutoff]:
+            del self._sessions[key]
+
+    def create(self, user_id, profile, signals=SIGNALS, **options):
+        """
+        Open a session for a user
+
+        Args:
+            options: StreamSession arguments overriding the registry's; None
+                values keep the registry's
+
+        Raises:
+            ValueError: If the signals or window lengths are invalid
+            OverflowError: If max_sessions live sessions already exist
+        """
+        options = dict(self.session_options, **{k: v for k, v in options.items() if v is not None})
+        session = StreamSession(user_id, profile, signals, **options)
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise OverflowError('Too many open stream sessions')
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id, user_id):
+        """Look up a live session owned by user_id, or None"""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+        if session is None or session.user_id != user_id:
+            return None
+        return session
+
+    def close(self, session_id, user_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return None
+            return self._sessions.pop(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Get the process-wide session registry, configured from settings"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from django.conf import settings
+                options = getattr(settings, 'STREAM_INGEST', {})
+                _registry = SessionRegistry(
+                    max_sessions=options.get('MAX_SESSIONS', 500),
+                    ttl=options.get('SESSION_TTL', 300),
+                    window_seconds=options.get('WINDOW_SECONDS'),
+                    step_seconds=options.get('STEP_SECONDS'),
+                    min_samples=options.get('MIN_SAMPLES', 4),
+                    capacity=options.get('BUFFER_SAMPLES', 4096),
+                )
+    return _registry
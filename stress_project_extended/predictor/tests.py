@@ -0,0 +1,1218 @@
+"""
+Predictor tests
+Run with `python manage.py test predictor`
+"""
+import io
+import importlib
+import os
+import csv
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from . import (baselines, benchmarks, community_feed, instrumentation, jobs, journal_search, pagination, rollups,
+               signal_store, slimming, training)
+from .feature_extraction import extract_features, subject_streams, EDA_MIN_SAMPLES
+from .forest import CompiledForest
+from .instrumentation import RequestTimings, timed
+from .ml_predictor import StressPredictor, get_predictor
+from .models import (Response, MoodEntry, PhysiologicalData, PredictionJob, JournalEntry, UserBaseline, UserRollup,
+                     BASELINE_FIELDS, FEATURE_FIELDS, PACKED_FIELDS, PACKED_SIZE)
+from .prediction_cache import PredictionCache
+from .preprocessing import FeaturePipeline, InvalidFeatures, read_feature_stats
+from .queries import check_query_plans
+from .streaming import BufferFull, StreamSession
+from .training import MODEL_DIR
+
+RAW_SUBSET = os.path.join(settings.BASE_DIR.parent, 'model', 'data', 'raw_subset')
+# Tests keep to process memory: never read or write the site's on-disk 'shared' cache
+TEST_CACHES = {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+               for alias in settings.CACHES}
+_test_caches = override_settings(CACHES=TEST_CACHES)
+
+
+def setUpModule():
+    _test_caches.enable()
+
+
+def tearDownModule():
+    _test_caches.disable()
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class FeatureExtractionTests(SimpleTestCase):
+    profile = {'age': 27, 'height': 175, 'weight': 80}
+
+    def test_raw_subset_rows_fit_the_pipeline(self):
+        # raw_subset is resampled (a BVP sample every 12 units, not 64 Hz) and some recordings sit on
+        # another EDA scale: range checks may reject their windows, but nothing else may be wrong
+        stats = read_feature_stats(MODEL_DIR)
+        pipeline = FeaturePipeline(stats['features'], stats)
+        rejected = {}
+        for subject in (2, 7):
+            rows = list(extract_features(subject_streams(RAW_SUBSET, subject), profile=self.profile))
+            self.assertGreater(len(rows), 5)
+            for row in rows:
+                self.assertTrue(all(np.isfinite(value) for value in row.values()), row)
+                self.assertGreater(row['EDA_phasic_mean'], 0)
+                self.assertGreaterEqual(row['EDA_phasic_min'], 0)
+            prepared = pipeline.transform(rows, fill_missing=True)
+            self.assertTrue(all(set(problem) == {'row', 'out_of_range'} for problem in prepared.problems))
+            rejected[subject] = {name for problem in prepared.problems for name in problem['out_of_range']}
+        self.assertEqual(rejected, {2: set(), 7: {'EDA_tonic_mean'}})
+
+    def test_window_too_short_for_eda_raises(self):
+        with self.assertRaises(ValueError):
+            list(extract_features(subject_streams(RAW_SUBSET, 1), window_seconds=60))
+
+    def test_explicit_window_is_kept(self):
+        t = np.arange(0, 400, 1.0)
+        streams = {'EDA': [(t, np.sin(t / 7.0) + 2)]}
+        rows = list(extract_features(streams, window_seconds=4 * EDA_MIN_SAMPLES, step_seconds=10))
+        self.assertEqual(rows[1]['window_start'] - rows[0]['window_start'], 10)
+        self.assertEqual(rows[0]['window_end'] - rows[0]['window_start'], 4 * EDA_MIN_SAMPLES)
+
+
+class FeaturePipelineTests(SimpleTestCase):
+    def test_absent_signals_are_filled_only_on_request(self):
+        stats = read_feature_stats(MODEL_DIR)
+        pipeline = FeaturePipeline(stats['features'], stats)
+        row = {name: stats['median'][name] for name in stats['features'] if not name.startswith(('Resp', 'TEMP'))}
+        self.assertFalse(pipeline.transform([row]).valid[0])
+        prepared = pipeline.transform([row], fill_missing=True)
+        self.assertTrue(prepared.valid[0])
+        self.assertEqual(prepared.filled, 5)
+
+
+class UserDeleteTests(TestCase):
+    def test_delete_user_with_dashboard_data(self):
+        user = User.objects.create_user('leaving', password='p')
+        Response.objects.create(user=user, predicted_level='High Stress', **{f'q{i}': 1 for i in range(1, 11)})
+        MoodEntry.objects.create(user=user, mood_scale=5)
+        stats = read_feature_stats(MODEL_DIR)
+        PhysiologicalData.objects.create(user=user, predicted_level='Neutral', confidence_stressed=0.1,
+                                         **{name: stats['median'][name] for name in stats['features']})
+        self.assertTrue(UserRollup.objects.filter(user=user).exists())
+        self.assertTrue(UserBaseline.objects.filter(user=user).exists())
+        user_id = user.pk
+        user.delete()
+        self.assertFalse(UserRollup.objects.filter(user_id=user_id).exists())
+        self.assertFalse(UserBaseline.objects.filter(user_id=user_id).exists())
+        connection.check_constraints()
+
+
+class QueryPlanTests(TestCase):
+    def test_list_queries_use_their_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked on SQLite')
+        user = User.objects.create_user('planner', password='p')
+        for cursor in (None, (timezone.now(), 2 ** 31)):
+            for name, problems, plan in check_query_plans(user, cursor):
+                with self.subTest(query=name, cursor=cursor):
+                    self.assertEqual(problems, [], plan)
+
+
+class StreamSessionTests(SimpleTestCase):
+    profile = {'age': 27, 'height': 175, 'weight': 80}
+    rates = {'BVP': 64, 'EDA': 4, 'TEMP': 4}
+
+    def samples(self, seconds=600):
+        rng = np.random.default_rng(0)
+        return {signal: (np.arange(0, seconds, 1 / rate), rng.normal(1, 0.1, seconds * rate))
+                for signal, rate in self.rates.items()}
+
+    def session(self):
+        return StreamSession(1, self.profile, signals=self.rates)
+
+    def test_long_push_matches_small_pushes(self):
+        samples = self.samples()
+        one = self.session().push_many(samples)
+        session, chunked = self.session(), []
+        for start in range(0, 600, 10):
+            chunk = {}
+            for signal, (t, v) in samples.items():
+                keep = (t >= start) & (t < start + 10)
+                chunk[signal] = (t[keep], v[keep])
+            chunked += session.push_many(chunk)
+        offline = list(extract_features({signal: [tv] for signal, tv in samples.items()}, self.profile))
+        self.assertEqual(len(one), len(offline))
+        self.assertEqual([row['window_start'] for row in one], [row['window_start'] for row in offline])
+        self.assertEqual([row['window_start'] for row in one], [row['window_start'] for row in chunked])
+
+    def test_window_lengths_follow_the_sampling_rates(self):
+        session = self.session()
+        self.assertIsNone(session.window_seconds)
+        session.push_many(self.samples(10))
+        # WINDOW_SAMPLES of the slowest signal, as in extract_features()
+        self.assertEqual((session.window_seconds, session.step_seconds), (4.0, 2.0))
+        explicit = StreamSession(1, self.profile, signals=self.rates, window_seconds=60, step_seconds=30)
+        explicit.push_many(self.samples(10))
+        self.assertEqual((explicit.window_seconds, explicit.step_seconds), (60.0, 30.0))
+
+    def test_window_too_short_for_eda_buffers_nothing(self):
+        session = StreamSession(1, self.profile, signals=self.rates, window_seconds=1)
+        with self.assertRaises(ValueError):
+            session.push_many(self.samples(10))
+        self.assertEqual(session.samples, 0)
+
+    def test_unknown_signal_is_rejected(self):
+        with self.assertRaises(ValueError):
+            StreamSession(1, self.profile, signals=['BVP', 'ECG'])
+
+    def test_signal_ahead_of_the_others_is_rejected(self):
+        samples = self.samples()
+        session = self.session()
+        with self.assertRaises(BufferFull):
+            session.push('BVP', *samples['BVP'])
+        rows = session.push_many({signal: tv for signal, tv in samples.items() if signal != 'BVP'})
+        rows += session.push('BVP', *samples['BVP'])
+        self.assertEqual(len(rows), len(self.session().push_many(samples)))
+
+
+@override_settings(REQUEST_TIMING_ENABLED=True)
+class ExplanationTests(TestCase):
+    def setUp(self):
+        # The serving model is checked in: these must run, not skip
+        self.assertTrue(get_predictor().is_loaded())
+        self.user = User.objects.create_user('explained', password='p')
+        self.client.login(username='explained', password='p')
+        stats = read_feature_stats(MODEL_DIR)
+        self.row = {name: stats['median'][name] for name in stats['features']}
+
+    def test_explained_batch_with_timing(self):
+        response = self.client.post('/api/predict/batch/?explain=1', json.dumps([self.row]),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        result = response.json()['results'][0]
+        explanation = result['explanation']
+        total = explanation['base'] + sum(c['contribution'] for c in explanation['contributions'])
+        self.assertAlmostEqual(total, result['confidence'][result['predicted_level']], places=5)
+        self.assertIn('explain;dur=', response['Server-Timing'])
+
+    def test_result_page_with_timing(self):
+        response = self.client.post('/ml-predict/', self.row)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'What Drove This Result')
+        self.assertIn('explain;dur=', response['Server-Timing'])
+
+    def test_every_timed_category_has_a_slot(self):
+        timings = RequestTimings()
+        token = instrumentation._current.set(timings)
+        try:
+            for category in ('predict', 'template', 'load', 'explain'):
+                with timed(category):
+                    pass
+        finally:
+            instrumentation._current.reset(token)
+        self.assertGreater(timings.explain_seconds, 0)
+
+
+@override_settings(PERSONALIZED_SCORING=True, USER_BASELINE={'MIN_WINDOWS': 10})
+class PersonalizedScoringTests(TestCase):
+    def setUp(self):
+        if not get_predictor().is_loaded():
+            self.skipTest('No trained model')
+        baselines.cache.clear()
+        self.user = User.objects.create_user('steady', password='p')
+        self.client.login(username='steady', password='p')
+        self.stats = read_feature_stats(MODEL_DIR)
+        self.row = {name: self.stats['median'][name] for name in self.stats['features']}
+
+    def test_tight_baseline_falls_back_to_the_global_model(self):
+        # Near-zero variance: any real change is dozens of standard deviations away
+        for i in range(12):
+            PhysiologicalData.objects.create(user=self.user, predicted_level='Neutral', **{
+                name: value * (1 + 1e-9 * i) if name in BASELINE_FIELDS else value
+                for name, value in self.row.items()
+            })
+        self.assertLess(max(baselines.get(self.user.pk).std), 1e-3)
+        shifted = dict(self.row)
+        for name in BASELINE_FIELDS:
+            low, high = self.stats['min'][name], self.stats['max'][name]
+            shifted[name] = min(self.row[name] + 0.1 * (high - low), high)
+        response = self.client.post('/ml-predict/', shifted)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'scored with the general model')
+        label, _ = get_predictor().predict(shifted)
+        self.assertEqual(response.context['data'].predicted_level, label)
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('watcher', password='p')
+        self.client.login(username='watcher', password='p')
+        stats = read_feature_stats(MODEL_DIR)
+        self.row = {name: stats['median'][name] for name in stats['features']}
+
+    def predict(self):
+        # Data versions are bumped on commit, which TestCase otherwise never reaches
+        with self.captureOnCommitCallbacks(execute=True):
+            PhysiologicalData.objects.create(user=self.user, predicted_level='Stressed', **self.row)
+
+    def test_unchanged_dashboard_is_not_modified(self):
+        etag = self.client.get('/dashboard/')['ETag']
+        with mock.patch('predictor.views.get_predictor', side_effect=AssertionError('model loaded')):
+            response = self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.predict()
+        response = self.client.get('/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fragments_follow_new_predictions(self):
+        self.assertNotContains(self.client.get('/dashboard/'), 'Confidence Scores')
+        self.predict()
+        response = self.client.get('/dashboard/')
+        self.assertContains(response, 'Confidence Scores')
+        self.assertEqual(response.context['summary']['totals']['ml_predictions'], 1)
+
+
+class BatchApiTests(TestCase):
+    url = '/api/predict/batch/'
+
+    def setUp(self):
+        if not get_predictor().is_loaded():
+            self.skipTest('No trained model')
+        self.user = User.objects.create_user('batcher', password='p')
+        self.client.login(username='batcher', password='p')
+        stats = read_feature_stats(MODEL_DIR)
+        self.row = {name: stats['median'][name] for name in stats['features']}
+
+    def post(self, body, content_type='application/json'):
+        return self.client.post(self.url, body, content_type=content_type)
+
+    def test_json_array_and_rows_object(self):
+        for body in ([self.row, self.row], {'rows': [self.row, self.row]}):
+            with self.subTest(body=type(body).__name__):
+                response = self.post(json.dumps(body))
+                self.assertEqual(response.status_code, 200)
+                results = response.json()['results']
+                self.assertEqual(len(results), 2)
+                self.assertEqual(set(results[0]), {'id', 'predicted_level', 'confidence'})
+        self.assertEqual(PhysiologicalData.objects.filter(user=self.user).count(), 4)
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(self.row) for _ in range(3)) + '\n\n'
+        response = self.post(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_bad_bodies(self):
+        cases = [('[{"BVP_mean": ', 400, 'Invalid body'), ('{"rows": 3}', 400, 'Invalid body'),
+                 ('[1, 2]', 400, 'Invalid body'), ('[]', 400, 'No rows supplied')]
+        for body, status, error in cases:
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual(response.status_code, status)
+                self.assertTrue(response.json()['error'].startswith(error))
+        self.assertFalse(PhysiologicalData.objects.exists())
+
+    def test_invalid_rows_are_listed(self):
+        bad = dict(self.row, TEMP_mean=1e6)
+        response = self.post(json.dumps([self.row, bad]))
+        self.assertEqual(response.status_code, 400)
+        problems = response.json()['rows']
+        self.assertEqual([p['row'] for p in problems], [1])
+        self.assertIn('TEMP_mean', problems[0]['out_of_range'])
+        self.assertFalse(PhysiologicalData.objects.exists())
+
+    @override_settings(PREDICT_BATCH_MAX_ROWS=2)
+    def test_row_limit(self):
+        self.assertEqual(self.post(json.dumps([self.row] * 2)).status_code, 200)
+        response = self.post(json.dumps([self.row] * 3))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['error'], 'Too many rows (max 2)')
+
+    def test_requires_login_and_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.post(self.url, '[]', content_type='application/json').status_code, 403)
+        client.login(username='batcher', password='p')
+        client.get('/ml-predict/')
+        body = json.dumps([self.row])
+        self.assertEqual(client.post(self.url, body, content_type='application/json').status_code, 403)
+        response = client.post(self.url, body, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.post(body).status_code, 401)
+
+
+class ScoreFileTests(SimpleTestCase):
+    def test_workers_score_like_the_main_process(self):
+        if not get_predictor().is_loaded():
+            self.skipTest('No trained model')
+        stats = read_feature_stats(MODEL_DIR)
+        row = {name: stats['median'][name] for name in stats['features']}
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'windows.csv')
+            with open(source, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['subject'] + stats['features'])
+                writer.writeheader()
+                for i in range(5):
+                    writer.writerow(dict(row, subject=i, TEMP_mean=1e6 if i == 3 else row['TEMP_mean']))
+            outputs = []
+            for processes in (0, 2):
+                output = os.path.join(tmp, f'scored{processes}.csv')
+                call_command('score_file', source, output, processes=processes, chunk_size=2, keep='subject',
+                             stdout=io.StringIO())
+                with open(output, newline='') as f:
+                    outputs.append(list(csv.DictReader(f)))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual([r['subject'] for r in outputs[0]], ['0', '1', '2', '3', '4'])
+        self.assertEqual(outputs[0][3]['predicted_level'], '')
+        self.assertIn('TEMP_mean', outputs[0][3]['problems'])
+        self.assertEqual(outputs[0][0]['predicted_level'], get_predictor().predict(row)[0])
+
+
+class CommunityFeedTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('writer', password='p')
+
+    def post(self, content, anonymous=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            return JournalEntry.objects.create(user=self.user, content=content, anonymous=anonymous)
+
+    def feed(self):
+        return [entry.content for entry in community_feed.get()]
+
+    def test_concurrent_posts_are_all_listed(self):
+        self.post('first')
+        self.assertEqual(self.feed(), ['first'])
+        # Both commits land before either writer touches the cache
+        with self.captureOnCommitCallbacks() as callbacks:
+            JournalEntry.objects.create(user=self.user, content='second', anonymous=True)
+            JournalEntry.objects.create(user=self.user, content='third', anonymous=True)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.feed(), ['third', 'second', 'first'])
+
+    def test_feed_loaded_before_a_commit_is_not_reused(self):
+        self.post('first')
+        cache = caches[settings.DASHBOARD_CACHE_ALIAS]
+        stale_key = f'{community_feed.KEY}:{community_feed._generation(cache)}'
+        stale = community_feed._load()
+        self.post('second')
+        # A slow reader stores what it read before the commit
+        cache.set(stale_key, stale)
+        self.assertEqual(self.feed(), ['second', 'first'])
+
+    def test_edits_and_deletes_update_the_feed(self):
+        entry = self.post('shared')
+        self.post('mine', anonymous=False)
+        self.assertEqual(self.feed(), ['shared'])
+        entry.anonymous = False
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.assertEqual(self.feed(), [])
+        entry = self.post('again')
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.delete()
+        self.assertEqual(self.feed(), [])
+
+
+class StreamApiTests(TestCase):
+    profile = {'age': 27, 'height': 175, 'weight': 80}
+
+    def setUp(self):
+        if not get_predictor().is_loaded():
+            self.skipTest('No trained model')
+        self.user = User.objects.create_user('streamer', password='p')
+        self.client.login(username='streamer', password='p')
+
+    def open(self, **body):
+        body = dict(self.profile, **body)
+        return self.client.post('/api/stream/', json.dumps(body), content_type='application/json')
+
+    def test_session_without_resp(self):
+        # raw_subset has BVP and EDA only; the Resp and TEMP features are filled with training medians
+        response = self.open(signals=['BVP', 'EDA'])
+        self.assertEqual(response.status_code, 201)
+        session = response.json()
+        self.assertEqual(session['signals'], ['BVP', 'EDA'])
+        batch = {}
+        for signal, path in subject_streams(RAW_SUBSET, 1).items():
+            t, v = signal_store.load_signal(path)
+            batch[signal] = {'t': t.tolist(), 'v': v.tolist()}
+        offline = list(extract_features(subject_streams(RAW_SUBSET, 1), profile=self.profile))
+        response = self.client.post(f"/api/stream/{session['session']}/", json.dumps(batch),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['session']['window_seconds'], offline[0]['window_end'] - offline[0]['window_start'])
+        self.assertEqual([r['window_start'] for r in body['results']], [r['window_start'] for r in offline])
+        # Absent signals are filled; only windows outside the training range go unscored
+        for result in body['results']:
+            self.assertTrue('id' in result or set(result) == {'out_of_range', 'window_start', 'window_end'}, result)
+        self.assertGreater(PhysiologicalData.objects.filter(user=self.user).count(), len(offline) // 2)
+
+    def test_invalid_open_requests(self):
+        for body in ({'signals': ['BVP', 'ECG']}, {'signals': []}, {'signals': 'BVP'},
+                     {'window_seconds': -5}, {'step_seconds': 'soon'}):
+            with self.subTest(body=body):
+                self.assertEqual(self.open(**body).status_code, 400)
+
+    def test_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='streamer', password='p')
+        body = json.dumps({'age': 27, 'height': 175, 'weight': 80})
+        self.assertEqual(client.post('/api/stream/', body, content_type='application/json').status_code, 403)
+        client.get('/ml-predict/')
+        response = client.post('/api/stream/', body, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/stream/{response.json()['session']}/"
+        self.assertEqual(client.delete(url).status_code, 403)
+        self.assertEqual(client.get(url).status_code, 200)
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_percentiles(self):
+        stats = benchmarks.percentiles(range(1, 101))
+        self.assertEqual(set(stats), {'n', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'})
+        self.assertEqual(stats['n'], 100)
+        self.assertAlmostEqual(stats['p50_ms'], 50.5)
+        self.assertAlmostEqual(stats['p90_ms'], 90.1)
+        self.assertEqual(stats['max_ms'], 100)
+
+    def test_report_shape_and_compare(self):
+        predictor = get_predictor()
+        if not predictor.is_loaded():
+            self.skipTest('No trained model')
+        stats = read_feature_stats(MODEL_DIR)
+        matrix = np.array([[stats['median'][name] for name in stats['features']]] * 4)
+        report = {
+            'single': benchmarks.bench_single(predictor, matrix, repeat=5, warmup=1),
+            'batch': benchmarks.bench_batches(predictor, matrix, batch_sizes=(1, 8), min_seconds=0),
+        }
+        self.assertEqual(report['single']['n'], 5)
+        self.assertEqual(set(report['batch']), {'1', '8'})
+        self.assertGreater(report['batch']['8']['rows_per_second'], 0)
+        slower = json.loads(json.dumps(report))
+        slower['single']['p50_ms'] *= 2
+        rows = {row[0]: row for row in benchmarks.compare(report, slower)}
+        self.assertTrue(rows['single.p50_ms'][4])
+        self.assertFalse(rows['single.p90_ms'][4])
+        self.assertNotIn('single.n', rows)
+
+    def test_views_run_on_private_caches(self):
+        site = os.fspath(settings.BASE_DIR / '.django_cache')
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': site},
+        }):
+            caches = benchmarks.private_caches('/tmp/bench')
+        self.assertEqual(caches['shared']['LOCATION'], os.path.join('/tmp/bench', 'shared'))
+        self.assertTrue(caches['shared']['BACKEND'].endswith('FileBasedCache'))
+        self.assertEqual(caches['default']['LOCATION'], 'benchmark-default')
+
+
+class PredictManyTests(SimpleTestCase):
+    def test_fill_missing_is_passed_through(self):
+        predictor = get_predictor()
+        if not predictor.is_loaded():
+            self.skipTest('No trained model')
+        stats = read_feature_stats(MODEL_DIR)
+        row = {name: stats['median'][name] for name in stats['features'] if not name.startswith(('Resp', 'TEMP'))}
+        with self.assertRaises(InvalidFeatures):
+            predictor.predict_many([row])
+        classes, probabilities = predictor.predict_many([row], fill_missing=True)
+        full = {name: stats['median'][name] for name in stats['features']}
+        np.testing.assert_allclose(probabilities, predictor.predict_many([full])[1])
+        self.assertEqual(predictor.predict_labeled([row], fill_missing=True), predictor.predict_labeled([full]))
+
+    def test_batch_matches_row_by_row_predictions(self):
+        import pandas as pd
+        predictor = get_predictor()
+        if not predictor.is_loaded():
+            self.skipTest('No trained model')
+        X, _, _, _ = training.load_dataset()
+        X = X[np.random.default_rng(0).choice(len(X), size=40, replace=False)]
+        rows = [dict(zip(training.SELECTED_FEATURES, values)) for values in X]
+        classes, probabilities = predictor.predict_many(rows)
+        labeled = predictor.predict_labeled(rows)
+        labels = predictor.class_labels()
+        for row, c, p, (label, confidence) in zip(rows, classes, probabilities, labeled):
+            single_label, single_confidence = predictor.predict(row)
+            self.assertEqual((single_label, single_confidence), (label, confidence))
+            self.assertEqual(single_label, predictor.labels[int(c)])
+            np.testing.assert_allclose([single_confidence[name] for name in labels], p)
+        np.testing.assert_array_equal(
+            predictor.predict_many(pd.DataFrame(rows)[list(reversed(training.SELECTED_FEATURES))])[1], probabilities)
+        np.testing.assert_array_equal(predictor.predict_many(X)[1], probabilities)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rolling', password='p')
+        stats = read_feature_stats(MODEL_DIR)
+        self.row = {name: stats['median'][name] for name in stats['features']}
+
+    def rollup(self, period='day'):
+        return UserRollup.objects.get(user=self.user, period=period)
+
+    def respond(self, level):
+        return Response.objects.create(user=self.user, predicted_level=level, **{f'q{i}': 1 for i in range(1, 11)})
+
+    def test_saves_and_deletes_adjust_every_period(self):
+        low, high = self.respond('Low Stress'), self.respond('High Stress')
+        mood = MoodEntry.objects.create(user=self.user, mood_scale=7)
+        PhysiologicalData.objects.create(user=self.user, predicted_level='Stressed', confidence_stressed=0.75,
+                                         **self.row)
+        PhysiologicalData.objects.create(user=self.user, predicted_level='Pending', **self.row)
+        for period in ('day', 'week'):
+            rollup = self.rollup(period)
+            self.assertEqual((rollup.response_low, rollup.response_medium, rollup.response_high), (1, 0, 1))
+            self.assertEqual((rollup.mood_sum, rollup.mood_count), (7, 1))
+            self.assertEqual((rollup.ml_stressed, rollup.confidence_stressed_count), (1, 1))
+            self.assertAlmostEqual(rollup.confidence_stressed_sum, 0.75)
+        self.assertEqual(self.rollup().mean_stress_level, 2)
+
+        high.delete()
+        mood.delete()
+        PhysiologicalData.objects.filter(user=self.user, predicted_level='Stressed').get().delete()
+        for period in ('day', 'week'):
+            rollup = self.rollup(period)
+            self.assertEqual((rollup.response_low, rollup.response_high, rollup.mood_count), (1, 0, 0))
+            self.assertEqual((rollup.ml_stressed, rollup.confidence_stressed_count), (0, 0))
+            self.assertAlmostEqual(rollup.confidence_stressed_sum, 0)
+        low.delete()
+        self.assertEqual(self.rollup().response_count, 0)
+
+    def test_decrements_never_create_rows(self):
+        rollups.apply([(self.user.pk, timezone.now(), {'response_low': -1})])
+        self.assertFalse(UserRollup.objects.filter(user=self.user).exists())
+
+    def test_incremental_rows_match_a_rebuild(self):
+        for level in ('Low Stress', 'Medium Stress', 'Medium Stress'):
+            self.respond(level)
+        MoodEntry.objects.create(user=self.user, mood_scale=4)
+        self.respond('High Stress').delete()
+        fields = ('period', 'period_start', 'response_low', 'response_medium', 'response_high', 'mood_sum',
+                  'mood_count', 'ml_amused', 'ml_neutral', 'ml_stressed', 'confidence_stressed_count')
+        incremental = list(UserRollup.objects.filter(user=self.user).order_by('period').values_list(*fields))
+        rollups.rebuild(self.user)
+        rebuilt = list(UserRollup.objects.filter(user=self.user).order_by('period').values_list(*fields))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_dashboard_summary(self):
+        for level in ('Low Stress', 'High Stress', 'High Stress'):
+            self.respond(level)
+        for _ in range(40):
+            MoodEntry.objects.create(user=self.user, mood_scale=5)
+        summary = rollups.dashboard_summary(self.user)
+        # One point per day at that day's mean level; the totals are all-time, not capped at the page's 30 rows
+        self.assertEqual(summary['chart_labels'], [timezone.localdate().strftime('%Y-%m-%d')])
+        self.assertEqual(summary['chart_data'], [round(7 / 3, 2)])
+        self.assertEqual(summary['totals'], {'responses': 3, 'moods': 40, 'ml_predictions': 0})
+
+
+class JobQueueTests(TransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('queued', password='p')
+        stats = read_feature_stats(MODEL_DIR)
+        row = {name: stats['median'][name] for name in stats['features']}
+        self.jobs = [jobs.enqueue(PhysiologicalData.objects.create(user=self.user, **row)) for _ in range(3)]
+
+    def status(self):
+        return sorted(PredictionJob.objects.values_list('status', 'worker'))
+
+    def test_claims_are_exclusive(self):
+        first = jobs.claim_batch('a', 2)
+        second = jobs.claim_batch('b', 10)
+        self.assertEqual([job.pk for job in first + second], [job.pk for job in self.jobs])
+        self.assertEqual(jobs.claim_batch('a', 10), [])
+        self.assertEqual(self.status(), [('running', 'a'), ('running', 'a'), ('running', 'b')])
+
+    def test_racing_worker_gets_nothing(self):
+        rival = []
+        update = QuerySet.update
+
+        def update_after_rival(queryset, **kwargs):
+            # Worker b claims the same pending ids between a's SELECT and UPDATE
+            if not rival:
+                rival.append(None)
+                rival.append(jobs.claim_batch('b', 10))
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update_after_rival):
+            claimed = jobs.claim_batch('a', 10)
+        self.assertEqual(claimed, [])
+        self.assertEqual(len(rival[1]), 3)
+        self.assertEqual(self.status(), [('running', 'b')] * 3)
+
+    def test_complete_stores_predictions(self):
+        claimed = jobs.claim_batch('a', 10)
+        self.assertFalse(UserRollup.objects.filter(user=self.user, ml_stressed__gt=0).exists())
+        jobs.complete(claimed, [('Stressed', {'Stressed': 0.8, 'Neutral': 0.1, 'Amused': 0.1})] * 3)
+        self.assertEqual(self.status(), [('done', 'a')] * 3)
+        self.assertEqual(set(PhysiologicalData.objects.values_list('predicted_level', 'confidence_stressed')),
+                         {('Stressed', 0.8)})
+        self.assertEqual(UserRollup.objects.get(user=self.user, period='day').ml_stressed, 3)
+
+    def test_failed_jobs_are_retried_then_given_up(self):
+        for attempt in range(1, 4):
+            claimed = jobs.claim_batch('a', 1)
+            self.assertEqual([job.pk for job in claimed], [self.jobs[0].pk])
+            jobs.fail(claimed, RuntimeError('model exploded'), max_attempts=3)
+            job = PredictionJob.objects.get(pk=self.jobs[0].pk)
+            self.assertEqual((job.attempts, job.status), (attempt, 'failed' if attempt == 3 else 'pending'))
+        self.assertEqual(job.error, 'model exploded')
+        self.assertEqual(job.data.predicted_level, 'Prediction error')
+        self.assertEqual([job.pk for job in jobs.claim_batch('a', 10)], [job.pk for job in self.jobs[1:]])
+
+    def test_stale_running_jobs_are_requeued(self):
+        claimed = jobs.claim_batch('dead', 2)
+        PredictionJob.objects.filter(pk=claimed[0].pk).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(timeout_seconds=300), 1)
+        self.assertEqual(self.status(), [('pending', ''), ('pending', ''), ('running', 'dead')])
+        self.assertEqual(jobs.requeue_stale(timeout_seconds=300), 0)
+        self.assertEqual({job.pk for job in jobs.claim_batch('b', 10)}, {claimed[0].pk, self.jobs[2].pk})
+
+
+class PackedStorageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('packer', password='p')
+        stats = read_feature_stats(MODEL_DIR)
+        self.row = {name: stats['median'][name] for name in stats['features']}
+
+    def assertInSync(self, obj):
+        obj.refresh_from_db()
+        self.assertIsNotNone(obj.packed)
+        for name, value in obj.unpacked.items():
+            column = getattr(obj, name)
+            if column is None:
+                self.assertIsNone(value, name)
+            else:
+                self.assertAlmostEqual(value, np.float32(column), places=3, msg=name)
+
+    def test_blob_round_trips_after_save(self):
+        obj = PhysiologicalData.objects.create(user=self.user, **self.row)
+        self.assertEqual(len(obj.packed), PACKED_SIZE)
+        self.assertIsNone(obj.confidence['Stressed'])
+        self.assertInSync(obj)
+        obj.BVP_mean += 1
+        obj.confidence_stressed = 0.75
+        obj.save()
+        self.assertInSync(obj)
+        self.assertEqual(obj.confidence['Stressed'], 0.75)
+        obj.EDA_tonic_mean += 1
+        obj.save(update_fields=['EDA_tonic_mean'])
+        self.assertInSync(obj)
+
+    def test_bulk_writes_and_update_keep_the_blob_current(self):
+        objs = PhysiologicalData.objects.bulk_create(
+            [PhysiologicalData(user=self.user, **self.row) for _ in range(3)])
+        for obj in objs:
+            obj.TEMP_mean += 2
+        PhysiologicalData.objects.bulk_update(objs, ['TEMP_mean'])
+        PhysiologicalData.objects.filter(id=objs[0].id).update(predicted_level='Stressed', confidence_stressed=0.5)
+        for obj in PhysiologicalData.objects.all():
+            self.assertInSync(obj)
+        self.assertEqual(PhysiologicalData.objects.get(id=objs[0].id).confidence['Stressed'], 0.5)
+
+    def test_feature_matrix_matches_the_columns(self):
+        for offset in range(5):
+            PhysiologicalData.objects.create(user=self.user, **dict(self.row, BVP_mean=self.row['BVP_mean'] + offset))
+        expected = np.array(PhysiologicalData.objects.order_by('created_at', 'id').values_list(*FEATURE_FIELDS),
+                            dtype=np.float32)
+        np.testing.assert_array_equal(PhysiologicalData.objects.feature_matrix(user=self.user), expected)
+        blocks = list(PhysiologicalData.objects.iter_feature_matrices(batch_rows=2))
+        self.assertEqual([len(block) for block in blocks], [2, 2, 1])
+        np.testing.assert_array_equal(np.vstack(blocks), expected)
+        self.assertEqual(PhysiologicalData.objects.feature_matrix(confidences=True).shape, (5, len(PACKED_FIELDS)))
+
+    def test_migration_backfills_unpacked_rows(self):
+        migration = importlib.import_module('predictor.migrations.0006_physiologicaldata_packed')
+        self.assertEqual(migration.PACKED_FIELDS, PACKED_FIELDS)
+        obj = PhysiologicalData.objects.create(user=self.user, confidence_amused=0.25, **self.row)
+        PhysiologicalData.objects.filter(id=obj.id).update(packed=None)
+        migration.pack_existing(django_apps, None)
+        self.assertInSync(obj)
+        self.assertEqual(len(obj.packed), PACKED_SIZE)
+
+
+class JournalSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('writer', password='p')
+        self.other = User.objects.create_user('reader', password='p')
+
+    def entry(self, content, user=None, anonymous=True):
+        return JournalEntry.objects.create(user=user or self.user, anonymous=anonymous, content=content)
+
+    def found(self, query, user=None, **page):
+        entries, _ = journal_search.search(query, user or self.user, **page)
+        return [entry.id for entry in entries]
+
+    def test_triggers_keep_the_index_in_sync(self):
+        entry = self.entry('Deadline panic before the exam')
+        self.assertEqual(self.found('panic'), [entry.id])
+        entry.content = 'Calm walk by the river'
+        entry.save()
+        self.assertEqual(self.found('panic'), [])
+        self.assertEqual(self.found('river'), [entry.id])
+        entry.delete()
+        self.assertEqual(self.found('river'), [])
+
+    def test_private_entries_of_other_users_do_not_match(self):
+        mine = self.entry('Private worries about work', anonymous=False)
+        shared = self.entry('Shared worries about money', user=self.other)
+        self.entry('Hidden worries about family', user=self.other, anonymous=False)
+        self.assertEqual(set(self.found('worries')), {mine.id, shared.id})
+        self.assertEqual(self.found('worries', user=AnonymousUser()), [shared.id])
+
+    def test_results_are_ranked_and_paged(self):
+        weak = self.entry('Long day with meetings, emails, errands, traffic and a little stress at the end')
+        strong = self.entry('Stress, stress and more stress')
+        self.assertEqual(self.found('stress'), [strong.id, weak.id])
+        entries, has_more = journal_search.search('stress', self.user, offset=0, limit=1)
+        self.assertEqual(([e.id for e in entries], has_more), ([strong.id], True))
+        entries, has_more = journal_search.search('stress', self.user, offset=1, limit=1)
+        self.assertEqual(([e.id for e in entries], has_more), ([weak.id], False))
+        self.assertIn('<mark>', str(entries[0].snippet))
+
+    def test_last_term_matches_as_prefix_and_syntax_is_quoted(self):
+        entry = self.entry('Feeling overwhelmed <b>today</b>')
+        self.assertEqual(self.found('overwh'), [entry.id])
+        self.assertEqual(self.found('content: NEAR(today'), [])
+        self.assertEqual(self.found('"today'), [entry.id])
+        self.assertNotIn('<b>', str(journal_search.search('today', self.user)[0][0].snippet))
+        self.assertEqual(journal_search.search('?!', self.user), ([], False))
+
+    @override_settings(JOURNAL_SEARCH_CANDIDATES=2)
+    def test_only_the_newest_candidates_are_ranked(self):
+        old = self.entry('tired tired tired')
+        newer = [self.entry(f'tired after shift {n}') for n in range(2)]
+        self.assertEqual(set(self.found('tired')), {entry.id for entry in newer})
+        self.assertNotIn(old.id, self.found('tired'))
+
+    def test_fallback_filters_by_substring_and_visibility(self):
+        mine = self.entry('Exam stress again', anonymous=False)
+        shared = self.entry('Stressful commute', user=self.other)
+        self.entry('Private stress', user=self.other, anonymous=False)
+        self.entry('Quiet evening')
+        with mock.patch.object(journal_search, 'is_supported', return_value=False):
+            self.assertEqual(self.found('stress'), [shared.id, mine.id])
+            entries, has_more = journal_search.search('stress', self.user, offset=0, limit=1)
+            self.assertEqual(([e.id for e in entries], has_more), ([shared.id], True))
+            self.assertEqual(self.found('exam stress'), [mine.id])
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('scroller', password='p')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_cursor_round_trips(self):
+        entry = MoodEntry.objects.create(user=self.user, mood_scale=5)
+        cursor = pagination.encode_cursor(entry)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(pagination.decode_cursor(cursor), (entry.created_at, entry.pk))
+        for bad in ('', 'not-a-cursor', 'bm90fGE'):
+            with self.assertRaises(ValueError):
+                pagination.decode_cursor(bad)
+        self.assertEqual([pagination.parse_limit(v) for v in (None, 'x', '0', '5', '500')],
+                         [pagination.DEFAULT_LIMIT, pagination.DEFAULT_LIMIT, 1, 5, pagination.MAX_LIMIT])
+
+    def test_pages_split_rows_sharing_a_timestamp(self):
+        entries = [MoodEntry.objects.create(user=self.user, mood_scale=n % 10 + 1) for n in range(7)]
+        instant = timezone.now()
+        MoodEntry.objects.filter(pk__in=[e.pk for e in entries[1:6]]).update(created_at=instant)
+        MoodEntry.objects.filter(pk=entries[6].pk).update(created_at=instant + timedelta(seconds=1))
+        MoodEntry.objects.filter(pk=entries[0].pk).update(created_at=instant - timedelta(seconds=1))
+        expected = [entries[6].pk] + [e.pk for e in reversed(entries[1:6])] + [entries[0].pk]
+        queryset = MoodEntry.objects.filter(user=self.user).order_by('-created_at', '-id')
+        seen, cursor = [], None
+        while True:
+            items, next_cursor = pagination.keyset_page([queryset], cursor, limit=2)
+            seen += [item.pk for item in items]
+            if next_cursor is None:
+                break
+            cursor = pagination.decode_cursor(next_cursor)
+        self.assertEqual(seen, expected)
+
+    def test_history_api_walks_every_page(self):
+        for n in range(5):
+            MoodEntry.objects.create(user=self.user, mood_scale=n + 1)
+        MoodEntry.objects.update(created_at=timezone.now())
+        seen, params = [], {'limit': 2}
+        while True:
+            body = self.client.get('/api/history/moods/', params).json()
+            seen += [item['id'] for item in body['results']]
+            if body['next_cursor'] is None:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(seen, sorted(MoodEntry.objects.values_list('pk', flat=True), reverse=True))
+        self.assertEqual(self.client.get('/api/history/moods/', {'cursor': 'garbage'}).status_code, 400)
+
+
+class SlimmingTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from sklearn.ensemble import RandomForestClassifier
+        rng = np.random.default_rng(0)
+        cls.X = rng.normal(size=(400, 4))
+        cls.y = (cls.X[:, 0] + cls.X[:, 1] ** 2 + rng.normal(scale=0.5, size=400) > 1).astype(int)
+        cls.y[cls.X[:, 2] > 1.2] = 2
+        cls.model = RandomForestClassifier(n_estimators=6, random_state=0).fit(cls.X, cls.y)
+
+    def cut_proba(self, estimator, max_depth):
+        """Class distribution of the node each row reaches at max_depth of the uncut tree"""
+        tree = estimator.tree_
+        depths = np.zeros(tree.node_count, dtype=int)
+        for node in range(tree.node_count):
+            for child in (tree.children_left[node], tree.children_right[node]):
+                if child != -1:
+                    depths[child] = depths[node] + 1
+        paths = estimator.decision_path(self.X).tocsr()
+        nodes = [max((n for n in paths.indices[paths.indptr[i]:paths.indptr[i + 1]] if depths[n] <= max_depth),
+                     key=lambda n: depths[n]) for i in range(len(self.X))]
+        values = tree.value[nodes, 0]
+        return values / values.sum(axis=1, keepdims=True)
+
+    def test_pruned_trees_predict_the_node_at_the_cut_depth(self):
+        for max_depth in (1, 3, 5):
+            pruned = slimming.prune_forest(self.model, 4, max_depth)
+            self.assertEqual(len(pruned.estimators_), 4)
+            expected = []
+            for tree, original in zip(pruned.estimators_, self.model.estimators_):
+                self.assertLessEqual(tree.tree_.max_depth, max_depth)
+                expected.append(self.cut_proba(original, max_depth))
+                np.testing.assert_allclose(tree.predict_proba(self.X), expected[-1])
+            np.testing.assert_allclose(pruned.predict_proba(self.X), np.mean(expected, axis=0))
+            np.testing.assert_allclose(CompiledForest.from_model(pruned).predict_proba(self.X),
+                                       pruned.predict_proba(self.X), atol=1e-6)
+        self.assertEqual(len(self.model.estimators_), 6)
+        self.assertIs(slimming.truncate_tree(self.model.estimators_[0], None), self.model.estimators_[0])
+
+    def test_promoted_candidate_is_a_loadable_artifact(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            for name in ('stress_model.joblib', 'labels.json', 'features.json', 'feature_stats.json'):
+                shutil.copy(os.path.join(MODEL_DIR, name), model_dir)
+            report = os.path.join(model_dir, 'report.json')
+            call_command('slim_stress_model', promote='prune-n10-d6', model_dir=model_dir, output=report,
+                         repeat=5, batch_size=20, stdout=io.StringIO())
+            with open(os.path.join(model_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest['metrics']['slimmed_candidate'], 'prune-n10-d6')
+            with open(report) as f:
+                self.assertEqual([c['id'] for c in json.load(f)['candidates']], ['serving', 'prune-n10-d6'])
+            predictor = StressPredictor(model_dir=model_dir)
+            self.assertTrue(predictor.is_loaded())
+            self.assertEqual(predictor.manifest['version'], manifest['version'])
+            self.assertEqual(predictor._current_state().model.meta['n_trees'], 10)
+            stats = read_feature_stats(model_dir)
+            result = predictor.predict({name: stats['median'][name] for name in stats['features']})
+            self.assertIn(result[0], ('Amused', 'Neutral', 'Stressed'))
+
+
+class SignalStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.csv = os.path.join(self.dir, 'S1_EDA.csv')
+        self.write('seconds,EDA\n0.0,1.5\n0.25,\n0.5,2.5\n0.75,\n1.0,3.5\n')
+
+    def write(self, text):
+        with open(self.csv, 'w') as f:
+            f.write(text)
+
+    def test_load_maps_only_the_real_samples(self):
+        t, v = signal_store.load_signal(self.csv)
+        self.assertIsInstance(t, np.memmap)
+        self.assertEqual((t.dtype, v.dtype), (np.float64, np.float32))
+        np.testing.assert_array_equal(t, [0.0, 0.5, 1.0])
+        np.testing.assert_array_equal(v, [1.5, 2.5, 3.5])
+        with self.assertRaises(ValueError):
+            v[0] = 0
+        self.assertEqual([len(chunk_t) for chunk_t, _ in signal_store.iter_signal_chunks(self.csv, 2)], [2, 1])
+        self.assertTrue(os.path.exists(os.path.join(self.dir, signal_store.CACHE_DIRNAME, 'S1_EDA.json')))
+
+    def test_changes_to_the_source_make_the_copy_stale(self):
+        self.assertTrue(signal_store.is_stale(self.csv))
+        signal_store.convert_signal(self.csv)
+        self.assertFalse(signal_store.is_stale(self.csv))
+        stat = os.stat(self.csv)
+        os.utime(self.csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertTrue(signal_store.is_stale(self.csv))
+        signal_store.convert_signal(self.csv)
+        self.write('seconds,EDA\n0.0,1.5\n0.5,9.5\n')
+        self.assertTrue(signal_store.is_stale(self.csv))
+        np.testing.assert_array_equal(signal_store.load_signal(self.csv)[1], [1.5, 9.5])
+        self.assertFalse(signal_store.is_stale(self.csv))
+
+    def test_bad_manifest_is_stale_and_directory_converts_once(self):
+        cache_dir = os.path.join(self.dir, 'store')
+        self.assertEqual(signal_store.convert_directory(self.dir, cache_dir), [(self.csv, True)])
+        self.assertEqual(signal_store.convert_directory(self.dir, cache_dir), [(self.csv, False)])
+        _, _, manifest_path = signal_store.cache_paths(self.csv, cache_dir)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        with open(manifest_path, 'w') as f:
+            json.dump(dict(manifest, format=signal_store.FORMAT_VERSION + 1), f)
+        self.assertTrue(signal_store.is_stale(self.csv, cache_dir))
+        with open(manifest_path, 'w') as f:
+            f.write('{truncated')
+        self.assertTrue(signal_store.is_stale(self.csv, cache_dir))
+
+
+class TrainingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.csv = os.path.join(self.dir, 'merged.csv')
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(60, len(training.SELECTED_FEATURES)))
+        self.y = np.arange(60) % 3
+        self.groups = np.repeat(np.arange(1, 7), 10)
+        self.write_csv(self.X)
+
+    def write_csv(self, X):
+        with open(self.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['', *training.SELECTED_FEATURES, 'label', 'subject'])
+            for i, row in enumerate(X):
+                writer.writerow([i, *row, self.y[i], self.groups[i]])
+
+    def test_dataset_snapshot_is_keyed_by_the_csv_hash(self):
+        cache_dir = os.path.join(self.dir, 'cache')
+        X, y, groups, data_hash = training.load_dataset(self.csv, cache_dir=cache_dir)
+        np.testing.assert_allclose(X, self.X)
+        self.assertEqual(os.listdir(cache_dir), [data_hash[:16]])
+        with mock.patch.object(training.pd, 'read_csv', side_effect=AssertionError('CSV parsed again')):
+            cached = training.load_dataset(self.csv, cache_dir=cache_dir)
+        for fresh, again in zip((X, y, groups), cached):
+            np.testing.assert_array_equal(fresh, again)
+        self.assertEqual(cached[3], data_hash)
+
+        subset = training.SELECTED_FEATURES[:3]
+        self.assertEqual(training.load_dataset(self.csv, features=subset, cache_dir=cache_dir)[0].shape, (60, 3))
+        self.write_csv(self.X + 1)
+        X2, _, _, new_hash = training.load_dataset(self.csv, cache_dir=cache_dir)
+        self.assertNotEqual(new_hash, data_hash)
+        np.testing.assert_allclose(X2, self.X + 1)
+        self.assertEqual(sorted(os.listdir(cache_dir)), sorted([data_hash[:16], new_hash[:16]]))
+
+    def test_group_split_holds_out_whole_subjects(self):
+        X_train, X_test, y_train, y_test = training.split_dataset(
+            self.X, self.y, self.groups, test_size=0.3, random_state=0, group_split=True)
+        subject = {tuple(row): g for row, g in zip(self.X, self.groups)}
+        train_subjects = {subject[tuple(row)] for row in X_train}
+        test_subjects = {subject[tuple(row)] for row in X_test}
+        self.assertFalse(train_subjects & test_subjects)
+        self.assertEqual(len(test_subjects), 2)
+        self.assertEqual((len(X_train), len(y_test)), (40, 20))
+
+    def test_promote_version_swaps_the_serving_artifacts(self):
+        model_dir = os.path.join(self.dir, 'model')
+        first, _ = training.fit_model(self.X, self.y, n_jobs=1, n_estimators=3)
+        second, _ = training.fit_model(self.X, self.y, n_jobs=1, n_estimators=5)
+        training.save_artifacts(first, model_dir=model_dir, version='v1')
+        training.save_artifacts(second, model_dir=model_dir, version='v2', promote=False)
+
+        def serving():
+            with open(os.path.join(model_dir, 'manifest.json')) as f:
+                version = json.load(f)['version']
+            return version, StressPredictor(model_dir=model_dir)._current_state().model.meta['n_trees']
+
+        self.assertEqual(serving(), ('v1', 3))
+        training.promote_version('v2', model_dir)
+        self.assertEqual(serving(), ('v2', 5))
+        training.promote_version('v1', model_dir)
+        self.assertEqual(serving(), ('v1', 3))
+        self.assertFalse([name for name in os.listdir(model_dir) if name.endswith('.tmp')])
+
+
+class CompiledForestTests(SimpleTestCase):
+    @staticmethod
+    def tree_mean_proba(model, X):
+        """Mean of the trees' normalized leaf distributions, as sklearn's forest predict_proba averages them"""
+        leaves = model.apply(X)
+        probabilities = []
+        for i, estimator in enumerate(model.estimators_):
+            value = estimator.tree_.value[leaves[:, i], 0]
+            probabilities.append(value / value.sum(axis=1, keepdims=True))
+        return np.mean(probabilities, axis=0)
+
+    def assertParity(self, model, compiled, X):
+        expected = self.tree_mean_proba(model, X)
+        np.testing.assert_allclose(compiled.predict_proba(X), expected, atol=1e-9)
+        np.testing.assert_allclose(compiled.predict_proba(X, chunk_rows=7), expected, atol=1e-9)
+        np.testing.assert_array_equal(compiled.predict(X), model.classes_[expected.argmax(axis=1)])
+        np.testing.assert_array_equal(compiled.apply(X), model.apply(X) + compiled.roots)
+
+    def test_matches_sklearn_on_rows_at_the_split_thresholds(self):
+        from sklearn.ensemble import RandomForestClassifier
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(300, 5))
+        y = (X[:, 0] * X[:, 1] > 0).astype(int) + (X[:, 4] > 1)
+        model = RandomForestClassifier(n_estimators=8, random_state=0).fit(X, y)
+        # Rows sitting exactly on (and one float32 step either side of) split thresholds
+        tree = model.estimators_[0].tree_
+        splits = np.flatnonzero(tree.children_left >= 0)[:20]
+        edges = [X[:60]]
+        for i, node in enumerate(splits):
+            value = np.float32(tree.threshold[node])
+            for target in (value, np.nextafter(value, np.float32(-np.inf)), np.nextafter(value, np.float32(np.inf))):
+                row = X[i].copy()
+                row[tree.feature[node]] = target
+                edges.append(row[None])
+        edges = np.vstack(edges)
+        np.testing.assert_allclose(self.tree_mean_proba(model, edges), model.predict_proba(edges))
+        self.assertParity(model, CompiledForest.from_model(model), edges)
+
+    def test_serving_forest_matches_the_pickle(self):
+        import pickle
+        import warnings
+        forest_dir = os.path.join(MODEL_DIR, 'stress_model.forest')
+        if not os.path.isdir(forest_dir):
+            self.skipTest('No compiled forest')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with open(os.path.join(MODEL_DIR, 'stress_model.joblib'), 'rb') as f:
+                model = pickle.load(f)
+        X, _, _, _ = training.load_dataset()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # fitted on a DataFrame, scored on arrays like StressPredictor
+            self.assertParity(model, CompiledForest.load(forest_dir), X)
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_keys_follow_the_quantized_vector_and_version(self):
+        cache = PredictionCache(precision=2)
+        cache.set_version('v1')
+        a, b, c, zero = cache.keys_for([[1.001, 2.0], [1.004, 2.0], [1.01, 2.0], [-0.0, 2.0]])
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+        self.assertEqual(zero, cache.keys_for([[0.0, 2.0]])[0])
+        self.assertNotEqual(a, cache.keys_for([[1.001, 2.0]], version='v2')[0])
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PredictionCache(max_size=2)
+        cache.set_many({'a': (0, 'A'), 'b': (1, 'B')})
+        self.assertEqual(cache.get_many(['a']), {'a': (0, 'A')})
+        cache.set_many({'c': (2, 'C')})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': (0, 'A'), 'c': (2, 'C')})
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['hits'], stats['misses']), (2, 1, 3, 1))
+        self.assertEqual(stats['hit_rate'], 0.75)
+
+    def test_set_version_drops_local_entries(self):
+        cache = PredictionCache()
+        cache.set_version('v1')
+        cache.set_many({'a': (0, 'A')})
+        cache.set_version('v2')
+        self.assertEqual(cache.get_many(['a']), {})
+        self.assertEqual((cache.stats()['version'], cache.stats()['size'], cache.misses), ('v2', 0, 1))
+
+    def test_shared_backend_fills_local_misses(self):
+        writer, reader = PredictionCache(backend='default'), PredictionCache(backend='default', max_size=1)
+        writer.set_many({'a': (0, 'A'), 'b': (1, 'B')})
+        self.assertEqual(reader.get_many(['a', 'b', 'z']), {'a': (0, 'A'), 'b': (1, 'B')})
+        self.assertEqual(reader.stats()['size'], 1)
+        self.assertEqual((reader.hits, reader.misses), (2, 1))
+
+    def test_predictor_serves_repeated_rows_from_the_cache(self):
+        cache = PredictionCache()
+        predictor = StressPredictor(cache=cache)
+        self.assertTrue(predictor.is_loaded())
+        self.assertEqual(cache.version, predictor.version)
+        stats = read_feature_stats(MODEL_DIR)
+        row = {name: stats['median'][name] for name in stats['features']}
+        with mock.patch.object(StressPredictor, '_score', wraps=StressPredictor._score) as score:
+            first = predictor.predict_many([row, row])
+            second = predictor.predict_many([row])
+        self.assertEqual(score.call_count, 1)
+        np.testing.assert_array_equal(second[1][0], first[1][0])
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+
+class HotReloadTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.model_dir = tmp.name
+        rng = np.random.default_rng(0)
+        X, y = rng.normal(size=(60, len(training.SELECTED_FEATURES))), np.arange(60) % 3
+        for version, n_estimators in (('v1', 3), ('v2', 5)):
+            model, _ = training.fit_model(X, y, n_jobs=1, n_estimators=n_estimators)
+            training.save_artifacts(model, model_dir=self.model_dir, version=version, promote=version == 'v1')
+
+    def wait_for_reload(self, predictor):
+        self.assertTrue(predictor._reload_lock.acquire(timeout=30))
+        predictor._reload_lock.release()
+
+    def test_reloads_only_when_the_artifacts_change(self):
+        cache = PredictionCache()
+        predictor = StressPredictor(model_dir=self.model_dir, reload_interval=0, cache=cache)
+        old_state = predictor._current_state()
+        self.assertFalse(predictor.maybe_reload())
+        training.promote_version('v2', self.model_dir)
+        self.assertTrue(predictor.maybe_reload())
+        self.wait_for_reload(predictor)
+        self.assertEqual(predictor.manifest['version'], 'v2')
+        self.assertEqual(cache.version, predictor.version)
+        self.assertNotEqual(predictor.version, old_state.version)
+        self.assertEqual(old_state.manifest['version'], 'v1')
+        self.assertFalse(predictor.maybe_reload())
+
+    def test_checks_are_throttled_and_never_overlap(self):
+        training.promote_version('v2', self.model_dir)
+        self.assertFalse(StressPredictor(model_dir=self.model_dir).maybe_reload())
+        training.promote_version('v1', self.model_dir)
+        predictor = StressPredictor(model_dir=self.model_dir, reload_interval=60)
+        training.promote_version('v2', self.model_dir)
+        self.assertFalse(predictor.maybe_reload())
+        later = predictor._last_check + 61
+        with predictor._reload_lock, mock.patch('time.monotonic', return_value=later):
+            self.assertFalse(predictor.maybe_reload())
+        self.assertEqual(predictor.manifest['version'], 'v1')
+        with mock.patch('time.monotonic', return_value=later + 61):
+            self.assertTrue(predictor.maybe_reload())
+        self.wait_for_reload(predictor)
+        self.assertEqual(predictor.manifest['version'], 'v2')
+
+
+class LazyImportTests(SimpleTestCase):
+    # Runs in a fresh interpreter: the test process has long imported everything
+    PROBE = (
+        "import io, json, sys, django\n"
+        "django.setup()\n"
+        "from django.core.management import call_command\n"
+        "call_command('check', stdout=io.StringIO())\n"
+        "print(json.dumps([m for m in ('numpy', 'pandas', 'sklearn') if m in sys.modules]))\n"
+    )
+
+    def test_check_does_not_import_the_ml_stack(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                     'stress_project.settings'))
+        result = subprocess.run([sys.executable, '-c', self.PROBE], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
@@ -0,0 +1,259 @@
+"""
+Training pipeline for the stress detection model
+Caches the parsed dataset, fits the forest on all cores and writes versioned artifacts
+"""
+import os
+import json
+import time
+import shutil
+import pickle
+import hashlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split, GroupShuffleSplit
+from sklearn.ensemble import RandomForestClassifier
+from .forest import export_forest, copy_forest, COMPILED_DIRNAME
+from .feature_extraction import DEMOGRAPHIC_FEATURES
+from .preprocessing import compute_feature_stats, standardize, FEATURE_STATS_FILENAME
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(PACKAGE_DIR, 'model')
+NORMALIZED_MODEL_DIR = os.path.join(MODEL_DIR, 'normalized')
+DATA_PATH = os.path.join(PACKAGE_DIR, '..', '..', 'model', 'data', 'merged.csv')
+CACHE_DIR = os.path.join(MODEL_DIR, '.cache')
+
+# Selected features from the notebook
+SELECTED_FEATURES = [
+    'BVP_mean', 'BVP_std', 'EDA_phasic_mean', 'EDA_phasic_min', 'EDA_smna_min',
+    'EDA_tonic_mean', 'Resp_mean', 'Resp_std', 'TEMP_mean', 'TEMP_std', 'TEMP_slope',
+    'BVP_peak_freq', 'age', 'height', 'weight'
+]
+
+# Features z-scored per subject for the normalized variant (UserBaseline fields)
+SUBJECT_FEATURES = [f for f in SELECTED_FEATURES if f not in DEMOGRAPHIC_FEATURES]
+
+LABELS = {
+    0: "Amused",
+    1: "Neutral",
+    2: "Stressed"
+}
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash a file in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_dataset(data_path=DATA_PATH, features=SELECTED_FEATURES, cache_dir=CACHE_DIR, use_cache=True):
+    """
+    Load features, labels and subject ids from merged.csv
+
+    The parsed arrays are cached as .npy files in a directory named after the
+    CSV's SHA-256, so the CSV is only parsed again when its content changes.
+
+    Returns:
+        tuple: (X, y, groups, data_hash)
+    """
+    data_hash = file_sha256(data_path)
+    snapshot_dir = os.path.join(cache_dir, data_hash[:16])
+    snapshot = [os.path.join(snapshot_dir, f'{name}.npy') for name in ('X', 'y', 'groups')]
+    meta_path = os.path.join(snapshot_dir, 'features.json')
+
+    if use_cache and all(os.path.exists(p) for p in snapshot + [meta_path]):
+        with open(meta_path, 'r') as f:
+            if json.load(f) == list(features):
+                X, y, groups = (np.load(p) for p in snapshot)
+                return X, y, groups, data_hash
+
+    df = pd.read_csv(data_path, index_col=0)
+    X = df[list(features)].to_numpy(dtype=np.float64)
+    y = df['label'].to_numpy(dtype=np.int64)
+    groups = df['subject'].to_numpy(dtype=np.int64)
+
+    if use_cache:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        for path, array in zip(snapshot, (X, y, groups)):
+            np.save(path, array)
+        with open(meta_path, 'w') as f:
+            json.dump(list(features), f)
+    return X, y, groups, data_hash
+
+
+def split_dataset(X, y, groups=None, test_size=0.1, random_state=0, group_split=False):
+    """
+    Split into train and test sets
+
+    With group_split=True whole subjects are held out, so the test accuracy
+    reflects performance on people the model has never seen.
+
+    Returns:
+        tuple: (X_train, X_test, y_train, y_test)
+    """
+    if group_split:
+        splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+        train_idx, test_idx = next(splitter.split(X, y, groups))
+        return X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+    return train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+
+def subject_normalize(X, groups, features=SELECTED_FEATURES):
+    """
+    Z-score the SUBJECT_FEATURES columns within each subject's rows
+
+    Serving applies the same transform with the user's running baseline
+    (predictor.baselines), so the normalized model sees comparable inputs.
+
+    Returns:
+        np.ndarray: A normalized copy of X
+    """
+    columns = [list(features).index(f) for f in SUBJECT_FEATURES]
+    out = np.array(X, dtype=np.float64)
+    for subject in np.unique(groups):
+        rows = groups == subject
+        block = out[rows][:, columns]
+        out[rows] = standardize(out[rows], block.mean(axis=0), block.std(axis=0), columns)
+    return out
+
+
+def fit_model(X_train, y_train, n_jobs=-1, random_state=0, **params):
+    """
+    Fit a RandomForestClassifier on all cores
+
+    Returns:
+        tuple: (model, fit_seconds)
+    """
+    model = RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, **params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    # Serving scores one request at a time; don't spawn worker threads per call
+    model.set_params(n_jobs=None)
+    return model, fit_seconds
+
+
+def new_version(data_hash):
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{data_hash[:8]}"
+
+
+def _write_json(path, payload, indent=None):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def save_artifacts(model, features=SELECTED_FEATURES, labels=LABELS, model_dir=MODEL_DIR,
+                   version=None, metrics=None, promote=True, feature_stats=None):
+    """
+    Write a versioned copy of the model and optionally promote it to serving
+
+    The versioned files go to model_dir/versions/<version>/, including the
+    compiled forest (stress_model.forest/). Promoting copies them over the
+    serving artifacts and updates manifest.json, each replaced atomically.
+    feature_stats (from compute_feature_stats on the training rows) is saved
+    as feature_stats.json for input validation and gap filling.
+
+    Returns:
+        dict: The manifest of the saved version
+    """
+    version = version or datetime.now().strftime('%Y%m%d-%H%M%S')
+    version_dir = os.path.join(model_dir, 'versions', version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    # Save the model using pickle (compatible with joblib)
+    model_path = os.path.join(version_dir, 'stress_model.joblib')
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    export_forest(model, os.path.join(version_dir, COMPILED_DIRNAME), source_path=model_path, version=version)
+    _write_json(os.path.join(version_dir, 'labels.json'), {str(k): v for k, v in labels.items()})
+    _write_json(os.path.join(version_dir, 'features.json'), list(features))
+    if feature_stats is not None:
+        _write_json(os.path.join(version_dir, FEATURE_STATS_FILENAME), feature_stats, indent=2)
+
+    manifest = {
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'model_file': 'stress_model.joblib',
+        'n_features': len(features),
+        'classes': [int(c) for c in model.classes_],
+        'params': {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        'metrics': metrics or {},
+    }
+    _write_json(os.path.join(version_dir, 'manifest.json'), manifest, indent=2)
+
+    if promote:
+        promote_version(version, model_dir)
+    return manifest
+
+
+def promote_version(version, model_dir=MODEL_DIR):
+    """Copy a saved version over the serving artifacts"""
+    version_dir = os.path.join(model_dir, 'versions', version)
+    for name in ('stress_model.joblib', 'labels.json', 'features.json', FEATURE_STATS_FILENAME):
+        if not os.path.exists(os.path.join(version_dir, name)):
+            continue  # versions saved before feature stats existed
+        tmp_path = os.path.join(model_dir, f'{name}.tmp')
+        shutil.copyfile(os.path.join(version_dir, name), tmp_path)
+        os.replace(tmp_path, os.path.join(model_dir, name))
+    compiled_dir = os.path.join(version_dir, COMPILED_DIRNAME)
+    if os.path.isdir(compiled_dir):
+        copy_forest(compiled_dir, os.path.join(model_dir, COMPILED_DIRNAME))
+    # The manifest goes last: it marks the new version as complete
+    shutil.copyfile(os.path.join(version_dir, 'manifest.json'), os.path.join(model_dir, 'manifest.json.tmp'))
+    os.replace(os.path.join(model_dir, 'manifest.json.tmp'), os.path.join(model_dir, 'manifest.json'))
+
+
+def train(data_path=DATA_PATH, test_size=0.1, random_state=0, group_split=False,
+          n_jobs=-1, use_cache=True, save=True, model_dir=None, log=print,
+          normalize_subjects=False, **params):
+    """
+    Run the full pipeline: load (cached), split, fit, evaluate and save
+
+    With normalize_subjects=True the physiological features are z-scored
+    per subject first and the model goes to the normalized serving slot
+    (model/normalized/) unless model_dir says otherwise.
+
+    Returns:
+        dict: Manifest with version, metrics and timings
+    """
+    start = time.perf_counter()
+    X, y, groups, data_hash = load_dataset(data_path, use_cache=use_cache)
+    load_seconds = time.perf_counter() - start
+    log(f"Loaded {X.shape[0]} rows x {X.shape[1]} features in {load_seconds:.2f}s")
+    if normalize_subjects:
+        X = subject_normalize(X, groups)
+        log(f"Normalized {len(SUBJECT_FEATURES)} features within {len(np.unique(groups))} subjects")
+    model_dir = model_dir or (NORMALIZED_MODEL_DIR if normalize_subjects else MODEL_DIR)
+
+    X_train, X_test, y_train, y_test = split_dataset(
+        X, y, groups, test_size=test_size, random_state=random_state, group_split=group_split
+    )
+
+    log("Training Random Forest model...")
+    model, fit_seconds = fit_model(X_train, y_train, n_jobs=n_jobs, random_state=random_state, **params)
+    accuracy = model.score(X_test, y_test) * 100
+    log(f"Fit time: {fit_seconds:.2f}s")
+    log(f"Model accuracy: {accuracy:.2f}%")
+
+    metrics = {
+        'accuracy': round(accuracy, 4),
+        'fit_seconds': round(fit_seconds, 4),
+        'load_seconds': round(load_seconds, 4),
+        'train_rows': int(X_train.shape[0]),
+        'test_rows': int(X_test.shape[0]),
+        'group_split': group_split,
+        'subject_normalized': normalize_subjects,
+        'data_sha256': data_hash,
+    }
+    version = new_version(data_hash)
+    if not save:
+        return {'version': version, 'metrics': metrics}
+    manifest = save_artifacts(model, model_dir=model_dir, version=version, metrics=metrics,
+                              feature_stats=compute_feature_stats(X_train, SELECTED_FEATURES))
+    log(f"Model version {version} saved to {model_dir}")
+    return manifest
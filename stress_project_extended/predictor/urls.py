@@ -15,6 +15,7 @@ urlpatterns = [
     path('tasks/delete/<int:pk>/', views.task_delete, name='task_delete'),
     path('journal/', views.journal_list, name='journal'),
     path('journal/add/', views.journal_add, name='journal_add'),
+    path('journal/search/', views.journal_search, name='journal_search'),
 
     path('resources/', views.resources_view, name='resources'),
 
@@ -22,6 +23,14 @@ urlpatterns = [
     path('resources/breathing/', views.breathing_videos, name='breathing_videos'),
 
     path('ml-predict/', views.ml_predict_view, name='ml_predict'),
+    path('ml-predict/result/<int:pk>/', views.ml_result_view, name='ml_result'),
+    path('ml-predict/status/<int:pk>/', views.ml_status_view, name='ml_status'),
+    path('api/predict/batch/', views.api_predict_batch, name='api_predict_batch'),
+    path('api/stream/', views.api_stream_open, name='api_stream_open'),
+    path('api/stream/<str:session_id>/', views.api_stream_session, name='api_stream_session'),
+    path('history/<str:kind>/', views.history_view, name='history'),
+    path('api/history/<str:kind>/', views.api_history, name='api_history'),
+    path('perf/stats/', views.perf_stats_view, name='perf_stats'),
     path('resources/breathing/', views.breathing_videos, name='breathing_videos'),
 
 ]
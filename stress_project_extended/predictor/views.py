@@ -1,17 +1,29 @@
 
-import os, json
+import os, json, math, hashlib
+from datetime import datetime, time
+from functools import partial
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.conf import settings
-from django.db import models
+from django.http import JsonResponse, HttpResponseBadRequest, Http404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST, condition
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from .forms import SignupForm, QuestionForm, MoodForm, TaskForm, JournalForm, PhysiologicalDataForm
-from .models import Response, MoodEntry, Task, JournalEntry, PhysiologicalData
-from .ml_predictor import get_predictor
+from .models import Task, PhysiologicalData, PredictionJob
+from . import baselines, community_feed, data_versions, jobs, pagination, queries, rollups
 
-# Initialize ML predictor
-predictor = get_predictor()
+# Files whose replacement deploys a new model (see StressPredictor.artifact_signature)
+MODEL_ARTIFACTS = [os.path.join(os.path.dirname(__file__), 'model', name)
+                   for name in ('stress_model.joblib', 'manifest.json')]
+
+def get_predictor():
+    """Get the ML predictor; numpy and the model are only loaded on first use"""
+    from .ml_predictor import get_predictor as _get_predictor
+    return _get_predictor()
 
 def home(request):
     if request.user.is_authenticated:
@@ -70,28 +82,41 @@ def question_view(request):
 @login_required
 def ml_predict_view(request):
     """ML-based stress prediction using physiological data"""
+    predictor = get_predictor()
     if request.method == 'POST':
         form = PhysiologicalDataForm(request.POST)
         if form.is_valid():
             data = form.save(commit=False)
             data.user = request.user
             
-            # Prepare features for prediction
-            features_dict = {
-
-                'Resp_mean': data.Resp_mean,
-                'Resp_std': data.Resp_std,
-                'TEMP_mean': data.TEMP_mean,
-                'TEMP_std': data.TEMP_std,
-                'TEMP_slope': data.TEMP_slope,
-                'age': data.age,
-                'height': data.height,
-                'weight': data.weight,
-            }
+            # Every model feature, straight from the form
+            features_dict = {f: getattr(data, f) for f in predictor.get_required_features()}
+            if predictor.is_loaded():
+                problems = predictor.prepare([features_dict]).problems
+                if problems:
+                    fields = problems[0].get('out_of_range', []) + problems[0].get('invalid', [])
+                    messages.error(request, 'These values are outside the range the model was trained on: '
+                                   + ', '.join(fields))
+                    return render(request, 'predictor/ml_predict.html', {'form': form, 'model_loaded': True})
+            
+            # Queue mode: store the row and let run_prediction_workers score it
+            if getattr(settings, 'PREDICTION_QUEUE_ENABLED', False):
+                data.save()
+                jobs.enqueue(data)
+                return redirect('ml_result', pk=data.pk)
             
             # Make prediction
+            personalized = None
             if predictor.is_loaded():
-                predicted_label, confidence = predictor.predict(features_dict)
+                # Users with enough history are scored against their own baseline
+                if getattr(settings, 'PERSONALIZED_SCORING', False):
+                    try:
+                        personalized = baselines.predict_labeled(request.user.pk, [features_dict])
+                    except ValueError:
+                        # InvalidFeatures: far outside a tight baseline, the z-scores leave the trained range
+                        messages.info(request, 'These readings are far from your usual baseline, '
+                                      'so they were scored with the general model.')
+                predicted_label, confidence = personalized[0] if personalized else predictor.predict(features_dict)
                 data.predicted_level = predicted_label
                 if confidence:
                     data.confidence_amused = confidence.get('Amused', 0)
@@ -102,7 +127,9 @@ def ml_predict_view(request):
                 messages.warning(request, 'ML model not loaded. Please train the model first.')
             
             data.save()
-            return render(request, 'predictor/ml_result.html', {'data': data})
+            # Explanations come from the serving model, not the personalized variant
+            explanation = _explanation(data) if predictor.is_loaded() and not personalized else None
+            return render(request, 'predictor/ml_result.html', {'data': data, 'explanation': explanation})
     else:
         form = PhysiologicalDataForm()
     
@@ -112,23 +139,309 @@ def ml_predict_view(request):
     })
 
 @login_required
+def ml_result_view(request, pk):
+    """Result page for a stored prediction; polls the status endpoint while queued"""
+    data = get_object_or_404(PhysiologicalData.objects.select_related('job'), pk=pk, user=request.user)
+    job = getattr(data, 'job', None)
+    pending = job is not None and job.status in (PredictionJob.PENDING, PredictionJob.RUNNING)
+    return render(request, 'predictor/ml_result.html', {
+        'data': data, 'pending': pending, 'explanation': None if pending else _explanation(data),
+    })
+
+def _explanation(data, top=6):
+    """
+    Feature contributions behind a stored prediction, shaped for ml_result.html
+
+    Returns None when the model is not loaded or the current model no longer
+    makes the stored call (retrained since, or personalized scoring).
+    """
+    predictor = get_predictor()
+    if not predictor.is_loaded() or data.predicted_level not in predictor.class_labels():
+        return None
+    row = {f: getattr(data, f) for f in predictor.get_required_features()}
+    try:
+        label, _, explanation = predictor.explain_labeled([row], top=top)[0]
+    except (ValueError, RuntimeError):
+        return None
+    if label != data.predicted_level:
+        return None
+    largest = max((abs(c['contribution']) for c in explanation['contributions']), default=0) or 1.0
+    for c in explanation['contributions']:
+        c['points'] = c['contribution'] * 100
+        c['width'] = abs(c['contribution']) / largest * 100
+    explanation['base_percent'] = explanation['base'] * 100
+    return explanation
+
+@login_required
+def ml_status_view(request, pk):
+    """Lightweight JSON status of a queued prediction"""
+    row = (PhysiologicalData.objects.filter(pk=pk, user=request.user)
+           .values('predicted_level', 'confidence_amused', 'confidence_neutral',
+                   'confidence_stressed', 'job__status')
+           .first())
+    if row is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse({
+        'status': row.pop('job__status') or PredictionJob.DONE,
+        **row,
+    })
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def _parse_batch_body(request):
+    """Parse a JSON array or NDJSON request body into a list of row dicts"""
+    body = request.body.decode('utf-8')
+    content_type = request.content_type or ''
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        rows = json.loads(body)
+        if isinstance(rows, dict):
+            rows = rows.get('rows', [])
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        raise ValueError('Expected a JSON array of feature objects')
+    return rows
+
+@require_POST
+def api_predict_batch(request):
+    """Score a batch of feature rows in one vectorized call (JSON array or NDJSON)"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    predictor = get_predictor()
+    if not predictor.is_loaded():
+        return JsonResponse({'error': 'ML model not loaded'}, status=503)
+
+    try:
+        rows = _parse_batch_body(request)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid body: {e}'}, status=400)
+
+    max_rows = getattr(settings, 'PREDICT_BATCH_MAX_ROWS', 1000)
+    if not rows:
+        return JsonResponse({'error': 'No rows supplied'}, status=400)
+    if len(rows) > max_rows:
+        return JsonResponse({'error': f'Too many rows (max {max_rows})'}, status=413)
+
+    # Missing values are filled with training medians; anything unscoreable is reported
+    prepared = predictor.prepare(rows)
+    if prepared.problems:
+        return JsonResponse({'error': 'Invalid rows', 'rows': prepared.problems}, status=400)
+
+    # ?explain=1 adds per-feature contributions to the predicted class, from the same forest walk
+    if request.GET.get('explain'):
+        scored = predictor.explain_labeled(prepared.matrix)
+        predictions = [(label, confidence) for label, confidence, _ in scored]
+    else:
+        scored, predictions = None, predictor.predict_labeled(prepared.matrix)
+    results = _store_predictions(request.user, prepared.matrix, predictions, predictor.get_required_features())
+    if scored is not None:
+        for result, (_, _, explanation) in zip(results, scored):
+            result['explanation'] = explanation
+    return JsonResponse({'count': len(results), 'results': results})
+
+def _store_predictions(user, matrix, predictions, features):
+    """Save scored feature rows (a prepared matrix) with one bulk_create and describe them for a JSON response"""
+    integer_fields = ('age', 'height', 'weight')
+    objs = []
+    results = []
+    for row, (predicted_label, confidence) in zip(matrix.tolist(), predictions):
+        values = {f: (int(round(v)) if f in integer_fields else v) for f, v in zip(features, row)}
+        objs.append(PhysiologicalData(
+            user=user,
+            predicted_level=predicted_label,
+            confidence_amused=confidence.get('Amused', 0),
+            confidence_neutral=confidence.get('Neutral', 0),
+            confidence_stressed=confidence.get('Stressed', 0),
+            **values
+        ))
+        results.append({'predicted_level': predicted_label, 'confidence': confidence})
+
+    created = PhysiologicalData.objects.bulk_create(objs)
+    # bulk_create skips signals, so account for the rows explicitly
+    rollups.record_physiological(created)
+    baselines.record(created)
+    data_versions.bump(user.pk)
+    for obj, result in zip(created, results):
+        result['id'] = obj.pk
+    return results
+
+def _iter_sample_batches(request):
+    """
+    Yield {signal: {"t": [...], "v": [...]}} objects from a JSON or NDJSON body
+
+    NDJSON bodies are read line by line, so a long chunked upload is
+    windowed and scored as it is parsed.
+    """
+    content_type = request.content_type or ''
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        for line in request:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield json.loads(request.body.decode('utf-8'))
+
+@require_POST
+def api_stream_open(request):
+    """
+    Open a raw-sample streaming session
+
+    Body: {"age": .., "height": .., "weight": ..} plus optional "signals"
+    (names, default all four), "window_seconds" and "step_seconds" (derived
+    from the sampling rates when unset, like extract_features()).
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not get_predictor().is_loaded():
+        return JsonResponse({'error': 'ML model not loaded'}, status=503)
+    try:
+        profile = json.loads(request.body.decode('utf-8') or '{}')
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid body: {e}'}, status=400)
+    if not isinstance(profile, dict):
+        return JsonResponse({'error': 'Invalid body: expected an object'}, status=400)
+    missing = [f for f in ('age', 'height', 'weight') if not _is_number(profile.get(f))]
+    lengths = {f: profile.get(f) for f in ('window_seconds', 'step_seconds')}
+    missing += [f for f, value in lengths.items() if value is not None and not (_is_number(value) and value > 0)]
+    if missing:
+        return JsonResponse({'error': 'Missing or invalid profile fields', 'fields': missing}, status=400)
+
+    from .feature_extraction import SIGNALS
+    from .streaming import get_registry
+    signals = profile.get('signals', SIGNALS)
+    if not isinstance(signals, list) and signals is not SIGNALS:
+        return JsonResponse({'error': 'Invalid body: signals must be a list of signal names'}, status=400)
+    try:
+        session = get_registry().create(request.user.pk, profile, signals, **lengths)
+    except OverflowError as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid body: {e}'}, status=400)
+    return JsonResponse(session.describe(), status=201)
+
+def api_stream_session(request, session_id):
+    """
+    Push samples to a streaming session (POST), inspect it (GET) or close it (DELETE)
+
+    Every window the pushed samples complete is scored and stored as a
+    PhysiologicalData row, and returned in the response.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    from .streaming import BufferFull, get_registry
+    registry = get_registry()
+    if request.method == 'DELETE':
+        session = registry.close(session_id, request.user.pk)
+        if session is None:
+            return JsonResponse({'error': 'Not found'}, status=404)
+        return JsonResponse(session.describe())
+
+    session = registry.get(session_id, request.user.pk)
+    if session is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    if request.method == 'GET':
+        return JsonResponse(session.describe())
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    from .feature_extraction import SIGNALS
+    predictor = get_predictor()
+    features = predictor.get_required_features()
+    partial_signals = set(session.signals) != set(SIGNALS)
+    results = []
+    full = None
+    try:
+        for batch in _iter_sample_batches(request):
+            if not isinstance(batch, dict):
+                raise ValueError('Expected an object mapping signal names to {"t": [...], "v": [...]}')
+            for signal, samples in batch.items():
+                if not isinstance(samples, dict):
+                    raise ValueError(f'{signal}: expected {{"t": [...], "v": [...]}}')
+            with session.lock:
+                try:
+                    rows = session.push_many({
+                        signal: (samples.get('t', []), samples.get('v', [])) for signal, samples in batch.items()
+                    })
+                except BufferFull as e:
+                    # The windows completed before the buffer filled up are still scored
+                    full, rows = e, e.rows
+            if rows:
+                # Windows the model cannot score (e.g. out of the training range) are reported, not stored;
+                # a session without some signals has their features filled with training medians
+                prepared = predictor.prepare(rows, fill_missing=partial_signals)
+                scored = []
+                for problem in prepared.problems:
+                    row = rows[problem.pop('row')]
+                    scored.append(dict(problem, window_start=row['window_start'], window_end=row['window_end']))
+                valid_rows = [row for row, valid in zip(rows, prepared.valid) if valid]
+                if valid_rows:
+                    matrix = prepared.matrix[prepared.valid]
+                    stored = _store_predictions(request.user, matrix, predictor.predict_labeled(matrix), features)
+                    for row, result in zip(valid_rows, stored):
+                        result.update(window_start=row['window_start'], window_end=row['window_end'])
+                    scored.extend(stored)
+                results.extend(sorted(scored, key=lambda result: result['window_start']))
+            if full is not None:
+                return JsonResponse({'error': str(full), 'results': results, 'session': session.describe()},
+                                    status=413)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid samples: {e}', 'results': results}, status=400)
+
+    return JsonResponse({'count': len(results), 'results': results, 'session': session.describe()})
+
+def _dashboard_etag(request):
+    """
+    Validator of the dashboard: the user's data version plus everything else the page shows
+
+    Reads only the cache and the model files' stat, so a matching
+    If-None-Match is answered with a 304 before any dashboard query runs,
+    the template is rendered or the model is loaded.
+    """
+    parts = (
+        request.user.pk, data_versions.get(request.user.pk), timezone.localdate(),
+        _model_signature(), request.session.session_key,
+    )
+    return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+
+def _model_signature():
+    """(mtime, size) of the serving artifacts; a deploy changes it without the model being loaded here"""
+    signature = []
+    for path in MODEL_ARTIFACTS:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return signature
+
+def _dashboard_last_modified(request):
+    # The chart covers the last 30 days, so it changes at midnight too
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    return max(data_versions.last_modified(request.user.pk), midnight)
+
+def _dashboard_summary(user):
+    summary = rollups.dashboard_summary(user)
+    summary['chart_labels'] = json.dumps(summary['chart_labels'])
+    summary['chart_data'] = json.dumps(summary['chart_data'])
+    return summary
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_dashboard_etag, last_modified_func=_dashboard_last_modified)
 def dashboard_view(request):
-    # show recent responses and mood entries
-    responses = Response.objects.filter(user=request.user).order_by('-created_at')[:30]
-    moods = MoodEntry.objects.filter(user=request.user).order_by('-created_at')[:30]
-    ml_predictions = PhysiologicalData.objects.filter(user=request.user).order_by('-created_at')[:30]
-    
-    # prepare simple chart data for Chart.js
-    chart_labels = [r.created_at.strftime('%Y-%m-%d') for r in responses[::-1]]
-    chart_data = [ (1 if r.predicted_level=='Low Stress' else 2 if r.predicted_level=='Medium Stress' else 3) for r in responses[::-1] ]
-    
+    # show recent responses and mood entries; counts and the chart come
+    # from the pre-aggregated rollup rows instead of the raw history.
+    # Everything is lazy: fragments cached under the current data version
+    # run no queries at all.
     return render(request, 'predictor/dashboard.html', {
-        'responses': responses, 
-        'moods': moods, 
-        'ml_predictions': ml_predictions,
-        'chart_labels': json.dumps(chart_labels), 
-        'chart_data': json.dumps(chart_data),
-        'model_loaded': predictor.is_loaded()
+        'responses': queries.recent_responses(request.user),
+        'moods': queries.recent_moods(request.user),
+        'ml_predictions': queries.recent_predictions(request.user),
+        'summary': SimpleLazyObject(partial(_dashboard_summary, request.user)),
+        'data_version': data_versions.get(request.user.pk),
+        'today': timezone.localdate().isoformat(),
+        'fragment_timeout': getattr(settings, 'DASHBOARD_FRAGMENT_TIMEOUT', 3600),
+        'model_loaded': get_predictor().is_loaded()
     })
 
 @login_required
@@ -147,7 +460,7 @@ def mood_add(request):
 
 @login_required
 def tasks_list(request):
-    tasks = Task.objects.filter(user=request.user).order_by('completed','due_date')
+    tasks = queries.user_tasks(request.user)
     form = TaskForm()
     return render(request, 'predictor/tasks_list.html', {'tasks': tasks, 'form': form})
 
@@ -177,13 +490,98 @@ def task_delete(request, pk):
 
 @login_required
 def journal_list(request):
-    # show recent anonymous and user's entries
-    if request.user.is_authenticated:
-        entries = JournalEntry.objects.filter(models.Q(anonymous=True) | models.Q(user=request.user)).order_by('-created_at')[:50]
-    else:
-        entries = JournalEntry.objects.filter(anonymous=True).order_by('-created_at')[:50]
+    # show recent anonymous entries (shared cache) and the user's own
+    entries = community_feed.journal_feed(request.user)
     return render(request, 'predictor/journal_list.html', {'entries': entries})
 
+@login_required
+def journal_search(request):
+    """Ranked full-text search over the journal entries the user can see"""
+    from . import journal_search as search
+    query = request.GET.get('q', '').strip()[:200]
+    limit = pagination.parse_limit(request.GET.get('limit'))
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    entries, has_more = search.search(query, request.user, offset=(page - 1) * limit, limit=limit)
+    return render(request, 'predictor/journal_search.html', {
+        'query': query, 'entries': entries, 'page': page, 'limit': limit,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if has_more else None,
+    })
+
+def perf_stats_view(request):
+    """Rolling per-URL timing percentiles collected by TimingMiddleware (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    from . import instrumentation
+    if request.method == 'POST' and request.POST.get('reset'):
+        instrumentation.stats.clear()
+    return JsonResponse({
+        'enabled': instrumentation.is_enabled(),
+        'window': instrumentation.stats.window,
+        'views': instrumentation.stats.summary(),
+    })
+
+HISTORY_TITLES = {
+    'predictions': '🤖 ML Prediction History',
+    'moods': '😊 Mood History',
+    'responses': '📋 Assessment History',
+    'journal': '📝 Journal History',
+}
+
+def _history_page(request, kind):
+    """Fetch one keyset page of a history feed from the cursor/limit query parameters"""
+    cursor = request.GET.get('cursor')
+    cursor = pagination.decode_cursor(cursor) if cursor else None
+    limit = pagination.parse_limit(request.GET.get('limit'))
+    return pagination.keyset_page(queries.history_querysets(kind, request.user), cursor, limit)
+
+def _history_item(kind, obj):
+    item = {'id': obj.pk, 'created_at': obj.created_at.isoformat()}
+    if kind == 'predictions':
+        item.update(predicted_level=obj.predicted_level, confidence_amused=obj.confidence_amused,
+                    confidence_neutral=obj.confidence_neutral, confidence_stressed=obj.confidence_stressed)
+    elif kind == 'moods':
+        item.update(mood_scale=obj.mood_scale, note=obj.note)
+    elif kind == 'responses':
+        item.update(predicted_level=obj.predicted_level)
+    else:
+        item.update(anonymous=obj.anonymous, content=obj.content,
+                    author=None if obj.anonymous or obj.user_id is None else obj.user.username)
+    return item
+
+@login_required
+def history_view(request, kind):
+    """Infinite-scroll history page; ?partial=1 returns just the next batch of items"""
+    if kind not in queries.HISTORY:
+        raise Http404('Unknown history')
+    try:
+        items, next_cursor = _history_page(request, kind)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    context = {'kind': kind, 'items': items, 'next_cursor': next_cursor,
+               'title': HISTORY_TITLES[kind], 'first_page': 'cursor' not in request.GET}
+    if request.GET.get('partial'):
+        return render(request, 'predictor/history_items.html', context)
+    return render(request, 'predictor/history.html', context)
+
+def api_history(request, kind):
+    """JSON page of a history feed: {"results": [...], "next_cursor": ...}"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if kind not in queries.HISTORY:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    try:
+        items, next_cursor = _history_page(request, kind)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'results': [_history_item(kind, obj) for obj in items],
+        'next_cursor': next_cursor,
+    })
+
 @login_required
 def journal_add(request):
     if request.method == 'POST':
@@ -11,6 +11,7 @@ INSTALLED_APPS = [
     'predictor',
 ]
 MIDDLEWARE = [
+    'predictor.instrumentation.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware','django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware','django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware','django.contrib.messages.middleware.MessageMiddleware',
@@ -19,7 +20,7 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'stress_project.urls'
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'predictor.instrumentation.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {'context_processors': [
@@ -39,3 +40,34 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'predictor', 'static')]
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Seconds between checks for a retrained model artifact (None disables hot reload)
+PREDICTOR_RELOAD_INTERVAL = 5
+# Load the model at startup instead of on first prediction: False, True or 'background'
+PREDICTOR_WARMUP = False
+# Queue ML predictions for `manage.py run_prediction_workers` instead of scoring in the request
+PREDICTION_QUEUE_ENABLED = False
+# Per-request timing (Server-Timing header and /perf/stats/); the middleware removes itself when False
+REQUEST_TIMING_ENABLED = False
+# Reject inputs further outside the training range than this fraction of that range (None disables)
+PREDICTOR_RANGE_TOLERANCE = 0.25
+# Score users whose baseline has enough windows with the subject-normalized model (train_stress_model --normalize-subjects)
+PERSONALIZED_SCORING = False
+USER_BASELINE = {'MIN_WINDOWS': 10, 'CACHE_SIZE': 1024, 'CACHE_TTL': 60}
+# 'shared' is one cache for every process on the host, so the web workers and run_prediction_workers see each
+# other's data versions and community feed updates; swap in Redis or Memcached when processes span hosts.
+# SHARED_CACHE_DIR moves it, e.g. to keep a staging copy or a benchmark run off the site's entries
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_DIR', BASE_DIR / '.django_cache'),
+    },
+}
+# Dashboard fragments are keyed on per-user data versions held in this cache; it must be shared by all processes
+DASHBOARD_CACHE_ALIAS = 'shared'
+DASHBOARD_FRAGMENT_TIMEOUT = 3600
+# Journal search ranks only the newest this many visible matches, so common words stay fast on a large journal (None ranks all)
+JOURNAL_SEARCH_CANDIDATES = 1000
+# Seconds the shared anonymous journal feed stays cached (in DASHBOARD_CACHE_ALIAS) before it is reloaded
+COMMUNITY_FEED_TIMEOUT = 300